@@ -0,0 +1,81 @@
+"""
+Measures how quickly the REPL shows what a device sends it: replays a
+recorded-style session (the start-up banner, some line editing and then a
+program printing sensor readings as fast as it can) through
+REPLPane.process_bytes in reads of various sizes, and prints the characters
+handled per second for each.
+
+Run from the root of the repository (with QT_QPA_PLATFORM=offscreen to run
+without a display):
+
+    python benchmarks/repl_replay.py [readings]
+"""
+import os
+import sys
+import time
+from unittest import mock
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PyQt5.QtWidgets import QApplication  # noqa: E402
+from mu.interface import REPLPane  # noqa: E402
+
+
+def session(readings):
+    """
+    Returns the bytes of a session with the referenced number of readings.
+    """
+    data = [
+        b'MicroPython v1.9.2-34-gd64154c73 on 2017-09-01; '
+        b'micro:bit v1.0.1 with nRF51822\r\n'
+        b'Type "help()" for more information.\r\n>>> ',
+        # Typing, going back to fix a mistake and carrying on.
+        b'for i in rnage(3):',
+        b'\x08' * 11 + b'\x1b[K' + b'range(3):',
+        b'\r\n...     print(i)\r\n...     \x08\x08\x08\x08\r\n0\r\n1\r\n2'
+        b'\r\n>>> ',
+        b'import accel\x1b[5D\x1b[K\x1b[1Dmicrobit\r\n>>> ',
+    ]
+    for i in range(readings):
+        data.append('accelerometer: ({}, {}, {})\r\n'.format(
+            i % 200 - 100, i % 50 * 20, -1024 + i % 7).encode('utf-8'))
+    return b''.join(data)
+
+
+def replay(data, read_size):
+    """
+    Feeds the data to a new REPL pane in reads of the referenced size.
+    Returns the seconds taken by process_bytes, and in all including
+    handling the events it caused.
+    """
+    with mock.patch('PyQt5.QtSerialPort.QSerialPort'):
+        pane = REPLPane('COM0')
+    pane.show()
+    QApplication.processEvents()
+    processing = 0.0
+    start = time.perf_counter()
+    for i in range(0, len(data), read_size):
+        began = time.perf_counter()
+        pane.process_bytes(data[i:i + read_size])
+        processing += time.perf_counter() - began
+        QApplication.processEvents()
+    total = time.perf_counter() - start
+    pane.close()
+    return processing, total
+
+
+def main():
+    readings = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    app = QApplication(sys.argv)
+    data = session(readings)
+    replay(data[:1000], 64)
+    print('{} characters'.format(len(data)))
+    for read_size in (1, 64, 1024):
+        processing, total = replay(data, read_size)
+        print('{:5} byte reads: {:10.0f} chars/s in process_bytes, '
+              '{:10.0f} chars/s in all'.format(read_size,
+                                               len(data) / processing,
+                                               len(data) / total))
+    app.quit()
+
+
+if __name__ == '__main__':
+    main()
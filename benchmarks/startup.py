@@ -0,0 +1,84 @@
+"""
+Measures how long Mu takes to start: runs it several times, each in a new
+process with an empty home directory, quitting as soon as the window has been
+shown. Prints the median time taken by each phase of starting up (as recorded
+by mu.app.STARTUP) and in all, and the median wall clock time for the whole
+process, including starting Python.
+
+Run from the root of the repository (with QT_QPA_PLATFORM=offscreen to run
+without a display):
+
+    python benchmarks/startup.py [runs]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+#: Starts Mu, and quits once the timings have been written.
+CHILD = """
+import sys
+import mu.app
+finished = mu.app.startup_finished
+
+
+def quit_after(profile_path=None):
+    finished(profile_path)
+    mu.app.QTimer.singleShot(0, mu.app.QApplication.instance().quit)
+
+
+mu.app.startup_finished = quit_after
+sys.argv = ['mu']
+mu.app.run()
+"""
+
+
+def start(home):
+    """
+    Starts Mu once with the referenced home directory. Returns the timings
+    it wrote and the wall clock time taken, in seconds.
+    """
+    profile = os.path.join(home, 'startup.json')
+    env = dict(os.environ, HOME=home, MU_PROFILE_STARTUP=profile,
+               PYTHONPATH=ROOT)
+    env.pop('XDG_DATA_HOME', None)
+    env.pop('XDG_CACHE_HOME', None)
+    began = time.perf_counter()
+    subprocess.run([sys.executable, '-c', CHILD], env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wall = time.perf_counter() - began
+    with open(profile) as f:
+        return json.load(f), wall
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    durations = {}
+    totals = []
+    walls = []
+    with tempfile.TemporaryDirectory() as home:
+        # The first run prepares the autocomplete APIs and writes settings.
+        start(home)
+        for i in range(runs):
+            timings, wall = start(home)
+            for phase in timings['phases']:
+                durations.setdefault(phase['name'], []).append(
+                    phase['duration'])
+            totals.append(timings['total'])
+            walls.append(wall)
+    for name, values in durations.items():
+        print('{:20} {:7.1f}ms'.format(name,
+                                       statistics.median(values) * 1000))
+    print('{:20} {:7.1f}ms'.format('total',
+                                   statistics.median(totals) * 1000))
+    print('{:20} {:7.1f}ms'.format('process',
+                                   statistics.median(walls) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Measures how long it takes to open tabs in the editor: the time to open each
+of 1, 10 and 50 tabs in a new window, and the time taken by the last of them.
+With the autocomplete APIs shared and only the new tab themed, the time per
+tab shouldn't grow with the number of tabs already open.
+
+Run from the root of the repository (with QT_QPA_PLATFORM=offscreen to run
+without a display):
+
+    python benchmarks/tab_open.py
+"""
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PyQt5.QtWidgets import QApplication  # noqa: E402
+from mu.interface import Window  # noqa: E402
+from mu.resources.api import MICROPYTHON_APIS  # noqa: E402
+
+
+SCRIPT = 'from microbit import *\n\nwhile True:\n    display.scroll("Hi")\n'
+
+
+def open_tabs(count):
+    """
+    Opens the referenced number of tabs in a new window. Returns the total
+    time taken and the time taken to open the last tab, in seconds.
+    """
+    window = Window()
+    window.setup('day', MICROPYTHON_APIS)
+    start = last = time.perf_counter()
+    for i in range(count):
+        last = time.perf_counter()
+        window.add_tab('tab{}.py'.format(i), SCRIPT)
+        QApplication.processEvents()
+    end = time.perf_counter()
+    window.close()
+    return end - start, end - last
+
+
+def main():
+    app = QApplication(sys.argv)
+    # The first window pays for preparing the autocomplete APIs.
+    open_tabs(1)
+    for count in (1, 10, 50):
+        total, last = open_tabs(count)
+        print('{:3} tabs: {:7.1f}ms in all, {:5.1f}ms per tab, {:5.1f}ms for '
+              'the last'.format(count, total * 1000, total * 1000 / count,
+                                last * 1000))
+    app.quit()
+
+
+if __name__ == '__main__':
+    main()
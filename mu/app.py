@@ -19,28 +19,227 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
+import atexit
+import hashlib
+import json
 import os
+import platform
+import queue
 import sys
 import logging
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+
+class StartupTimer:
+    """
+    Records how long each phase of starting Mu takes, as measured by a
+    monotonic clock from when the timer was created.
+    """
+
+    def __init__(self):
+        self.start = self.last = time.monotonic()
+        #: A (name, start, duration) tuple for each phase, in seconds.
+        self.phases = []
+
+    def mark(self, name):
+        """
+        Records that the phase with the referenced name, which began when
+        the previous phase ended, has just ended.
+        """
+        now = time.monotonic()
+        self.phases.append((name, self.last - self.start, now - self.last))
+        self.last = now
+
+    @property
+    def total(self):
+        """
+        Seconds from the start to the end of the last phase.
+        """
+        return self.last - self.start
+
+    def log(self):
+        """
+        Logs how long each phase took, and the total, at INFO level.
+        """
+        for name, start, duration in self.phases:
+            logging.info('Startup: {} took {:.1f}ms'.format(
+                name, duration * 1000))
+        logging.info('Startup took {:.1f}ms'.format(self.total * 1000))
+
+    def as_dict(self):
+        """
+        Returns the timings, and what they were measured on, as a dictionary
+        that can be written as JSON.
+        """
+        return {
+            'version': __version__,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'phases': [{'name': name, 'start': start, 'duration': duration}
+                       for name, start, duration in self.phases],
+            'total': self.total,
+        }
+
+    def write(self, path):
+        """
+        Writes the timings to the referenced path as JSON.
+        """
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f, indent=2)
+        logging.info('Startup timings written to {}'.format(path))
+
+
+STARTUP = StartupTimer()
+
 from PyQt5.QtWidgets import QApplication, QSplashScreen
+from PyQt5.QtCore import QTimer, pyqtSignal
+from PyQt5.QtNetwork import QLocalServer, QLocalSocket
+STARTUP.mark('import PyQt5')
 from mu import __version__
-from mu.logic import Editor, LOG_FILE, LOG_DIR
-from mu.interface import Window
+# mu.logic defers importing the checkers, uflash, microfs and the serial port
+# until they're first used, so this should be quick.
+from mu.logic import Editor, LOG_FILE, LOG_DIR, DATA_DIR, freeze_support
+STARTUP.mark('import mu.logic')
+from mu.interface import Window, Font, shared_api
 from mu.resources import load_pixmap
 from mu.resources.api import MICROPYTHON_APIS
+STARTUP.mark('import mu.interface')
+
+
+#: The environment variable naming a file to write startup timings to.
+PROFILE_STARTUP_ENV = 'MU_PROFILE_STARTUP'
+#: The command line flag to write startup timings to STARTUP_PROFILE_FILE.
+PROFILE_STARTUP_FLAG = '--profile-startup'
+#: Where the command line flag writes startup timings.
+STARTUP_PROFILE_FILE = os.path.join(LOG_DIR, 'startup.json')
+#: The environment variable naming the level to log at (such as "TRACE").
+LOG_LEVEL_ENV = 'MU_LOG_LEVEL'
+#: The level logged at unless LOG_LEVEL_ENV says otherwise.
+DEFAULT_LOG_LEVEL = logging.DEBUG
+#: The size in bytes at which the log file is rolled over to a new one.
+LOG_MAX_BYTES = 5 * 1024 * 1024
+#: How many old log files to keep (as mu.log.1, mu.log.2 and so on).
+LOG_BACKUP_COUNT = 5
+#: The name Mu listens for files to open on, so that opening a file while Mu is
+# running opens it in the running Mu. Mu instances only share a name if they
+# share settings.
+INSTANCE_NAME = 'mu-' + hashlib.sha1(DATA_DIR.encode('utf-8')).hexdigest()[:12]
+#: Milliseconds to wait for a running Mu to answer before starting a new one.
+INSTANCE_TIMEOUT = 1000
+
+
+class InstanceServer(QLocalServer):
+    """
+    Listens for other Mu processes passing on the file they were asked to
+    open (see send_to_instance). Each sends the absolute path of the file, or
+    nothing, as a line of UTF-8 and is answered with "ok" once it's been read.
+    """
+
+    #: Emitted with the path of a file passed on by another Mu.
+    file_requested = pyqtSignal(str)
+    #: Emitted when another Mu has passed on a request, so the window should
+    # be brought to the front.
+    activate_requested = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.newConnection.connect(self.on_connection)
+
+    def start(self, name=INSTANCE_NAME):
+        """
+        Starts listening with the referenced name. Returns True on success.
+
+        A Mu that crashed may have left its socket behind, which would stop
+        this one listening, so if nothing answers on it, it's removed and
+        listening tried again. If another Mu does answer (it started since
+        this one checked) its socket is left alone and False returned.
+        """
+        if not self.listen(name):
+            probe = QLocalSocket()
+            probe.connectToServer(name)
+            if probe.waitForConnected(INSTANCE_TIMEOUT):
+                probe.abort()
+                logging.info('Another instance is listening on {}'.format(
+                    name))
+                return False
+            QLocalServer.removeServer(name)
+            if not self.listen(name):
+                logging.error('Could not listen for other instances: '
+                              '{}'.format(self.errorString()))
+                return False
+        logging.info('Listening for other instances on {}'.format(
+            self.fullServerName()))
+        return True
+
+    def on_connection(self):
+        """
+        Handles each waiting connection once it has sent a whole line.
+        """
+        while self.hasPendingConnections():
+            socket = self.nextPendingConnection()
+            socket.disconnected.connect(socket.deleteLater)
+            socket.readyRead.connect(lambda s=socket: self.on_ready_read(s))
+
+    def on_ready_read(self, socket):
+        """
+        Answers the request from the referenced socket and opens the file it
+        passed on, if any.
+        """
+        if not socket.canReadLine():
+            return
+        line = bytes(socket.readLine()).decode('utf-8').rstrip('\n')
+        socket.write(b'ok\n')
+        socket.flush()
+        logging.info('Request from another instance: {}'.format(repr(line)))
+        if line:
+            self.file_requested.emit(line)
+        self.activate_requested.emit()
+
+
+def get_log_level():
+    """
+    Returns the level to log at: the one named by the LOG_LEVEL_ENV
+    environment variable, if it names one, otherwise DEFAULT_LOG_LEVEL.
+    """
+    name = os.environ.get(LOG_LEVEL_ENV, '').strip().upper()
+    if name:
+        level = logging.getLevelName(name)
+        if isinstance(level, int):
+            return level
+        print('Unknown log level: {}'.format(name))
+    return DEFAULT_LOG_LEVEL
 
 
 def setup_logging():
     """
     Configure logging.
+
+    Records are put on a queue and written to LOG_FILE by a background
+    thread, so logging never waits for the disk. Each start begins a new log
+    file, as does the log reaching LOG_MAX_BYTES, and the last
+    LOG_BACKUP_COUNT are kept. Returns the listener writing the records,
+    which is stopped (once it has written what's waiting) on exit.
     """
     if not os.path.exists(LOG_DIR):
         os.makedirs(LOG_DIR)
     log_fmt = '%(asctime)s - %(name)s(%(funcName)s) %(levelname)s: %(message)s'
-    logging.basicConfig(filename=LOG_FILE, filemode='w', format=log_fmt,
-                        level=logging.DEBUG)
+    handler = RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES,
+                                  backupCount=LOG_BACKUP_COUNT,
+                                  encoding='utf-8', delay=True)
+    if os.path.exists(LOG_FILE) and os.path.getsize(LOG_FILE):
+        handler.doRollover()
+    handler.setFormatter(logging.Formatter(log_fmt))
+    log_queue = queue.Queue()
+    listener = QueueListener(log_queue, handler)
+    root = logging.getLogger()
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(get_log_level())
+    listener.start()
+    atexit.register(listener.stop)
     sys.excepthook = excepthook
     print('Logging to {}'.format(LOG_FILE))
+    return listener
 
 
 def excepthook(*exc_args):
@@ -52,28 +251,111 @@ def excepthook(*exc_args):
     sys.exit(1)
 
 
+def startup_profile_path(argv):
+    """
+    Returns the path of the file startup timings should be written to, or
+    None if they're only to be logged. Removes the command line flag asking
+    for them from the referenced argv, if it's there.
+    """
+    if PROFILE_STARTUP_FLAG in argv:
+        argv.remove(PROFILE_STARTUP_FLAG)
+        return STARTUP_PROFILE_FILE
+    return os.environ.get(PROFILE_STARTUP_ENV) or None
+
+
+def send_to_instance(path=None, name=INSTANCE_NAME,
+                     timeout=INSTANCE_TIMEOUT):
+    """
+    Passes the referenced path (if any) to the Mu listening with the
+    referenced name, which will open it. Returns True if that Mu answered,
+    otherwise False, in which case this Mu should start as usual.
+    """
+    message = os.path.abspath(path) if path else ''
+    socket = QLocalSocket()
+    socket.connectToServer(name)
+    if not socket.waitForConnected(timeout):
+        return False
+    socket.write(message.encode('utf-8') + b'\n')
+    answered = False
+    if socket.waitForBytesWritten(timeout):
+        while socket.waitForReadyRead(timeout):
+            if socket.canReadLine():
+                answered = bytes(socket.readLine()) == b'ok\n'
+                break
+    socket.abort()
+    return answered
+
+
+def startup_finished(profile_path=None):
+    """
+    Called once the event loop is running and the window has been shown:
+    records the end of startup, logs the timings and writes them to the
+    referenced path, if given.
+    """
+    STARTUP.mark('first event')
+    STARTUP.log()
+    if profile_path:
+        try:
+            STARTUP.write(profile_path)
+        except OSError as ex:
+            logging.error('Could not write startup timings: {}'.format(ex))
+
+
 def run():
     """
     Creates all the top-level assets for the application, sets things up and
     then runs the application.
     """
+    # Before anything else, so Check All's processes in a frozen Mu don't
+    # start (or pass their arguments on to) another Mu.
+    freeze_support()
+    profile_path = startup_profile_path(sys.argv)
+    # capture the filename passed by the os, if there was one
+    passed_filename = sys.argv[1] if len(sys.argv) > 1 else None
+    # If Mu is already running it opens the file instead. This is checked
+    # before logging is set up, which would empty the running Mu's log.
+    if send_to_instance(passed_filename):
+        print('Passed on to the running Mu.')
+        sys.exit(0)
+    STARTUP.mark('check for running Mu')
     setup_logging()
     logging.info('Starting Mu {}'.format(__version__))
     # The app object is the application running on your computer.
     app = QApplication(sys.argv)
+    STARTUP.mark('QApplication')
+    # Listen for Mu processes started from now on. If another Mu started
+    # since the check above, pass the file on to it after all.
+    server = InstanceServer(app)
+    if not server.start() and send_to_instance(passed_filename):
+        print('Passed on to the running Mu.')
+        sys.exit(0)
+    STARTUP.mark('listen for other instances')
     # Display a friendly "splash" icon.
     splash = QSplashScreen(load_pixmap('icon'))
     splash.show()
+    STARTUP.mark('splash screen')
     # Create the "window" we'll be looking at.
     editor_window = Window()
     # Create the "editor" that'll control the "window".
     editor = Editor(view=editor_window)
+    STARTUP.mark('Window and Editor')
+    # The fonts and autocomplete APIs are loaded on first use; load them
+    # now so they're timed on their own.
+    Font().load()
+    STARTUP.mark('font database')
+    shared_api(MICROPYTHON_APIS, DATA_DIR)
+    STARTUP.mark('autocomplete APIs')
     # Setup the window.
     editor_window.closeEvent = editor.quit
-    editor_window.setup(editor.theme, MICROPYTHON_APIS)
-    # capture the filename passed by the os, if there was one
-    passed_filename = sys.argv[1] if len(sys.argv) > 1 else None
+    editor_window.setup(editor.theme, MICROPYTHON_APIS, DATA_DIR)
+    STARTUP.mark('Window.setup')
+    editor_window.tab_requested.connect(editor.show_placeholder)
+    editor_window.tab_text_ready.connect(editor.placeholder_loaded)
     editor.restore_session(passed_filename)
+    STARTUP.mark('restore_session')
+    editor_window.session_changed.connect(editor.save_session)
+    editor_window.lint_requested.connect(editor.lint)
+    editor_window.open_file.connect(editor.direct_load)
     # Connect the various buttons in the window to the editor.
     button_bar = editor_window.button_bar
     button_bar.connect("new", editor.new, "Ctrl+N")
@@ -86,9 +368,18 @@ def run():
     button_bar.connect("zoom-out", editor.zoom_out)
     button_bar.connect("theme", editor.toggle_theme)
     button_bar.connect("check", editor.check_code)
+    button_bar.connect("check-all", editor.check_all)
     button_bar.connect("help", editor.show_help)
     button_bar.connect("quit", editor.quit)
     # Finished starting up the application, so hide the splash icon.
     splash.finish(editor_window)
+    # Open the files passed on by other Mu processes.
+    server.file_requested.connect(editor.direct_load)
+    server.activate_requested.connect(editor_window.bring_to_front)
+    STARTUP.mark('connect and show')
+    logging.info('Loaded {} fonts while starting up'.format(Font.loaded))
+    # Startup ends once the event loop has handled what's waiting for it,
+    # such as showing the window.
+    QTimer.singleShot(0, lambda: startup_finished(profile_path))
     # Stop the program after the application finishes executing.
     sys.exit(app.exec_())
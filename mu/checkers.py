@@ -0,0 +1,151 @@
+"""
+PyFlakes and PyCodeStyle checkers customised for Mu. PyFlakes and PyCodeStyle
+take a while to import, so mu.logic only imports this module when code is
+first checked (see mu.logic.get_checkers).
+
+Copyright (c) 2015-2016 Nicholas H.Tollervey and others (see the AUTHORS file).
+
+Based upon work done for Puppy IDE by Dan Pope, Nicholas Tollervey and Damien
+George.
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+import tokenize
+from pyflakes.checker import Checker as FlakeChecker, Builtin, ModuleScope
+# Currently there is no pycodestyle deb packages, so fallback to old name
+try:  # pragma: no cover
+    from pycodestyle import StyleGuide, Checker, BaseReport, SKIP_TOKENS
+except ImportError:  # pragma: no cover
+    from pep8 import StyleGuide, Checker, BaseReport, SKIP_TOKENS
+
+
+def style_options():
+    """
+    Returns PyCodeStyle's default options, ignoring any configuration files
+    and command line arguments.
+    """
+    return StyleGuide(parse_argv=False, config_file=False).options
+
+
+class MuFlakeChecker(FlakeChecker):
+    """
+    A PyFlakes checker that knows what each board's module provides.
+
+    "from microbit import *" (for example) binds every name in the board's
+    namespace as if it were a builtin, so using them is fine, leaving them
+    unused is not reported and any other name is still reported as undefined.
+    The namespaces are given as a dictionary of the names each module
+    provides (see mu.logic.BOARD_NAMESPACES).
+    """
+
+    def __init__(self, tree, namespaces=None, **kwargs):
+        # Checking happens as the checker is created, so this comes first.
+        self.namespaces = namespaces or {}
+        super().__init__(tree, **kwargs)
+
+    def IMPORTFROM(self, node):
+        names = None
+        if node.level == 0 and [alias.name for alias in node.names] == ['*']:
+            names = self.namespaces.get(node.module)
+        if names is None or not isinstance(self.scope, ModuleScope):
+            return super().IMPORTFROM(node)
+        for name in names:
+            self.addBinding(node, Builtin(name))
+
+
+class MuStyleReport(BaseReport):
+    """
+    Collects the problems found by PyCodeStyle as structured data for Mu,
+    rather than printing them.
+    """
+
+    def __init__(self, options):
+        """
+        Set up the report object to be used to gather PyCodeStyle's results.
+        """
+        super().__init__(options)
+        self.feedback = {}
+
+    def error(self, line_number, offset, text, check):
+        """
+        Records a problem with the code at line_number and offset unless the
+        configured options ignore it. The text contains the problem's code and
+        a description (for example, "E303 too many blank lines (3)").
+        """
+        code = super().error(line_number, offset, text, check)
+        if code:
+            line_no = line_number - 1  # Zero based counting in Mu.
+            description = text[len(code) + 1:]
+            if code == 'E303':
+                description += ' above this line'
+            if line_no not in self.feedback:
+                self.feedback[line_no] = []
+            self.feedback[line_no].append({
+                'line_no': line_no,
+                'column': offset,
+                'message': description.capitalize(),
+                'code': code,
+            })
+        return code
+
+    def get_file_results(self):
+        """
+        Called once the checks are finished. Orders each line's problems by
+        column then code, as PyCodeStyle's own report does.
+        """
+        for problems in self.feedback.values():
+            problems.sort(key=lambda p: (p['column'], p['code']))
+        return super().get_file_results()
+
+
+class MuStyleChecker(Checker):
+    """
+    A PyCodeStyle Checker that can start part way through a file, given the
+    state the checker was in at that point (see the state property), and
+    which notes its state at the start of each top-level statement.
+    """
+
+    def __init__(self, lines, options, report, state=None):
+        super().__init__('untitled', lines=lines, options=options,
+                         report=report)
+        self.initial_indent_char, checker_states = state or (None, {})
+        self._checker_states = {name: dict(values) for name, values in
+                                checker_states.items()}
+        #: The state at the start of each top-level statement, by line.
+        self.block_states = {}
+
+    @property
+    def state(self):
+        """
+        The part of the checker's state that carries over from one top-level
+        statement to the next: the character used for indentation and the
+        state kept by individual checks (such as whether the imports at the
+        top of the file have finished).
+        """
+        return self.indent_char, {name: dict(values) for name, values in
+                                  self._checker_states.items()}
+
+    def readline(self):
+        if self.indent_char is None:
+            self.indent_char = self.initial_indent_char
+        return super().readline()
+
+    def check_logical(self):
+        for token_type, _, start, _, _ in self.tokens:
+            if token_type in SKIP_TOKENS or token_type == tokenize.COMMENT:
+                continue
+            if start[1] == 0:
+                self.block_states[start[0] - 1] = self.state
+            break
+        super().check_logical()
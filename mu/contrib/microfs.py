@@ -6,25 +6,105 @@ relating to file system based operations.
 You may:
 
 * ls - list files on the device. Based on the equivalent Unix command.
+* ls_long - list files on the device with their sizes and the free space.
 * rm - remove a named file on the device. Based on the Unix command.
 * put - copy a named local file onto the device a la equivalent FTP command.
 * get - copy a named file from the device to the local file system a la FTP.
+* deploy - copy the same local files onto one or all attached devices.
+* run - run a local script in the device's RAM and stream back its output.
 """
 from __future__ import print_function
 import ast
 import argparse
+import atexit
+import codecs
+import json
 import sys
 import os
 import time
 import os.path
+import re
+import threading
 from serial.tools.list_ports import comports as list_serial_ports
 from serial import Serial
 
 
 PY2 = sys.version_info < (3,)
+try:
+    from . import appdirs
+    _DATA_DIR = appdirs.user_data_dir(appname='mu', appauthor='python')
+except (ImportError, ValueError):  # pragma: no cover
+    # Not part of Mu (for example, run as a script).
+    _DATA_DIR = os.path.expanduser('~')
+
+
+__all__ = ['ls', 'ls_long', 'rm', 'put', 'get', 'deploy', 'run',
+           'get_serial']
+
+
+#: Seconds to wait for the device to reply to a command.
+TIMEOUT = 10
+#: Number of times in a row a chunk of a transfer is retried.
+RETRIES = 3
+#: Suffix of the temporary name a file is written to until it is complete.
+PART_SUFFIX = '.part'
+#: Script to print the size of a file on the device. The micro:bit has
+# os.size, other MicroPython boards only have os.stat.
+SIZE_SCRIPT = """import os
+try:
+    print(os.size('{0}'))
+except AttributeError:
+    print(os.stat('{0}')[6])
+"""
+#: Script to print the name and size of each file on the device along with
+# the free space in bytes (None if the device can't tell, like the micro:bit).
+LS_LONG_SCRIPT = """import os
+try:
+    size = os.size
+except AttributeError:
+    size = lambda name: os.stat(name)[6]
+try:
+    s = os.statvfs('/')
+    free = s[0] * s[3]
+except (AttributeError, OSError):
+    free = None
+print(repr(([(name, size(name)) for name in os.listdir()], free)))
+"""
+#: Script to print whether the device can rename files. The micro:bit can't.
+CAN_RENAME_SCRIPT = """import os
+print(hasattr(os, 'rename'))
+"""
+#: Script to replace a file on the device with a completed temporary file.
+RENAME_SCRIPT = """import os
+try:
+    os.remove('{1}')
+except OSError:
+    pass
+os.rename('{0}', '{1}')
+"""
+#: Script to close and remove a file left unfinished by a failed put.
+ABANDON_SCRIPT = """import os
+try:
+    fd.close()
+except NameError:
+    pass
+try:
+    os.remove('{0}')
+except OSError:
+    pass
+"""
 
 
-__all__ = ['ls', 'rm', 'put', 'get', 'get_serial']
+#: The USB vendor ID, product ID pairs of the boards that expose a MicroPython
+# REPL over serial.
+BOARD_IDS = set([
+    (0x0D28, 0x0204),  # micro:bit
+    (0x239A, 0x800B),  # Adafruit Feather M0 CDC only
+    (0x239A, 0x8016),  # Adafruit Feather M0 CDC + MSC
+    (0x239A, 0x8014),  # Adafruit Metro M0
+    (0x239A, 0x8019),  # Adafruit Circuit Playground M0
+    (0x239A, 0x801B),  # Adafruit Feather M0 Express
+])
 
 
 #: The help text to be shown when requested.
@@ -33,11 +113,19 @@ Interact with the basic filesystem on a connected BBC micro:bit device.
 You may use the following commands:
 
 'ls' - list files on the device (based on the equivalent Unix command);
+'ls-l' - list files on the device with their sizes and the free space;
 'rm' - remove a named file on the device (based on the Unix command);
-'put' - copy a named local file onto the device just like the FTP command; and,
-'get' - copy a named file from the device to the local file system a la FTP.
-
-For example, 'ufs ls' will list the files on a connected BBC micro:bit.
+'put' - copy a named local file onto the device just like the FTP command;
+'get' - copy a named file from the device to the local file system a la FTP;
+and,
+'deploy' - copy the named local files onto the device (or, with the
+           --all-devices flag, onto every attached device at the same time).
+'run' - run a named local script in the device's RAM, without writing it to
+        the device's file system, and show its output as it happens.
+
+For example, 'ufs ls' will list the files on a connected BBC micro:bit and
+'ufs deploy foo.py bar.py --all-devices' will copy foo.py and bar.py onto
+every attached device.
 """
 
 
@@ -52,6 +140,223 @@ def find_microbit():
     return None
 
 
+def find_microbits(board_ids=None):
+    """
+    Finds the ports of all the attached devices whose USB VID and PID are in
+    board_ids (defaults to BOARD_IDS).
+    """
+    if board_ids is None:
+        board_ids = BOARD_IDS
+    ids = ['VID:PID={:04X}:{:04X}'.format(vid, pid) for vid, pid in board_ids]
+    result = []
+    for port in list_serial_ports():
+        hwid = port[2].upper()
+        if any(board_id in hwid for board_id in ids):
+            result.append(port[0])
+    return sorted(result)
+
+
+class Pacing(object):
+    """
+    The chunk sizes and the pause between serial writes used to talk to one
+    type of board.
+
+    These start at values that are safe for the micro:bit and adapt, within
+    the bounds below, to the round-trip time of each command and to errors
+    from the device: a run of fast replies grows the chunks and shortens the
+    pause, a failure halves the chunks and doubles the pause. A MemoryError
+    also stops the chunks ever growing back to the size that caused it.
+    """
+    #: The (smallest, largest) number of bytes written to the port at once.
+    WRITE_SIZES = (32, 256)
+    #: The (smallest, largest) number of bytes sent by each put command.
+    PUT_SIZES = (64, 1024)
+    #: The (smallest, largest) number of bytes read by each get command.
+    GET_SIZES = (32, 512)
+    #: The (shortest, longest) pause in seconds between writes to the port.
+    DELAYS = (0.002, 0.05)
+    #: The number of fast replies in a row needed before the chunks grow.
+    GROW_AFTER = 4
+    #: A reply this many times slower than usual counts as the device
+    # struggling to keep up.
+    SLOW_REPLY = 3
+
+    def __init__(self):
+        self.write_size = self.WRITE_SIZES[0]
+        self.put_size = self.PUT_SIZES[0]
+        self.get_size = self.GET_SIZES[0]
+        self.put_limit = self.PUT_SIZES[1]
+        self.get_limit = self.GET_SIZES[1]
+        self.delay = 0.01
+        self.rtt = None  # Smoothed round-trip time in seconds.
+        self._fast_replies = 0
+
+    def success(self, rtt):
+        """
+        Records that a command took rtt seconds to be answered.
+        """
+        if self.rtt is not None and rtt > self.rtt * self.SLOW_REPLY:
+            self._fast_replies = 0
+            self.delay = min(self.delay * 2, self.DELAYS[1])
+        else:
+            self._fast_replies += 1
+            self.delay = max(self.delay * 0.8, self.DELAYS[0])
+            if self._fast_replies >= self.GROW_AFTER:
+                self._fast_replies = 0
+                self.write_size = min(self.write_size * 2,
+                                      self.WRITE_SIZES[1])
+                self.put_size = min(self.put_size * 2, self.put_limit)
+                self.get_size = min(self.get_size * 2, self.get_limit)
+        if self.rtt is None:
+            self.rtt = rtt
+        else:
+            self.rtt = 0.875 * self.rtt + 0.125 * rtt
+
+    def state(self):
+        """
+        Returns a dictionary of what has been learned, to be saved between
+        runs.
+        """
+        return {
+            'write_size': self.write_size,
+            'put_size': self.put_size,
+            'get_size': self.get_size,
+            'put_limit': self.put_limit,
+            'get_limit': self.get_limit,
+            'delay': self.delay,
+            'rtt': self.rtt,
+        }
+
+    def restore(self, state):
+        """
+        Takes up what was learned in an earlier run (see state), keeping every
+        value within its bounds in case the saved state is stale or damaged.
+        """
+        def bounded(key, bounds, limit=None):
+            value = state.get(key)
+            if not isinstance(value, (int, float)):
+                return getattr(self, key)
+            upper = bounds[1] if limit is None else min(bounds[1], limit)
+            return type(bounds[0])(max(bounds[0], min(value, upper)))
+
+        self.put_limit = bounded('put_limit', self.PUT_SIZES)
+        self.get_limit = bounded('get_limit', self.GET_SIZES)
+        self.write_size = bounded('write_size', self.WRITE_SIZES)
+        self.put_size = bounded('put_size', self.PUT_SIZES, self.put_limit)
+        self.get_size = bounded('get_size', self.GET_SIZES, self.get_limit)
+        self.delay = bounded('delay', self.DELAYS)
+        rtt = state.get('rtt')
+        self.rtt = rtt if isinstance(rtt, (int, float)) and rtt > 0 else None
+
+    def failure(self, out_of_memory=False):
+        """
+        Records that a command was lost, garbled or, if out_of_memory is True,
+        too big for the device's memory.
+        """
+        if out_of_memory:
+            self.put_limit = max(self.put_size // 2, self.PUT_SIZES[0])
+            self.get_limit = max(self.get_size // 2, self.GET_SIZES[0])
+        self._fast_replies = 0
+        self.delay = min(self.delay * 2, self.DELAYS[1])
+        self.write_size = max(self.write_size // 2, self.WRITE_SIZES[0])
+        self.put_size = max(self.put_size // 2, self.PUT_SIZES[0])
+        self.get_size = max(self.get_size // 2, self.GET_SIZES[0])
+
+
+#: The pacing learned for each type of board, keyed by USB (VID, PID).
+PACING = {}
+#: The file the pacing is kept in between runs, so each invocation of ufs
+# (or Mu) starts with what was learned about each type of board last time.
+PACING_FILE = os.path.join(_DATA_DIR, 'microfs_pacing.json')
+#: Whether PACING_FILE has been read yet.
+_PACING_LOADED = False
+_PACING_LOCK = threading.Lock()
+#: The (VID, PID) of the board on each serial port seen so far.
+_PORT_BOARDS = {}
+
+
+def board_id(port):
+    """
+    Returns the (VID, PID) of the board attached to the named port, or None
+    if it can't be found.
+    """
+    if port not in _PORT_BOARDS:
+        _PORT_BOARDS[port] = None
+        for info in list_serial_ports():
+            match = re.search(r'VID:PID=([0-9A-F]{4}):([0-9A-F]{4})',
+                              info[2].upper())
+            if info[0] == port and match:
+                _PORT_BOARDS[port] = (int(match.group(1), 16),
+                                      int(match.group(2), 16))
+    return _PORT_BOARDS[port]
+
+
+def get_pacing(serial):
+    """
+    Returns the Pacing shared by every board of the same type as the one
+    connected to serial.
+    """
+    global _PACING_LOADED
+    key = board_id(getattr(serial, 'port', None))
+    with _PACING_LOCK:
+        if not _PACING_LOADED:
+            _PACING_LOADED = True
+            load_pacing()
+            atexit.register(save_pacing)
+        if key not in PACING:
+            PACING[key] = Pacing()
+        return PACING[key]
+
+
+def load_pacing(path=None):
+    """
+    Takes up the pacing saved for each type of board by save_pacing in the
+    referenced file (defaults to PACING_FILE). A missing or damaged file is
+    ignored.
+    """
+    path = path or PACING_FILE
+    try:
+        with open(path) as f:
+            saved = json.load(f)
+        for key, state in saved.items():
+            vid, pid = (int(part, 16) for part in key.split(':'))
+            pacing = Pacing()
+            pacing.restore(state)
+            PACING[(vid, pid)] = pacing
+    except (IOError, OSError, ValueError, AttributeError):
+        pass
+
+
+def save_pacing(path=None):
+    """
+    Saves the pacing learned for each type of board to the referenced file
+    (defaults to PACING_FILE), replacing it atomically. Errors are ignored
+    since this only saves time later.
+    """
+    path = path or PACING_FILE
+    saved = {}
+    for key, pacing in list(PACING.items()):
+        if key is not None:
+            saved['{:04X}:{:04X}'.format(*key)] = pacing.state()
+    if not saved:
+        return
+    temp = path + '.tmp'
+    try:
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(temp, 'w') as f:
+            json.dump(saved, f, indent=2)
+        if hasattr(os, 'replace'):
+            os.replace(temp, path)
+        else:  # pragma: no cover
+            if os.path.exists(path):
+                os.remove(path)
+            os.rename(temp, path)
+    except (IOError, OSError):
+        pass
+
+
 def raw_on(serial):
     """
     Puts the device into raw mode.
@@ -69,12 +374,13 @@ def raw_off(serial):
     serial.write(b'\x02')  # Send CTRL-B to get out of raw mode.
 
 
-def get_serial():
+def get_serial(port=None):
     """
     Detect if a micro:bit is connected and return a serial object to talk to
-    it.
+    it. If a port is given, connect to the device on that port instead.
     """
-    port = find_microbit()
+    if port is None:
+        port = find_microbit()
     if port is None:
         raise IOError('Could not find micro:bit.')
     return Serial(port, 115200, timeout=1, parity='N')
@@ -92,17 +398,8 @@ def execute(commands, serial):
     """
     result = b''
     raw_on(serial)
-    # Write the actual command and send CTRL-D to evaluate.
     for command in commands:
-        command_bytes = command.encode('utf-8')
-        for i in range(0, len(command_bytes), 32):
-            serial.write(command_bytes[i:min(i + 32, len(command_bytes))])
-            time.sleep(0.01)
-        serial.write(b'\x04')
-        response = bytearray()
-        while not response.endswith(b'\x04>'):  # Read until prompt.
-            response.extend(serial.read_all())
-        out, err = response[2:-2].split(b'\x04', 1)  # Split stdout, stderr
+        out, err = execute_raw(command, serial)
         result += out
         if err:
             return b'', err
@@ -110,6 +407,82 @@ def execute(commands, serial):
     return result, err
 
 
+def execute_raw(command, serial, timeout=TIMEOUT):
+    """
+    Sends a single command to a device that is already in raw mode and
+    returns the stdout and stderr output from the device.
+
+    Raises an IOError if the device doesn't reply within timeout seconds or
+    the reply cannot be understood.
+
+    The outcome is recorded in the board's Pacing, which sets the size of
+    each write to the port and the pause after it.
+    """
+    pacing = get_pacing(serial)
+    # Write the actual command and send CTRL-D to evaluate.
+    command_bytes = command.encode('utf-8')
+    size = pacing.write_size
+    for i in range(0, len(command_bytes), size):
+        serial.write(command_bytes[i:min(i + size, len(command_bytes))])
+        time.sleep(pacing.delay)
+    serial.write(b'\x04')
+    sent = time.time()
+    response = bytearray()
+    while not response.endswith(b'\x04>'):  # Read until prompt.
+        if time.time() > sent + timeout:
+            pacing.failure()
+            raise IOError('Timed out waiting for the device.')
+        response.extend(serial.read_all())
+    if b'\x04' not in response[2:-2]:
+        pacing.failure()
+        raise IOError('Could not understand the reply from the device.')
+    out, err = response[2:-2].split(b'\x04', 1)  # Split stdout, stderr
+    if b'MemoryError' in err:
+        pacing.failure(out_of_memory=True)
+    elif b'SyntaxError' in err:
+        # The command was garbled on the way to the device.
+        pacing.failure()
+    else:
+        pacing.success(time.time() - sent)
+    return bytes(out), bytes(err)
+
+
+def _run(command, serial):
+    """
+    Runs a single command on a device in raw mode and returns its stdout.
+    Raises an IOError if there's a problem.
+    """
+    out, err = execute_raw(command, serial)
+    if err:
+        raise IOError(clean_error(err))
+    return out
+
+
+def _transfer(serial, size, send_chunk):
+    """
+    Calls send_chunk(offset) to move each chunk of a file of size bytes to or
+    from the device. send_chunk must be safe to repeat for the same offset and
+    return the offset up to which the device acknowledges the file as done.
+
+    If a chunk fails the device is put back into raw mode and the transfer
+    resumes from the last good chunk. An IOError is raised after RETRIES
+    failures in a row.
+    """
+    done = 0
+    failures = 0
+    while done < size:
+        try:
+            if failures:
+                raw_on(serial)
+            done = send_chunk(done)
+            failures = 0
+        except (IOError, ValueError) as ex:
+            failures += 1
+            if failures > RETRIES:
+                raise IOError(str(ex) or 'Transfer failed.')
+    return done
+
+
 def clean_error(err):
     """
     Take stderr bytes returned from MicroPython and attempt to create a
@@ -138,6 +511,22 @@ def ls(serial):
     return ast.literal_eval(out.decode('utf-8'))
 
 
+def ls_long(serial):
+    """
+    Returns a tuple containing a list of (name, size in bytes) tuples for the
+    files on the connected device and the free space on the device in bytes
+    (or None if the device can't tell). Raises an IOError if there's a
+    problem.
+
+    Everything is found by a single script run on the device.
+    """
+    out, err = execute([LS_LONG_SCRIPT], serial)
+    if err:
+        raise IOError(clean_error(err))
+    files, free = ast.literal_eval(out.decode('utf-8'))
+    return [tuple(f) for f in files], free
+
+
 def rm(serial, filename):
     """
     Removes a referenced file on the micro:bit.
@@ -154,10 +543,23 @@ def rm(serial, filename):
     return True
 
 
-def put(serial, filename):
+def put(serial, filename, target=None):
     """
     Puts a referenced file on the LOCAL file system onto the
-    file system on the BBC micro:bit.
+    file system on the BBC micro:bit. The file is called target on the device
+    (defaults to the name of the local file).
+
+    The file is sent in chunks which the device acknowledges one at a time,
+    so a chunk lost or damaged by a bad connection is resent without starting
+    again. The size of the chunks adapts to how well the device is coping
+    (see Pacing).
+
+    On devices that can rename files the chunks are written to a temporary
+    file which only replaces target once every chunk has arrived. The
+    micro:bit can't rename files, and copying the temporary file would need
+    room for two copies of it on a file system of around 30k, so there the
+    chunks are written straight to target. Either way, if the transfer fails
+    the unfinished file is removed from the device.
 
     Returns True for success or raises an IOError if there's a problem.
     """
@@ -165,52 +567,266 @@ def put(serial, filename):
         raise IOError('No such file.')
     with open(filename, 'rb') as local:
         content = local.read()
-    filename = os.path.basename(filename)
-    commands = [
-        "fd = open('{}', 'wb')".format(filename),
-        "f = fd.write",
-    ]
-    while content:
-        line = content[:64]
-        if PY2:
-            commands.append('f(b' + repr(line) + ')')
-        else:
-            commands.append('f(' + repr(line) + ')')
-        content = content[64:]
-    commands.append('fd.close()')
-    out, err = execute(commands, serial)
-    if err:
-        raise IOError(clean_error(err))
+    if target is None:
+        target = os.path.basename(filename)
+    pacing = get_pacing(serial)
+
+    def send_chunk(offset):
+        line = content[offset:offset + pacing.put_size]
+        literal = 'b' + repr(line) if PY2 else repr(line)
+        # Only write the chunk if the device hasn't already got it and it
+        # arrived whole (bytes lost inside the literal still leave valid
+        # Python), then acknowledge by printing how many bytes the device
+        # has written.
+        command = "d = {}\nif n == {} and len(d) == {}:\n    n += f(d)\n" \
+                  "print(n)".format(literal, offset, len(line))
+        acknowledged = int(_run(command, serial))
+        if acknowledged != offset + len(line):
+            raise IOError('Chunk at byte {} was not written.'.format(offset))
+        return acknowledged
+
+    raw_on(serial)
+    can_rename = _run(CAN_RENAME_SCRIPT, serial).strip() == b'True'
+    part = target + PART_SUFFIX if can_rename else target
+    try:
+        _run("fd = open('{}', 'wb')\nf = fd.write\nn = 0".format(part),
+             serial)
+        _transfer(serial, len(content), send_chunk)
+        _run('fd.close()', serial)
+        if can_rename:
+            _run(RENAME_SCRIPT.format(part, target), serial)
+    except Exception:
+        _abandon(serial, part)
+        raise
+    raw_off(serial)
     return True
 
 
+def _abandon(serial, name):
+    """
+    Makes a last attempt to close and remove the named file left unfinished
+    on the device by a failed put. Any error is ignored since the device may
+    well be the reason the put failed.
+    """
+    try:
+        raw_on(serial)
+        execute_raw(ABANDON_SCRIPT.format(name), serial)
+        raw_off(serial)
+    except Exception:
+        pass
+
+
 def get(serial, filename, target=None):
     """
     Gets a referenced file on the device's file system and copies it to the
     target (or current working directory if unspecified).
 
+    The file is read in chunks and each is checked on arrival, so a chunk
+    lost to a bad connection is asked for again without starting over. The
+    target is only replaced once every chunk has arrived. The size of the
+    chunks adapts to how well the device is coping (see Pacing).
+
     Returns True for success or raises an IOError if there's a problem.
     """
     if target is None:
         target = filename
-    commands = [
-        "from microbit import uart",
-        "f = open('{}', 'rb')".format(filename),
-        "r = f.read",
-        "result = True",
-        "while result:\n    result = r(32)\n    if result:\n        "
-        "uart.write(result)\n",
-        "f.close()",
-    ]
-    out, err = execute(commands, serial)
+    pacing = get_pacing(serial)
+    raw_on(serial)
+    size = int(_run(SIZE_SCRIPT.format(filename), serial))
+    _run("from microbit import uart\nfd = open('{}', 'rb')\nr = fd.read\n"
+         "n = 0\nc = b''".format(filename), serial)
+    chunks = {}
+    requests = {}
+
+    def get_chunk(offset):
+        # A lost chunk must be asked for again with the same size since the
+        # device may already have read it.
+        request = requests.setdefault(offset, pacing.get_size)
+        # Only read a new chunk if the device hasn't already sent it, so a
+        # lost chunk is sent again.
+        command = "if n == {}:\n    c = r({})\n    n += len(c)\n" \
+                  "uart.write(c)".format(offset, request)
+        out, err = execute_raw(command, serial)
+        if err:
+            # The read failed on the device, so a different size is safe.
+            del requests[offset]
+            raise IOError(clean_error(err))
+        if len(out) != min(request, size - offset):
+            raise IOError('Incomplete chunk received from the device.')
+        chunks[offset] = out
+        return offset + len(out)
+
+    _transfer(serial, size, get_chunk)
+    _run('fd.close()', serial)
+    raw_off(serial)
+    part = target + PART_SUFFIX
+    with open(part, 'wb') as f:
+        f.write(b''.join(chunks[offset] for offset in sorted(chunks)))
+    if os.path.exists(target):
+        os.remove(target)
+    os.rename(part, target)
+    return True
+
+
+def run(serial, script, timeout=None, out=None):
+    """
+    Runs the referenced Python script (a string) in the device's RAM via the
+    raw REPL. Nothing is written to the device's file system or flash.
+
+    Whatever the script prints is written to out (defaults to sys.stdout) as
+    soon as it arrives. If timeout seconds pass before the script finishes
+    it is interrupted with CTRL-C, after which the device has TIMEOUT seconds
+    to stop.
+
+    Returns True for success or raises an IOError containing the traceback
+    if the script fails, or a message if it times out.
+    """
+    if out is None:
+        out = sys.stdout
+    pacing = get_pacing(serial)
+    raw_on(serial)
+    command_bytes = script.encode('utf-8')
+    size = pacing.write_size
+    for i in range(0, len(command_bytes), size):
+        serial.write(command_bytes[i:min(i + size, len(command_bytes))])
+        time.sleep(pacing.delay)
+    serial.write(b'\x04')
+    deadline = None if timeout is None else time.time() + timeout
+    decoder = codecs.getincrementaldecoder('utf-8')('replace')
+    # The raw REPL replies with OK, stdout, CTRL-D, stderr, CTRL-D then >.
+    response = bytearray()
+    stdout_done = False
+    timed_out = False
+    while True:
+        response.extend(serial.read(serial.in_waiting or 1))
+        if not stdout_done and len(response) > 2:
+            end = response.find(b'\x04', 2)
+            if end == -1:
+                out.write(decoder.decode(bytes(response[2:])))
+                del response[2:]
+            else:
+                out.write(decoder.decode(bytes(response[2:end]), True))
+                del response[:end + 1]
+                stdout_done = True
+            out.flush()
+        if stdout_done and response.endswith(b'\x04>'):
+            break
+        if deadline is not None and time.time() > deadline:
+            if timed_out:
+                raise IOError('The device stopped responding.')
+            serial.write(b'\x03')  # Send CTRL-C to interrupt the script.
+            timed_out = True
+            deadline = time.time() + TIMEOUT
+    raw_off(serial)
+    if timed_out:
+        raise IOError('Timed out after {} seconds.'.format(timeout))
+    err = bytes(response[:-2])
     if err:
-        raise IOError(clean_error(err))
-    # Recombine the bytes while removing "b'" from start and "'" from end.
-    with open(target, 'wb') as f:
-        f.write(out)
+        raise IOError(err.decode('utf-8', 'replace').strip())
     return True
 
 
+def deploy(filenames, ports=None, progress=None):
+    """
+    Puts the same referenced files on the LOCAL file system onto each of the
+    devices attached to the given serial ports (defaults to every attached
+    device listed in BOARD_IDS). The devices are written to in parallel, one
+    thread per device.
+
+    If given, progress is called as progress(port, done, status) every time
+    the state of a device changes, where done is the number of files already
+    copied and status is a short description of what is happening.
+
+    Returns a dictionary mapping each port to None for success or to a message
+    describing the problem. Raises an IOError if a file or the devices cannot
+    be found.
+    """
+    for filename in filenames:
+        if not os.path.isfile(filename):
+            raise IOError('No such file: {}'.format(filename))
+    if ports is None:
+        ports = find_microbits()
+    if not ports:
+        raise IOError('Could not find any attached devices.')
+    results = {}
+
+    def report(port, done, status):
+        if progress:
+            progress(port, done, status)
+
+    def deploy_to(port):
+        done = 0
+        try:
+            with get_serial(port) as serial:
+                for filename in filenames:
+                    report(port, done, os.path.basename(filename))
+                    put(serial, filename)
+                    done += 1
+        except Exception as ex:
+            results[port] = str(ex) or ex.__class__.__name__
+            report(port, done, 'failed: {}'.format(results[port]))
+        else:
+            results[port] = None
+            report(port, done, 'done')
+
+    threads = [threading.Thread(target=deploy_to, args=(port, ))
+               for port in ports]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class ProgressTable(object):
+    """
+    Shows the progress of a deploy as a table with a row for each device.
+
+    Instances are callable so they can be passed as deploy's progress
+    argument. On a terminal the table is redrawn in place, otherwise each
+    change is printed as a new line.
+    """
+
+    def __init__(self, ports, total, out=None):
+        self.ports = list(ports)
+        self.total = total
+        self.out = out if out else sys.stdout
+        self.rows = dict((port, (0, 'waiting')) for port in self.ports)
+        self.redraw = os.name != 'nt' and hasattr(self.out, 'isatty') and \
+            self.out.isatty()
+        self._drawn = False
+        self._lock = threading.Lock()
+
+    def __call__(self, port, done, status):
+        with self._lock:
+            self.rows[port] = (done, status)
+            if self.redraw:
+                self.draw()
+            else:
+                self.out.write(self.format_row(port) + '\n')
+            self.out.flush()
+
+    def format_row(self, port):
+        """
+        Returns the text of the row for the referenced port.
+        """
+        done, status = self.rows[port]
+        return '{:<24} {:>3}/{:<3} {}'.format(port, done, self.total, status)
+
+    def draw(self):
+        """
+        Draws the whole table, over the top of the last drawing if there was
+        one.
+        """
+        if self._drawn:
+            # Move the cursor back up to the first row.
+            self.out.write('\x1b[{}A'.format(len(self.ports)))
+        for port in self.ports:
+            # Clear to the end of the line in case the row got shorter.
+            self.out.write(self.format_row(port) + '\x1b[K\n')
+        self._drawn = True
+
+
 def main(argv=None):
     """
     Entry point for the command line tool 'ufs'.
@@ -224,15 +840,28 @@ def main(argv=None):
     try:
         parser = argparse.ArgumentParser(description=_HELP_TEXT)
         parser.add_argument('command', nargs='?', default=None,
-                            help="One of 'ls', 'rm', 'put' or 'get'.")
-        parser.add_argument('path', nargs='?', default=None,
+                            help="One of 'ls', 'ls-l', 'rm', 'put', 'get', "
+                                 "'deploy' or 'run'.")
+        parser.add_argument('paths', nargs='*', default=[],
                             help="Use when a file needs referencing.")
+        parser.add_argument('--all-devices', action='store_true',
+                            help="Deploy to every attached device.")
+        parser.add_argument('--timeout', type=float, default=None,
+                            help="Seconds a script may run for.")
         args = parser.parse_args(argv)
+        args.path = args.paths[0] if args.paths else None
         if args.command == 'ls':
             with get_serial() as serial:
                 list_of_files = ls(serial)
                 if list_of_files:
                     print(' '.join(list_of_files))
+        elif args.command == 'ls-l':
+            with get_serial() as serial:
+                list_of_files, free = ls_long(serial)
+                for name, size in list_of_files:
+                    print('{:>8} {}'.format(size, name))
+                if free is not None:
+                    print('{} bytes free'.format(free))
         elif args.command == 'rm':
             if args.path:
                 with get_serial() as serial:
@@ -251,6 +880,31 @@ def main(argv=None):
                     get(serial, args.path)
             else:
                 print('get: missing filename. (e.g. "ufs get foo.txt")')
+        elif args.command == 'run':
+            if args.path:
+                with open(args.path) as f:
+                    script = f.read()
+                with get_serial() as serial:
+                    run(serial, script, args.timeout)
+            else:
+                print('run: missing filename. (e.g. "ufs run foo.py")')
+        elif args.command == 'deploy':
+            if args.paths:
+                if args.all_devices:
+                    ports = find_microbits()
+                else:
+                    port = find_microbit()
+                    ports = [port] if port else []
+                if not ports:
+                    raise IOError('Could not find any attached devices.')
+                progress = ProgressTable(ports, len(args.paths))
+                results = deploy(args.paths, ports, progress)
+                failed = [port for port in ports if results[port]]
+                print('Deployed to {} of {} devices.'.format(
+                      len(ports) - len(failed), len(ports)))
+            else:
+                print('deploy: missing filenames. '
+                      '(e.g. "ufs deploy foo.py bar.py --all-devices")')
         else:
             # Display some help.
             parser.print_help()
@@ -17,31 +17,51 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
+import codecs
+import glob
+import hashlib
 import keyword
 import os
 import re
 import platform
 import logging
-from PyQt5.QtCore import QSize, Qt, pyqtSignal, QIODevice
+import time
+from collections import OrderedDict
+from PyQt5.QtCore import QSize, Qt, pyqtSignal, QIODevice, QTimer
 from PyQt5.QtWidgets import (QToolBar, QAction, QStackedWidget, QDesktopWidget,
                              QWidget, QVBoxLayout, QShortcut, QSplitter,
                              QTabWidget, QFileDialog, QMessageBox, QTextEdit,
                              QFrame, QListWidget, QGridLayout, QLabel, QMenu,
-                             QApplication)
+                             QApplication, QListWidgetItem)
 from PyQt5.QtGui import (QKeySequence, QColor, QTextCursor, QFontDatabase,
-                         QCursor)
+                         QCursor, QFont)
 from PyQt5.Qsci import QsciScintilla, QsciLexerPython, QsciAPIs
-from PyQt5.QtSerialPort import QSerialPort
 from mu import __version__
-from mu.contrib import microfs
+from mu.logic import get_microfs, get_qtserialport
 from mu.resources import load_icon, load_stylesheet, load_font_data
 
 #: The default font size.
 DEFAULT_FONT_SIZE = 14
+#: Milliseconds without further changes to the session before it is saved.
+SESSION_SAVE_DELAY = 1000
+#: Milliseconds typing must pause for before the code is checked.
+LINT_DELAY = 750
+#: Seconds handling a key press may take before it's logged as slow.
+SLOW_KEYSTROKE = 0.02
+#: Number of key presses between each summary of how long they took.
+KEYSTROKE_REPORT_INTERVAL = 1000
 #: All editor windows use the same font
 FONT_NAME = "Source Code Pro"
 FONT_FILENAME_PATTERN = "SourceCodePro-{variant}.otf"
-FONT_VARIANTS = ("Bold", "BoldIt", "It", "Regular", "Semibold", "SemiboldIt")
+#: The variant (font file) providing each style of the font that's used.
+FONT_STYLE_VARIANTS = {
+    "Regular": "Regular",
+    "Italic": "It",
+    "Semibold": "Semibold",
+    "Semibold Italic": "SemiboldIt",
+}
+#: Number of loaded fonts (of different styles and sizes) kept for reuse.
+FONT_CACHE_SIZE = 32
 # Load the two themes from resources/css/[night|day].css
 #: NIGHT_STYLE is a dark high contrast theme.
 NIGHT_STYLE = load_stylesheet('night.css')
@@ -54,12 +74,63 @@ RE_VALID_WORD = re.compile('^[A-Za-z0-9_-]*$')
 logger = logging.getLogger(__name__)
 
 
+class LatencyMonitor:
+    """
+    Keeps track of how long something that happens often (such as handling a
+    key press) takes. Slow cases are logged as they happen and a summary is
+    logged every report_interval times.
+    """
+
+    def __init__(self, name, threshold, report_interval):
+        self.name = name
+        self.threshold = threshold
+        self.report_interval = report_interval
+        self.count = 0
+        self.total = 0.0
+        self.worst = 0.0
+
+    def record(self, seconds):
+        """
+        Records that it took the referenced number of seconds once more.
+        """
+        self.count += 1
+        self.total += seconds
+        self.worst = max(self.worst, seconds)
+        if seconds > self.threshold:
+            logger.debug('Slow {}: {:.1f}ms'.format(self.name,
+                                                    seconds * 1000))
+        if self.count % self.report_interval == 0:
+            logger.info(self)
+
+    @property
+    def mean(self):
+        """
+        The average time taken in seconds.
+        """
+        return self.total / self.count if self.count else 0.0
+
+    def __str__(self):
+        return '{}: {} recorded, mean {:.2f}ms, worst {:.2f}ms'.format(
+            self.name, self.count, self.mean * 1000, self.worst * 1000)
+
+
+#: How long the editor takes to handle each key press, checks included.
+KEYSTROKES = LatencyMonitor('keystroke', SLOW_KEYSTROKE,
+                            KEYSTROKE_REPORT_INTERVAL)
+
+
 class Font:
     """
     Utility class that makes it easy to set font related values within the
     editor.
     """
     _DATABASE = None
+    #: Fonts already loaded from the database, keyed by (style name, size).
+    _CACHE = OrderedDict()
+    #: How many fonts have been loaded from the database.
+    loaded = 0
+    #: The variants of the font whose files have been loaded.
+    _REGISTERED = set()
 
     def __init__(self, color='black', paper='white', bold=False, italic=False):
         self.color = color
@@ -70,23 +141,53 @@ class Font:
     @classmethod
     def get_database(cls):
         """
-        Create a font database and load the MU builtin fonts into it.
-        This is a cached classmethod so the font files aren't re-loaded
-        every time a font is refereced
+        Create a font database for the MU builtin fonts. This is a cached
+        classmethod so the database is only created once. The fonts' files
+        are only loaded when a font in their style is needed (see register).
         """
         if cls._DATABASE is None:
+            cls._CACHE.clear()
+            cls._REGISTERED.clear()
             cls._DATABASE = QFontDatabase()
-            for variant in FONT_VARIANTS:
-                filename = FONT_FILENAME_PATTERN.format(variant=variant)
-                font_data = load_font_data(filename)
-                cls._DATABASE.addApplicationFontFromData(font_data)
         return cls._DATABASE
 
+    @classmethod
+    def register(cls, stylename):
+        """
+        Make sure the file for the referenced style of the font has been
+        loaded into the font database, and return the database.
+        """
+        database = cls.get_database()
+        variant = FONT_STYLE_VARIANTS[stylename]
+        if variant not in cls._REGISTERED:
+            filename = FONT_FILENAME_PATTERN.format(variant=variant)
+            if database.addApplicationFontFromData(
+                    load_font_data(filename)) == -1:
+                logger.warning('Could not load font {}'.format(filename))
+            cls._REGISTERED.add(variant)
+        return database
+
     def load(self, size=DEFAULT_FONT_SIZE):
         """
         Load the font from the font database, using the correct size and style
-        """
-        return Font.get_database().font(FONT_NAME, self.stylename, size)
+
+        Each style and size is only loaded once (while it's among the
+        FONT_CACHE_SIZE most recently used). Zooming to a new size loads
+        fonts of that size, rather than replacing those already loaded. A
+        copy is returned, so changing it doesn't change the cached font.
+        """
+        database = Font.register(self.stylename)
+        key = (self.stylename, size)
+        font = Font._CACHE.get(key)
+        if font is None:
+            font = database.font(FONT_NAME, self.stylename, size)
+            Font.loaded += 1
+            Font._CACHE[key] = font
+            if len(Font._CACHE) > FONT_CACHE_SIZE:
+                Font._CACHE.popitem(last=False)
+        else:
+            Font._CACHE.move_to_end(key)
+        return QFont(font)
 
     @property
     def stylename(self):
@@ -108,19 +209,36 @@ class Theme:
     Defines a font and other theme specific related information.
     """
 
+    @classmethod
+    def style_table(cls):
+        """
+        Returns the font for all styles and a list of (style number, colour,
+        paper, font) tuples, one for each style the theme defines. The table
+        is worked out the first time it's needed and then kept, so applying
+        the theme again doesn't look anything up in the font database.
+        """
+        if '_style_table' not in cls.__dict__:
+            styles = []
+            for name, font in cls.__dict__.items():
+                if not isinstance(font, Font):
+                    continue
+                style_num = getattr(QsciLexerPython, name)
+                styles.append((style_num, QColor(font.color),
+                               QColor(font.paper), font.load()))
+            cls._style_table = (Font().load(), styles)
+        return cls._style_table
+
     @classmethod
     def apply_to(cls, lexer):
+        default_font, styles = cls.style_table()
         # Apply a font for all styles
-        lexer.setFont(Font().load())
+        lexer.setFont(default_font)
 
-        for name, font in cls.__dict__.items():
-            if not isinstance(font, Font):
-                continue
-            style_num = getattr(lexer, name)
-            lexer.setColor(QColor(font.color), style_num)
+        for style_num, color, paper, font in styles:
+            lexer.setColor(color, style_num)
             lexer.setEolFill(True, style_num)
-            lexer.setPaper(QColor(font.paper), style_num)
-            lexer.setFont(font.load(), style_num)
+            lexer.setPaper(paper, style_num)
+            lexer.setFont(font, style_num)
 
 
 class DayTheme(Theme):
@@ -201,15 +319,109 @@ class PythonLexer(QsciLexerPython):
         return ' '.join(kws)
 
 
+#: The lexers owning the prepared autocomplete APIs shared by the editors,
+# keyed by the entries the APIs were prepared from.
+_SHARED_APIS = {}
+
+
+def prepared_api_filename(entries):
+    """
+    Returns the name of the file in which the autocomplete APIs prepared
+    from the referenced entries are kept. The name includes a hash of the
+    entries and Mu's version, so the file is only used if neither has
+    changed.
+    """
+    digest = hashlib.sha1(__version__.encode('utf-8'))
+    for entry in entries:
+        digest.update(entry.encode('utf-8'))
+        digest.update(b'\0')
+    return 'api-{}.prepared'.format(digest.hexdigest())
+
+
+def save_prepared_api(api, path):
+    """
+    Saves the referenced prepared autocomplete APIs to the referenced path
+    and removes any saved for other entries or versions of Mu.
+    """
+    temp_path = path + '.tmp'
+    if not api.savePrepared(temp_path):
+        logger.warning('Could not save autocomplete APIs to {}'.format(path))
+        return
+    try:
+        os.replace(temp_path, path)
+    except OSError as ex:
+        logger.error('Could not save autocomplete APIs to {}'.format(path))
+        logger.error(ex)
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        return
+    logger.info('Saved prepared autocomplete APIs to {}'.format(path))
+    pattern = os.path.join(os.path.dirname(path), 'api-*.prepared')
+    for old_path in glob.glob(pattern):
+        if old_path != path:
+            try:
+                os.remove(old_path)
+            except OSError as ex:
+                logger.warning('Could not remove {}'.format(old_path))
+                logger.warning(ex)
+
+
+def shared_api(entries, cache_dir=None):
+    """
+    Returns autocomplete APIs prepared from the referenced entries. Every
+    editor using the same entries shares the same APIs, so they're only
+    prepared once. The APIs belong to a lexer of their own, which is never
+    given to an editor, so they outlive any tab.
+
+    If a cache_dir is given, the APIs are loaded from the data prepared by an
+    earlier run if possible. Otherwise they're prepared in the background
+    (as QScintilla always does) and then saved there for next time.
+    """
+    key = tuple(entries)
+    if key not in _SHARED_APIS:
+        lexer = PythonLexer()
+        api = QsciAPIs(lexer)
+        path = None
+        if cache_dir:
+            path = os.path.join(cache_dir, prepared_api_filename(entries))
+        if path and os.path.exists(path) and api.loadPrepared(path):
+            logger.info('Loaded prepared autocomplete APIs from {}'.format(
+                        path))
+        else:
+            for entry in entries:
+                api.add(entry)
+            if path:
+                api.apiPreparationFinished.connect(
+                    lambda: save_prepared_api(api, path))
+            api.prepare()
+        _SHARED_APIS[key] = lexer
+    return _SHARED_APIS[key].apis()
+
+
 class EditorPane(QsciScintilla):
     """
     Represents the text editor.
     """
 
+    #: Emitted with the revision of the code that was checked and the
+    # feedback from PyFlakes and PyCodeStyle once a check has finished.
+    lint_finished = pyqtSignal(int, object, object)
+    #: Emitted once the text has been changed and then left alone for
+    # LINT_DELAY milliseconds, so it's time to check it.
+    lint_requested = pyqtSignal()
+
     def __init__(self, path, text, api=None):
         super().__init__()
         self.path = path
         self.setText(text)
+        # Incremented with every change to the text.
+        self.revision = 0
+        # Where the text has been edited since the revision when changes were
+        # last taken (see take_changes).
+        self._changes_since = 0
+        self._changed_lines = None
         self.check_indicators = {  # IDs are arbitrary
             'error': {'id': 19, 'markers': {}},
             'style': {'id': 20, 'markers': {}}
@@ -244,7 +456,13 @@ class EditorPane(QsciScintilla):
         self.setMarginWidth(0, 50)
         self.setBraceMatching(QsciScintilla.SloppyBraceMatch)
         self.SendScintilla(QsciScintilla.SCI_SETHSCROLLBAR, 0)
+        # Autocomplete
+        if self.api:
+            self.lexer.setAPIs(shared_api(self.api))
+        self.setAutoCompletionThreshold(2)
+        self.setAutoCompletionSource(QsciScintilla.AcsAll)
         self.set_theme()
+        self.setLexer(self.lexer)
         # Markers and indicators
         self.markerDefine(self.RightArrow, self.MARKER_NUMBER)
         self.setMarginSensitivity(1, True)
@@ -258,11 +476,19 @@ class EditorPane(QsciScintilla):
         self.setAnnotationDisplay(self.AnnotationBoxed)
         self.marginClicked.connect(self.on_marker_clicked)
         self.selectionChanged.connect(self.selection_change_listener)
+        self.textChanged.connect(self.on_text_changed)
+        self.SCN_MODIFIED.connect(self.on_modified)
+        self.lint_finished.connect(self.on_lint_finished)
+        self._lint_timer = QTimer(self)
+        self._lint_timer.setSingleShot(True)
+        self._lint_timer.setInterval(LINT_DELAY)
+        self._lint_timer.timeout.connect(self.lint_requested)
 
     def set_theme(self, theme=DayTheme):
         """
-        Connect the theme to a lexer and return the lexer for the editor to
-        apply to the script text.
+        Apply the theme to the editor and its lexer. Once the lexer has been
+        set (see configure) the editor follows changes to its styles, so the
+        lexer isn't set again.
         """
         theme.apply_to(self.lexer)
         self.lexer.setDefaultPaper(theme.Paper)
@@ -278,15 +504,6 @@ class EditorPane(QsciScintilla):
                 theme.IndicatorWordMatch, self.search_indicators[type_]['id'])
         self.setMarkerBackgroundColor(theme.IndicatorError, self.MARKER_NUMBER)
 
-        api = QsciAPIs(self.lexer)
-        for entry in self.api:
-            api.add(entry)
-        api.prepare()
-        self.setAutoCompletionThreshold(2)
-        self.setAutoCompletionSource(QsciScintilla.AcsAll)
-
-        self.setLexer(self.lexer)
-
     @property
     def label(self):
         """
@@ -357,6 +574,70 @@ class EditorPane(QsciScintilla):
                     self.fillIndicatorRange(line_no, col_start, line_no,
                                             col_end, indicator['id'])
 
+    def on_text_changed(self):
+        """
+        Notes that the text has changed, making any check of the previous
+        revision out of date, and (re)starts the countdown to checking the
+        new text.
+        """
+        self.revision += 1
+        self._lint_timer.start()
+
+    def on_modified(self, position, modification_type, text, length,
+                    lines_added, *args):
+        """
+        Handles Scintilla's notifications of modifications to the text, noting
+        the range of lines touched by any insertions and deletions.
+        """
+        if not modification_type & (self.SC_MOD_INSERTTEXT |
+                                    self.SC_MOD_DELETETEXT):
+            return
+        first = self.SendScintilla(self.SCI_LINEFROMPOSITION, position)
+        # The number of lines after the last line touched.
+        tail = self.lines() - 1 - first - max(lines_added, 0)
+        if self._changed_lines:
+            first = min(first, self._changed_lines[0])
+            tail = min(tail, self._changed_lines[1])
+        self._changed_lines = (first, max(tail, 0))
+
+    def take_changes(self):
+        """
+        Returns a (revision, first line, number of unchanged lines at the
+        end) tuple describing the lines edited since the text was at the
+        revision when this was last called, then starts afresh from the
+        current revision. The line details are None if nothing was edited.
+        """
+        first, tail = self._changed_lines or (None, None)
+        changes = (self._changes_since, first, tail)
+        self._changes_since = self.revision
+        self._changed_lines = None
+        return changes
+
+    def keyPressEvent(self, event):
+        """
+        Handles the key press as usual, recording how long it took in
+        KEYSTROKES. Checking the code happens later, once typing pauses, so
+        it never adds to this.
+        """
+        start = time.perf_counter()
+        super().keyPressEvent(event)
+        KEYSTROKES.record(time.perf_counter() - start)
+
+    def on_lint_finished(self, revision, flake, pep8):
+        """
+        Annotates the code with the results of a check, unless the text has
+        changed since the check started, in which case they're dropped.
+        """
+        if revision != self.revision:
+            logger.debug('Dropped check of revision {} (now {})'.format(
+                         revision, self.revision))
+            return
+        self.reset_annotations()
+        if flake:
+            self.annotate_code(flake, 'error')
+        if pep8:
+            self.annotate_code(pep8, 'style')
+
     def on_marker_clicked(self, margin, line, state):
         """
         Display something when the margin indicator is clicked.
@@ -520,6 +801,63 @@ class EditorPane(QsciScintilla):
             self.highlight_selected_matches()
 
 
+class PlaceholderPane(QWidget):
+    """
+    Stands in for the editor of a file restored from the previous session
+    until the tab is first shown, so restoring lots of tabs is quick. The
+    file is read in the background and kept in contents (which is None until
+    the text has arrived).
+    """
+
+    def __init__(self, path, cursor=None):
+        super().__init__()
+        self.path = path
+        self.cursor = cursor
+        self.contents = None
+        # How much the editor should be zoomed in (or, if negative, out) once
+        # it has been created.
+        self.zoom = 0
+
+    @property
+    def label(self):
+        """
+        The label for the tab: the file's name.
+        """
+        return os.path.basename(self.path)
+
+    def isModified(self):
+        """
+        Nothing can be changed until the editor has been created.
+        """
+        return False
+
+    def getCursorPosition(self):
+        """
+        The (line, index) position the cursor will be moved to in the editor.
+        """
+        return tuple(self.cursor) if self.cursor else (0, 0)
+
+    def set_theme(self, theme):
+        """
+        The theme is set on the editor when it's created.
+        """
+        pass
+
+    def zoomIn(self, delta=1):
+        """
+        Remembers how much to zoom the editor in, within the same limits as
+        the editor itself.
+        """
+        self.zoom = min(self.zoom + delta, 20)
+
+    def zoomOut(self, delta=1):
+        """
+        Remembers how much to zoom the editor out, within the same limits as
+        the editor itself.
+        """
+        self.zoom = max(self.zoom - delta, -10)
+
+
 class ButtonBar(QToolBar):
     """
     Represents the bar of buttons across the top of the editor and defines
@@ -558,6 +896,9 @@ class ButtonBar(QToolBar):
         self.addSeparator()
         self.addAction(name="check",
                        tool_text="Check your code for mistakes.")
+        self.addAction(name="check-all", icon="check",
+                       tool_text="Check all the code in your workspace for "
+                                 "mistakes.")
         self.addAction(name="help",
                        tool_text="Show help about Mu in a browser.")
         self.addAction(name="quit", tool_text="Quit Mu.")
@@ -577,12 +918,13 @@ class ButtonBar(QToolBar):
         stylesheet = "QWidget{font-size: " + str(font_size) + "px;}"
         self.setStyleSheet(stylesheet)
 
-    def addAction(self, name, tool_text):
+    def addAction(self, name, tool_text, icon=None):
         """
         Creates an action associated with an icon and name and adds it to the
-        widget's slots.
+        widget's slots. The icon has the same name as the action unless
+        another is given.
         """
-        action = QAction(load_icon(name), name.capitalize(), self,
+        action = QAction(load_icon(icon or name), name.capitalize(), self,
                          toolTip=tool_text)
         super().addAction(action)
         self.slots[name] = action
@@ -614,18 +956,20 @@ class FileTabs(QTabWidget):
         Ask the user before closing the file.
         """
         window = self.nativeParentWidget()
-        modified = window.current_tab.isModified()
+        modified = self.widget(tab_id).isModified()
         if modified:
             msg = 'There is un-saved work, closing the tab will cause you ' \
                   'to lose it.'
             if window.show_confirmation(msg) == QMessageBox.Cancel:
                 return
         super(FileTabs, self).removeTab(tab_id)
+        window.notify_session_changed()
 
     def change_tab(self, tab_id):
         """
         Update the application title to reflect the name of the file in the
-        currently selected tab.
+        currently selected tab. If the tab is a placeholder, ask for it to be
+        turned into an editor.
         """
         current_tab = self.widget(tab_id)
         window = self.nativeParentWidget()
@@ -633,6 +977,8 @@ class FileTabs(QTabWidget):
             window.update_title(current_tab.label)
         else:
             window.update_title(None)
+        if isinstance(current_tab, PlaceholderPane):
+            window.tab_requested.emit(current_tab)
 
 
 class Window(QStackedWidget):
@@ -645,6 +991,25 @@ class Window(QStackedWidget):
 
     _zoom_in = pyqtSignal(int)
     _zoom_out = pyqtSignal(int)
+    #: Emitted once the open tabs, their cursors or the theme have changed
+    # and then stayed the same for SESSION_SAVE_DELAY milliseconds.
+    session_changed = pyqtSignal()
+    #: Emitted with a tab whose text has changed and then settled, so the
+    # code in it should be checked.
+    lint_requested = pyqtSignal(object)
+    #: Emitted (from any thread) with the directory checked by Check All and
+    # a summary of the results: a list of (relative path, text) tuples.
+    report_ready = pyqtSignal(str, object)
+    #: Emitted with the path of a file the user has asked to open.
+    open_file = pyqtSignal(str)
+    #: The pane summarising the results of Check All, if shown.
+    report = None
+    #: Emitted with a placeholder tab that has been shown, so it should be
+    # turned into an editor.
+    tab_requested = pyqtSignal(object)
+    #: Emitted (from any thread) with a placeholder tab and the text of its
+    # file, or None if the file could not be read.
+    tab_text_ready = pyqtSignal(object, object)
 
     def zoom_in(self):
         """
@@ -658,6 +1023,14 @@ class Window(QStackedWidget):
         """
         self._zoom_out.emit(2)
 
+    def notify_session_changed(self, *args):
+        """
+        Notes that the session has changed, (re)starting the countdown to
+        emitting session_changed. Accepts and ignores the arguments of the
+        signals connected to it.
+        """
+        self._session_timer.start()
+
     def connect_zoom(self, widget):
         """
         Connects a referenced widget to the zoom related signals.
@@ -668,9 +1041,13 @@ class Window(QStackedWidget):
     @property
     def current_tab(self):
         """
-        Returns the currently focussed tab.
+        Returns the currently focussed tab, or None if there isn't one or it's
+        still a placeholder.
         """
-        return self.tabs.currentWidget()
+        tab = self.tabs.currentWidget()
+        if isinstance(tab, PlaceholderPane):
+            return None
+        return tab
 
     def get_load_path(self, folder):
         """
@@ -707,8 +1084,18 @@ class Window(QStackedWidget):
         """
         Adds a tab with the referenced path and text to the editor.
         """
-        new_tab = EditorPane(path, text, self.api)
+        new_tab = self._make_tab(path, text)
         new_tab_index = self.tabs.addTab(new_tab, new_tab.label)
+        self.tabs.setCurrentIndex(new_tab_index)
+        new_tab.setFocus()
+        self.notify_session_changed()
+
+    def _make_tab(self, path, text):
+        """
+        Creates an editor with the referenced path and text, in the current
+        theme and connected to the rest of the window.
+        """
+        new_tab = EditorPane(path, text, self.api)
 
         @new_tab.modificationChanged.connect
         def on_modified():
@@ -716,10 +1103,56 @@ class Window(QStackedWidget):
             self.tabs.setTabText(modified_tab_index, new_tab.label)
             self.update_title(new_tab.label)
 
-        self.tabs.setCurrentIndex(new_tab_index)
+        new_tab.lint_requested.connect(
+            lambda: self.lint_requested.emit(new_tab))
+        new_tab.set_theme(NightTheme if self.theme == 'night' else DayTheme)
         self.connect_zoom(new_tab)
-        self.set_theme(self.theme)
-        new_tab.setFocus()
+        return new_tab
+
+    def add_placeholder(self, path, cursor=None):
+        """
+        Adds a tab for the file at the referenced path without creating an
+        editor for it or reading it. Returns the placeholder.
+        """
+        placeholder = PlaceholderPane(path, cursor)
+        self.tabs.addTab(placeholder, placeholder.label)
+        self.connect_zoom(placeholder)
+        return placeholder
+
+    def replace_placeholder(self, placeholder, path, text):
+        """
+        Replaces the referenced placeholder tab with an editor for the
+        referenced path and text. Returns the new editor.
+        """
+        index = self.tabs.indexOf(placeholder)
+        new_tab = self._make_tab(path, text)
+        if placeholder.zoom:
+            new_tab.zoomTo(placeholder.zoom)
+        current = self.tabs.currentIndex() == index
+        self.tabs.insertTab(index, new_tab, new_tab.label)
+        if current:
+            # Show the editor before the placeholder goes, so no other tab is
+            # shown (and asked for) in between.
+            self.tabs.setCurrentIndex(index)
+            new_tab.setFocus()
+        self.remove_placeholder(placeholder)
+        return new_tab
+
+    def remove_placeholder(self, placeholder):
+        """
+        Removes the referenced placeholder tab.
+        """
+        self._zoom_in.disconnect(placeholder.zoomIn)
+        self._zoom_out.disconnect(placeholder.zoomOut)
+        # QTabWidget.removeTab as FileTabs asks before closing a tab.
+        QTabWidget.removeTab(self.tabs, self.tabs.indexOf(placeholder))
+        placeholder.deleteLater()
+
+    def is_current(self, tab):
+        """
+        Returns True if the referenced tab is the one being shown.
+        """
+        return self.tabs.currentWidget() is tab
 
     def focus_tab(self, tab):
         index = self.tabs.indexOf(tab)
@@ -772,6 +1205,27 @@ class Window(QStackedWidget):
         self.repl.setFocus()
         self.connect_zoom(self.repl)
 
+    def show_report(self, directory, summary):
+        """
+        Shows the summary of the results of checking all the files in the
+        referenced directory, in a pane of its own.
+        """
+        if self.report is None:
+            self.report = CheckReportPane(self.splitter)
+            self.report.open_file.connect(self.open_file)
+            self.splitter.addWidget(self.report)
+            self.splitter.setSizes([66, 33])
+            self.connect_zoom(self.report)
+        self.report.show_summary(directory, summary)
+
+    def remove_report(self):
+        """
+        Removes the pane summarising the results of Check All.
+        """
+        self.report.setParent(None)
+        self.report.deleteLater()
+        self.report = None
+
     def remove_filesystem(self):
         """
         Removes the file system pane from the application.
@@ -792,19 +1246,25 @@ class Window(QStackedWidget):
         """
         Sets the theme for the REPL and editor tabs.
         """
-        self.setStyleSheet(DAY_STYLE)
         self.theme = theme
         new_theme = DayTheme
         new_icon = 'theme'
+        new_style = DAY_STYLE
         if theme == 'night':
             new_theme = NightTheme
             new_icon = 'theme_day'
-            self.setStyleSheet(NIGHT_STYLE)
+            new_style = NIGHT_STYLE
+        fonts_loaded = Font.loaded
+        # Setting the style sheet restyles every widget in the window, so
+        # it's only done once.
+        self.setStyleSheet(new_style)
         for widget in self.widgets:
             widget.set_theme(new_theme)
         self.button_bar.slots['theme'].setIcon(load_icon(new_icon))
         if hasattr(self, 'repl') and self.repl:
             self.repl.set_theme(theme)
+        logger.debug('Set {} theme, loading {} fonts'.format(
+                     theme, Font.loaded - fonts_loaded))
 
     def show_message(self, message, information=None, icon=None):
         """
@@ -879,14 +1339,25 @@ class Window(QStackedWidget):
         h = int(screen.height() * 0.8)
         self.resize(w, h)
         size = self.geometry()
-        self.move((screen.width() - size.width()) / 2,
-                  (screen.height() - size.height()) / 2)
+        self.move((screen.width() - size.width()) // 2,
+                  (screen.height() - size.height()) // 2)
+
+    def bring_to_front(self):
+        """
+        Restores the window if it's minimised and brings it in front of other
+        windows, for example when a file is opened from elsewhere.
+        """
+        if self.isMinimized():
+            self.showNormal()
+        self.raise_()
+        self.activateWindow()
 
     def reset_annotations(self):
         """
         Resets the state of annotations on the current tab.
         """
-        self.current_tab.reset_annotations()
+        if self.current_tab:
+            self.current_tab.reset_annotations()
 
     def annotate_code(self, feedback, annotation_type):
         """
@@ -894,17 +1365,21 @@ class Window(QStackedWidget):
         the annotations to the editor window so the user can make appropriate
         changes.
         """
-        self.current_tab.annotate_code(feedback, annotation_type)
+        if self.current_tab:
+            self.current_tab.annotate_code(feedback, annotation_type)
 
-    def setup(self, theme, api=None):
+    def setup(self, theme, api=None, api_cache_dir=None):
         """
         Sets up the window.
 
         Defines the various attributes of the window and defines how the user
-        interface is laid out.
+        interface is laid out. The autocomplete APIs are got ready for the
+        editors, using any prepared earlier and kept in api_cache_dir.
         """
         self.theme = theme
         self.api = api if api else []
+        if self.api:
+            shared_api(self.api, api_cache_dir)
         # Give the window a default icon, title and minimum size.
         self.setWindowIcon(load_icon(self.icon))
         self.update_title()
@@ -924,6 +1399,17 @@ class Window(QStackedWidget):
         self.tabs.setMovable(True)
         self.splitter.addWidget(self.tabs)
 
+        self._session_timer = QTimer(self)
+        self._session_timer.setSingleShot(True)
+        self._session_timer.setInterval(SESSION_SAVE_DELAY)
+        self._session_timer.timeout.connect(self.session_changed)
+        self.report_ready.connect(self.show_report)
+        # The session is saved when the tabs or the file being edited
+        # change (and on quitting), not as the cursor moves, so the settings
+        # aren't written again and again while typing.
+        self.tabs.tabBar().tabMoved.connect(self.notify_session_changed)
+        self.tabs.currentChanged.connect(self.notify_session_changed)
+
         self.addWidget(self.widget)
         self.setCurrentWidget(self.widget)
 
@@ -939,6 +1425,65 @@ class Window(QStackedWidget):
         self.button_bar.set_responsive_mode(size.width(), size.height())
 
 
+class VT100Parser:
+    """
+    Turns the bytes sent by the device into the edits a terminal makes to its
+    screen: runs of text (which may include newlines), and the VT100 escape
+    sequences MicroPython uses to move the cursor and erase to the end of the
+    line. The data may end part way through a UTF-8 character or an escape
+    sequence, in which case the rest is expected in the next data fed in.
+    """
+
+    #: The parts of the data, in the order tried.
+    TOKENS = re.compile(r"""
+        (?P<text>[^\x08\x1b]+)
+        | (?P<backspace>\x08)
+        | \x1b\[(?P<params>[0-9;?]*)(?P<command>[@-~])
+        | (?P<partial>\x1b(?:\[[0-9;?]*)?\Z)
+        | \x1b\[[0-9;?]* | \x1b[^\[]  # Not understood, so ignored.
+    """, re.VERBOSE)
+    #: The direction to move the cursor for each escape sequence that does.
+    MOVES = {'A': 'up', 'B': 'down', 'C': 'right', 'D': 'left'}
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self._partial = ''
+
+    def feed(self, data):
+        """
+        Returns the edits for the referenced bytes as a list of (action,
+        value) tuples. The action is "text" with the text to write over what's
+        after the cursor, "up", "down", "right" or "left" with the number of
+        places to move the cursor, or "erase" (with None) to delete the rest
+        of the line.
+        """
+        text = self._partial + self._decoder.decode(data)
+        self._partial = ''
+        edits = []
+        for match in self.TOKENS.finditer(text):
+            if match.group('text'):
+                # Carriage returns are ignored, as each newline moves to the
+                # start of a new line anyway.
+                run = match.group('text').replace('\r', '')
+                if run and edits and edits[-1][0] == 'text':
+                    edits[-1] = ('text', edits[-1][1] + run)
+                elif run:
+                    edits.append(('text', run))
+            elif match.group('backspace'):
+                edits.append(('left', 1))
+            elif match.group('command'):
+                params = match.group('params')
+                command = match.group('command')
+                if command in self.MOVES:
+                    count = int(params) if params.isdigit() else 1
+                    edits.append((self.MOVES[command], max(count, 1)))
+                elif command == 'K' and params in ('', '0'):
+                    edits.append(('erase', None))
+            elif match.group('partial'):
+                self._partial = match.group('partial')
+        return edits
+
+
 class REPLPane(QTextEdit):
     """
     REPL = Read, Evaluate, Print, Loop.
@@ -958,8 +1503,9 @@ class REPLPane(QTextEdit):
         self.setContextMenuPolicy(Qt.CustomContextMenu)
         self.customContextMenuRequested.connect(self.context_menu)
         self.setObjectName('replpane')
+        self.vt100 = VT100Parser()
         # open the serial port
-        self.serial = QSerialPort(self)
+        self.serial = get_qtserialport().QSerialPort(self)
         self.serial.setPortName(port)
         if self.serial.open(QIODevice.ReadWrite):
             self.serial.setBaudRate(115200)
@@ -1064,65 +1610,61 @@ class REPLPane(QTextEdit):
                 msg = b''
         self.serial.write(msg)
 
+    #: The cursor movement for each direction the device moves it in.
+    CURSOR_MOVES = {
+        'up': QTextCursor.Up,
+        'down': QTextCursor.Down,
+        'right': QTextCursor.Right,
+        'left': QTextCursor.Left,
+    }
+
     def process_bytes(self, data):
         """
         Given some incoming bytes of data, work out how to handle / display
         them in the REPL widget.
+
+        The edits for the data (see VT100Parser) are made as a single change
+        to the document, with each run of text written at once.
         """
         tc = self.textCursor()
         # The text cursor must be on the last line of the document. If it isn't
         # then move it there.
         while tc.movePosition(QTextCursor.Down):
             pass
-        i = 0
-        while i < len(data):
-            if data[i] == 8:  # \b
-                tc.movePosition(QTextCursor.Left)
-                self.setTextCursor(tc)
-            elif data[i] == 13:  # \r
-                pass
-            elif data[i] == 27 and data[i + 1] == 91:  # VT100 cursor: <Esc>[
-                i += 2  # move index to after the [
-                m = re.search(r'(?P<count>[\d]*)(?P<action>[ABCDK])',
-                              data[i:].decode('utf-8'))
-
-                # move to (almost) after control seq (will ++ at end of loop)
-                i += m.end() - 1
-
-                if m.group("count") == '':
-                    count = 1
-                else:
-                    count = int(m.group("count"))
-
-                if m.group("action") == "A":  # up
-                    tc.movePosition(QTextCursor.Up, n=count)
-                    self.setTextCursor(tc)
-                elif m.group("action") == "B":  # down
-                    tc.movePosition(QTextCursor.Down, n=count)
-                    self.setTextCursor(tc)
-                elif m.group("action") == "C":  # right
-                    tc.movePosition(QTextCursor.Right, n=count)
-                    self.setTextCursor(tc)
-                elif m.group("action") == "D":  # left
-                    tc.movePosition(QTextCursor.Left, n=count)
-                    self.setTextCursor(tc)
-                elif m.group("action") == "K":  # delete things
-                    if m.group("count") == "":  # delete to end of line
-                        tc.movePosition(QTextCursor.EndOfLine,
-                                        mode=QTextCursor.KeepAnchor)
-                        tc.removeSelectedText()
-                        self.setTextCursor(tc)
-            elif data[i] == 10:  # \n
-                tc.movePosition(QTextCursor.End)
-                self.setTextCursor(tc)
-                self.insertPlainText(chr(data[i]))
+        tc.beginEditBlock()
+        for action, value in self.vt100.feed(data):
+            if action == 'text':
+                self.write_text(tc, value)
+            elif action == 'erase':
+                tc.movePosition(QTextCursor.EndOfLine,
+                                mode=QTextCursor.KeepAnchor)
+                tc.removeSelectedText()
             else:
-                tc.deleteChar()
-                self.setTextCursor(tc)
-                self.insertPlainText(chr(data[i]))
-            i += 1
+                tc.movePosition(self.CURSOR_MOVES[action], n=value)
+        tc.endEditBlock()
+        self.setTextCursor(tc)
         self.ensureCursorVisible()
 
+    def write_text(self, tc, text):
+        """
+        Writes the text at the referenced cursor as a terminal would: up to
+        the first newline it replaces what's after the cursor on the same
+        line, and each newline moves to the end of the document first (so
+        everything after the first newline is simply added to the end).
+        """
+        line, newline, rest = text.partition('\n')
+        if line:
+            block = tc.block()
+            line_end = block.position() + block.length() - 1
+            overwrite = min(len(line), line_end - tc.position())
+            if overwrite > 0:
+                tc.movePosition(QTextCursor.Right, QTextCursor.KeepAnchor,
+                                overwrite)
+            tc.insertText(line)
+        if newline:
+            tc.movePosition(QTextCursor.End)
+            tc.insertText(newline + rest)
+
     def clear(self):
         """
         Clears the text of the REPL.
@@ -1130,6 +1672,64 @@ class REPLPane(QTextEdit):
         self.setText('')
 
 
+class CheckReportPane(QListWidget):
+    """
+    Lists the results of checking all the files in the workspace: the
+    totals and then a line for each file with problems. Activating a file's
+    line asks for it to be opened.
+    """
+
+    #: Emitted with the path of the file whose line was activated.
+    open_file = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.font = Font().load()
+        self.set_font_size()
+        self.itemActivated.connect(self.on_item_activated)
+
+    def show_summary(self, directory, summary):
+        """
+        Replaces the list with the referenced summary (see show_report) of
+        checking the files in directory.
+        """
+        self.clear()
+        for path, text in summary:
+            item = QListWidgetItem(text)
+            if path:
+                item.setData(Qt.UserRole, os.path.join(directory, path))
+            self.addItem(item)
+
+    def on_item_activated(self, item):
+        """
+        Asks for the file on the activated line to be opened.
+        """
+        path = item.data(Qt.UserRole)
+        if path:
+            self.open_file.emit(path)
+
+    def set_font_size(self, new_size=DEFAULT_FONT_SIZE):
+        """
+        Sets the font size for the list.
+        """
+        self.font.setPointSize(new_size)
+        self.setFont(self.font)
+
+    def zoomIn(self, delta=2):
+        """
+        Zoom in (increase) the size of the font by delta amount difference in
+        point size upto 34 points.
+        """
+        self.set_font_size(min(self.font.pointSize() + delta, 34))
+
+    def zoomOut(self, delta=2):
+        """
+        Zoom out (decrease) the size of the font by delta amount difference in
+        point size down to 4 points.
+        """
+        self.set_font_size(max(self.font.pointSize() - delta, 4))
+
+
 class MuFileList(QListWidget):
     """
     Contains shared methods for the two types of file listing used in Mu.
@@ -1188,16 +1788,19 @@ class MicrobitFileList(MuFileList):
                 local_filename = os.path.join(self.home,
                                               source.currentItem().text())
                 logger.info("Putting {}".format(local_filename))
+                microfs = get_microfs()
                 try:
                     with microfs.get_serial() as serial:
                         logger.info(serial.port)
                         microfs.put(serial, local_filename)
                     super().dropEvent(event)
+                    if self.parent() is not None:
+                        self.parent().microbit_file_changed(
+                            os.path.basename(local_filename),
+                            os.path.getsize(local_filename))
                 except Exception as ex:
                     logger.error(ex)
         self.enable(source)
-        if self.parent() is not None:
-            self.parent().ls()
 
     def contextMenuEvent(self, event):
         menu = QMenu(self)
@@ -1208,11 +1811,14 @@ class MicrobitFileList(MuFileList):
             self.setAcceptDrops(False)
             microbit_filename = self.currentItem().text()
             logger.info("Deleting {}".format(microbit_filename))
+            microfs = get_microfs()
             try:
                 with microfs.get_serial() as serial:
                     logger.info(serial.port)
                     microfs.rm(serial, microbit_filename)
                 self.takeItem(self.currentRow())
+                if self.parent() is not None:
+                    self.parent().microbit_file_removed(microbit_filename)
             except Exception as ex:
                 logger.error(ex)
             self.setDisabled(False)
@@ -1242,6 +1848,7 @@ class LocalFileList(MuFileList):
                                               microbit_filename)
                 logger.debug("Getting {} to {}".format(microbit_filename,
                                                        local_filename))
+                microfs = get_microfs()
                 try:
                     with microfs.get_serial() as serial:
                         logger.info(serial.port)
@@ -1251,7 +1858,7 @@ class LocalFileList(MuFileList):
                     logger.error(ex)
         self.enable(source)
         if self.parent() is not None:
-            self.parent().ls()
+            self.parent().show_files()
 
 
 class FileSystemPane(QFrame):
@@ -1282,25 +1889,66 @@ class FileSystemPane(QFrame):
         layout.addWidget(local_label, 0, 1)
         layout.addWidget(microbit_fs, 1, 0)
         layout.addWidget(local_fs, 1, 1)
+        self.microbit_files = {}  # Filename -> size in bytes.
+        self.microbit_free = None  # Free bytes, if the device can tell.
         self.ls()
 
     def ls(self):
         """
-        Gets a list of the files on the micro:bit.
+        Gets the files (with their sizes) and the free space on the micro:bit
+        in a single round trip and shows them alongside the local files.
+
+        The result is cached so later changes only update it rather than
+        asking the device again.
+        """
+        microfs = get_microfs()
+        files, self.microbit_free = microfs.ls_long(microfs.get_serial())
+        self.microbit_files = dict(files)
+        self.show_files()
 
-        Naive implementation for simplicity's sake.
+    def show_files(self):
+        """
+        Shows the cached list of files on the micro:bit and the files in the
+        local directory.
         """
         self.microbit_fs.clear()
         self.local_fs.clear()
-        microbit_files = microfs.ls(microfs.get_serial())
-        for f in microbit_files:
-            self.microbit_fs.addItem(f)
+        for name in sorted(self.microbit_files):
+            item = QListWidgetItem(name)
+            item.setToolTip('{} bytes'.format(self.microbit_files[name]))
+            self.microbit_fs.addItem(item)
+        if self.microbit_free is None:
+            self.microbit_label.setText('Files on your micro:bit:')
+        else:
+            self.microbit_label.setText(
+                'Files on your micro:bit ({} bytes free):'.format(
+                    self.microbit_free))
         local_files = [f for f in os.listdir(self.home)
                        if os.path.isfile(os.path.join(self.home, f))]
         local_files.sort()
         for f in local_files:
             self.local_fs.addItem(f)
 
+    def microbit_file_changed(self, name, size):
+        """
+        Updates the cached listing after a file of the given size has been
+        put onto the micro:bit.
+        """
+        if self.microbit_free is not None:
+            self.microbit_free -= size - self.microbit_files.get(name, 0)
+        self.microbit_files[name] = size
+        self.show_files()
+
+    def microbit_file_removed(self, name):
+        """
+        Updates the cached listing after a file has been removed from the
+        micro:bit.
+        """
+        size = self.microbit_files.pop(name, 0)
+        if self.microbit_free is not None:
+            self.microbit_free += size
+        self.show_files()
+
     def set_theme(self, theme):
         """
         Sets the theme / look for the FileSystemPane.
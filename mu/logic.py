@@ -21,22 +21,21 @@ import os
 import os.path
 import sys
 import io
+import ast
 import re
 import json
+import bisect
+import hashlib
 import logging
-import tempfile
 import platform
-import webbrowser
+import threading
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from PyQt5.QtWidgets import QMessageBox
-from PyQt5.QtSerialPort import QSerialPortInfo
-from pyflakes.api import check
-# Currently there is no pycodestyle deb packages, so fallback to old name
-try:  # pragma: no cover
-    from pycodestyle import StyleGuide, Checker
-except ImportError:  # pragma: no cover
-    from pep8 import StyleGuide, Checker
-from mu.contrib import uflash, appdirs, microfs
+from mu.contrib import appdirs
 from mu.contrib.atomicfile import open_atomic
+from mu.resources.api import MICROPYTHON_APIS
 from mu import __version__
 
 
@@ -60,30 +59,69 @@ DATA_DIR = appdirs.user_data_dir(appname='mu', appauthor='python')
 LOG_DIR = appdirs.user_log_dir(appname='mu', appauthor='python')
 #: The path to the log file for the application.
 LOG_FILE = os.path.join(LOG_DIR, 'mu.log')
-#: Regex to match pycodestyle (PEP8) output.
-STYLE_REGEX = re.compile(r'.*:(\d+):(\d+):\s+(.*)')
+#: A logging level below DEBUG for whole scripts, sessions and other payloads.
+# Log at this level with arguments to be formatted, so the work of formatting
+# them is only done if the level is enabled.
+TRACE = 5
+logging.addLevelName(TRACE, 'TRACE')
+#: Number of checked versions of code whose results are kept for reuse.
+LINT_CACHE_SIZE = 100
+#: Name of the file in the workspace to which Check All writes its report.
+CHECK_REPORT_FILENAME = 'mu_check_report.json'
+#: The file in which the results of checking each file are kept for reuse.
+CHECK_CACHE_FILE = os.path.join(DATA_DIR, 'check_cache.json')
 #: Regex to match flake8 output.
 FLAKE_REGEX = re.compile(r'.*:(\d+):\s+(.*)')
-#: Regex to match false positive flake errors if microbit.* is expanded.
-EXPAND_FALSE_POSITIVE = re.compile(r"^'microbit\.(\w+)' imported but unused$")
-#: The text to which "from microbit import *" should be expanded.
-EXPANDED_IMPORT = ("from microbit import pin15, pin2, pin0, pin1, "
-                   " pin3, pin6, pin4, i2c, pin5, pin7, pin8, Image, "
-                   "pin9, pin14, pin16, reset, pin19, temperature, "
-                   "sleep, pin20, button_a, button_b, running_time, "
-                   "accelerometer, display, uart, spi, panic, pin13, "
-                   "pin12, pin11, pin10, compass")
+#: Regex to match the module and name at the start of an API description.
+API_NAME_REGEX = re.compile(r'^(\w+)\.(\w+)')
 
 
 logger = logging.getLogger(__name__)
 
 
+# The checkers, flashing, the micro:bit's file system and the serial port take
+# a while to import, and are only needed once the user gets to them, so they're
+# imported on first use by these functions rather than when Mu starts. Use
+# them (here and in mu.interface) rather than importing the modules directly.
+def get_checkers():
+    """
+    Returns the mu.checkers module, which imports PyFlakes and PyCodeStyle.
+    """
+    from mu import checkers
+    return checkers
+
+
+def get_uflash():
+    """
+    Returns the uflash module, which contains the MicroPython runtime.
+    """
+    from mu.contrib import uflash
+    return uflash
+
+
+def get_microfs():
+    """
+    Returns the microfs module, which imports PySerial.
+    """
+    from mu.contrib import microfs
+    return microfs
+
+
+def get_qtserialport():
+    """
+    Returns the PyQt5.QtSerialPort module, for QSerialPort and
+    QSerialPortInfo.
+    """
+    from PyQt5 import QtSerialPort
+    return QtSerialPort
+
+
 def find_microbit():
     """
     Returns the port for the first microbit it finds connected to the host
     computer. If no microbit is found, returns None.
     """
-    available_ports = QSerialPortInfo.availablePorts()
+    available_ports = get_qtserialport().QSerialPortInfo.availablePorts()
     for port in available_ports:
         pid = port.productIdentifier()
         vid = port.vendorIdentifier()
@@ -130,31 +168,157 @@ def get_settings_path():
     return settings_dir
 
 
+class Settings:
+    """
+    An in-memory copy of the JSON settings file.
+
+    The file is only read when a value is first needed and read again if its
+    modification time changes, so repeated lookups cost a single stat rather
+    than opening and parsing the file each time. Changes are written back
+    atomically by save(), which may safely be run in the background while
+    the values continue to be used.
+    """
+
+    def __init__(self, path=None):
+        self._path = path
+        self._mtime = None
+        self._loaded = False
+        self._changed = False
+        self._values = {}
+        self._lock = threading.RLock()
+        self._save_lock = threading.Lock()
+
+    @property
+    def path(self):
+        """
+        The location of the settings file (see get_settings_path).
+        """
+        if self._path is None:
+            self._path = get_settings_path()
+        return self._path
+
+    def _refresh(self):
+        """
+        Reads the settings file again if it has changed since it was last
+        read. Unsaved changes take precedence over the file's content.
+        """
+        if self._changed:
+            return
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            mtime = None
+        if self._loaded and mtime == self._mtime:
+            return
+        self._mtime = mtime
+        self._loaded = True
+        self._values = {}
+        try:
+            with open(self.path) as f:
+                values = json.load(f)
+        except FileNotFoundError:
+            logger.error('Settings file {} does not exist.'.format(self.path))
+        except ValueError:
+            logger.error('Settings file {} could not be parsed.'.format(
+                         self.path))
+        else:
+            if isinstance(values, dict):
+                self._values = values
+            else:
+                logger.error('Settings file {} does not contain an '
+                             'object.'.format(self.path))
+
+    def get(self, key, default=None):
+        """
+        Returns the value of the referenced setting, or default if it isn't
+        set.
+        """
+        with self._lock:
+            self._refresh()
+            return self._values.get(key, default)
+
+    def update(self, values):
+        """
+        Changes the settings in memory to include the referenced dictionary of
+        values. Call save() to write them to the settings file.
+        """
+        with self._lock:
+            self._refresh()
+            for key, value in values.items():
+                if key not in self._values or self._values[key] != value:
+                    self._values[key] = value
+                    self._changed = True
+
+    def save(self):
+        """
+        Atomically writes any unsaved changes to the settings file.
+
+        Only taking a snapshot of the values holds the lock used by get() and
+        update(), so a slow disk doesn't hold up their callers while a save
+        is in progress. A separate lock stops saves overlapping.
+        """
+        with self._save_lock:
+            with self._lock:
+                if not self._changed:
+                    return
+                content = json.dumps(self._values, indent=2)
+                self._changed = False
+            try:
+                with open_atomic(self.path, 'w') as f:
+                    logger.debug('Saving settings to: {}'.format(self.path))
+                    f.write(content)
+            except Exception:
+                with self._lock:
+                    self._changed = True
+                raise
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError:
+                mtime = None
+            with self._lock:
+                self._mtime = mtime
+
+    def save_in_background(self):
+        """
+        Writes any unsaved changes to the settings file in a background thread
+        so the caller isn't kept waiting on the disk.
+        """
+        with self._lock:
+            if not self._changed:
+                return
+        writer = threading.Thread(target=self._save_quietly, daemon=True)
+        writer.start()
+
+    def _save_quietly(self):
+        """
+        Saves the settings, logging rather than raising any error since there
+        is nobody to report it to in a background thread.
+        """
+        try:
+            self.save()
+        except Exception as ex:
+            logger.error('Could not save settings: {}'.format(ex))
+
+
+#: The application's settings.
+SETTINGS = Settings()
+
+
 def get_workspace_dir():
     """
     The default is to use a directory in the users home folder, however
     in some network systems this in inaccessible. This allows a key in the
     settings file to be used to set a custom path.
     """
-    settings_path = get_settings_path()
     workspace_dir = os.path.join(HOME_DIRECTORY, WORKSPACE_NAME)
-    settings = {}
-    try:
-        with open(settings_path) as f:
-            settings = json.load(f)
-    except FileNotFoundError:
-        logger.error('Settings file {} does not exist.'.format(settings_path))
-    except ValueError:
-        logger.error('Settings file {} could not be parsed.'.format(
-                     settings_path))
-    else:
-        if 'workspace' in settings:
-            if os.path.isdir(settings['workspace']):
-                workspace_dir = settings['workspace']
-            else:
-                logger.error(
-                    'Workspace value in the settings file is not a valid'
-                    'directory: {}'.format(settings['workspace']))
+    workspace = SETTINGS.get('workspace')
+    if workspace is not None:
+        if os.path.isdir(workspace):
+            workspace_dir = workspace
+        else:
+            logger.error(
+                'Workspace value in the settings file is not a valid'
+                'directory: {}'.format(workspace))
     return workspace_dir
 
 
@@ -167,28 +331,36 @@ def get_runtime_hex_path():
     Returns None if no path is specified or if the file is not present.
     """
     runtime_hex_path = None
-    settings_path = get_settings_path()
-    settings = {}
-    try:
-        with open(settings_path) as f:
-            settings = json.load(f)
-    except FileNotFoundError:
-        logger.error('Settings file {} does not exist.'.format(settings_path))
-    except ValueError:
-        logger.error('Settings file {} could not be parsed.'.format(
-                     settings_path))
-    else:
-        if 'microbit_runtime_hex' in settings and \
-                settings['microbit_runtime_hex'] is not None:
-            runtime_hex_path = os.path.join(
-                get_workspace_dir(),
-                settings['microbit_runtime_hex'])
-            if not os.path.exists(runtime_hex_path):
-                runtime_hex_path = None
-
+    runtime_hex = SETTINGS.get('microbit_runtime_hex')
+    if runtime_hex is not None:
+        runtime_hex_path = os.path.join(get_workspace_dir(), runtime_hex)
+        if not os.path.exists(runtime_hex_path):
+            runtime_hex_path = None
     return runtime_hex_path
 
 
+def board_namespace(module, apis):
+    """
+    Given the name of a board's module and a list of API descriptions (in the
+    form used by the autocomplete), returns the set of names the module
+    provides.
+    """
+    names = set()
+    for api in apis:
+        match = API_NAME_REGEX.match(api)
+        if match and match.group(1) == module:
+            names.add(match.group(2))
+    return frozenset(names)
+
+
+#: The names provided by each board's module, so code that uses
+# "from <module> import *" can be checked for undefined names. Other boards are
+# supported by adding their module and API descriptions here.
+BOARD_NAMESPACES = {
+    'microbit': board_namespace('microbit', MICROPYTHON_APIS),
+}
+
+
 def check_flake(filename, code):
     """
     Given a filename and some code to be checked, uses the PyFlakesmodule to
@@ -196,20 +368,22 @@ def check_flake(filename, code):
 
     https://github.com/PyCQA/pyflakes
     """
-    import_all = "from microbit import *" in code
-    if import_all:
-        # Massage code so "from microbit import *" is expanded so the symbols
-        # are known to flake.
-        code = code.replace("from microbit import *", EXPANDED_IMPORT)
     reporter = MuFlakeCodeReporter()
-    check(code, filename, reporter)
+    try:
+        tree = ast.parse(code, filename=filename)
+    except SyntaxError as ex:
+        reporter.syntaxError(filename, ex.args[0], ex.lineno, ex.offset,
+                             ex.text)
+    except Exception:
+        reporter.unexpectedError(filename, 'problem decoding source')
+    else:
+        checker = get_checkers().MuFlakeChecker(
+            tree, filename=filename, namespaces=BOARD_NAMESPACES)
+        checker.messages.sort(key=lambda m: m.lineno)
+        for message in checker.messages:
+            reporter.flake(message)
     feedback = {}
     for log in reporter.log:
-        if import_all:
-            # Guard to stop unwanted "microbit.* imported but unused" messages.
-            message = log['message']
-            if EXPAND_FALSE_POSITIVE.match(message):
-                continue
         if log['line_no'] not in feedback:
             feedback[log['line_no']] = []
         feedback[log['line_no']].append(log)
@@ -223,47 +397,211 @@ def check_pycodestyle(code):
 
     https://pycodestyle.readthedocs.io/en/latest/intro.html
     """
-    # PyCodeStyle reads input from files, so make a temporary file containing
-    # the code.
-    code_fd, code_filename = tempfile.mkstemp()
-    os.close(code_fd)
-    with open_atomic(code_filename, 'w', newline='') as code_file:
-        code_file.write(code)
-    # Configure which PEP8 rules to ignore.
-    style = StyleGuide(parse_argv=False, config_file=False)
-    checker = Checker(code_filename, options=style.options)
-    # Re-route stdout to a temporary buffer to be parsed below.
-    temp_out = io.StringIO()
-    sys.stdout = temp_out
-    # Check the code.
+    # The checker is given the lines directly (with newlines normalised as if
+    # read from a file) and reports to MuStyleReport, so nothing touches the
+    # disk or stdout and this is safe to call from any thread.
+    checkers = get_checkers()
+    lines = io.StringIO(code, newline=None).readlines()
+    options = checkers.style_options()
+    report = checkers.MuStyleReport(options)
+    checker = checkers.MuStyleChecker(lines, options, report)
     checker.check_all()
-    # Put stdout back and read the content of the buffer. Remove the temporary
-    # file created at the start.
-    sys.stdout = sys.__stdout__
-    temp_out.seek(0)
-    results = temp_out.read()
-    temp_out.close()
-    code_file.close()
-    os.remove(code_filename)
-    # Parse the output from the tool into a dictionary of structured data.
-    style_feedback = {}
-    for result in results.split('\n'):
-        matcher = STYLE_REGEX.match(result)
-        if matcher:
-            line_no, col, msg = matcher.groups()
-            line_no = int(line_no) - 1
-            code, description = msg.split(' ', 1)
-            if code == 'E303':
-                description += ' above this line'
-            if line_no not in style_feedback:
-                style_feedback[line_no] = []
-            style_feedback[line_no].append({
-                'line_no': line_no,
-                'column': int(col) - 1,
-                'message': description.capitalize(),
-                'code': code,
+    return report.feedback
+
+
+class StyleChecker:
+    """
+    Checks the style of the code in one tab with PyCodeStyle again and again
+    as it is edited. The results are kept for each block of the file (a
+    top-level statement and the lines after it up to the next one), so after
+    an edit only the blocks that were touched, and the blocks either side of
+    them, are checked again.
+
+    The results are the same as check_pycodestyle gives for the whole file.
+    If an edit has an effect beyond the neighbouring blocks (for example, it
+    leaves a bracket or string open) the whole file is checked again.
+    """
+
+    def __init__(self):
+        #: PyCodeStyle's options, set when code is first checked.
+        self.options = None
+        self.lines = []
+        self.revision = None
+        # Each block is a dictionary of the line it starts on, the line after
+        # it ends, the checker's state at its start and the feedback for its
+        # lines, counting from the start of the block.
+        self.blocks = []
+        #: The number of lines checked by the last call to check.
+        self.checked = 0
+
+    def check(self, code, revision=None, changes=None):
+        """
+        Returns the feedback for the code, in the same form as
+        check_pycodestyle.
+
+        The revision identifies this version of the code. If given, changes
+        is a (revision, first line, number of unchanged lines at the end)
+        tuple describing where the code has been edited since the earlier
+        revision, as returned by EditorPane.take_changes. Otherwise (or if
+        the earlier revision isn't the one last checked) the edited lines are
+        found by comparing the code with the last version checked.
+        """
+        if self.options is None:
+            self.options = get_checkers().style_options()
+        lines = io.StringIO(code, newline=None).readlines()
+        change = self._find_change(lines, changes)
+        if change is None:
+            self.checked = 0
+        elif not (self.lines and not self._tokenize_failed(self.blocks) and
+                  self._check_change(lines, *change)):
+            self.blocks = self._check_lines(lines, None, True)
+            self.checked = len(lines)
+        self.lines = lines
+        self.revision = revision
+        return self.feedback()
+
+    def feedback(self):
+        """
+        Returns the feedback for the whole of the last version checked.
+        """
+        feedback = {}
+        for block in self.blocks:
+            for offset, problems in block['feedback'].items():
+                line_no = block['start'] + offset
+                feedback[line_no] = [dict(problem, line_no=line_no)
+                                     for problem in problems]
+        return feedback
+
+    def _find_change(self, lines, changes):
+        """
+        Returns a (first line, number of unchanged lines at the end) tuple
+        describing where the lines differ from the last version checked, or
+        None if they are the same.
+        """
+        old = self.lines
+        limit = min(len(old), len(lines))
+        if changes and self.revision is not None and \
+                changes[0] == self.revision:
+            _, head, tail = changes
+            if head is None:
+                return None if lines == old else (0, 0)
+            # Scintilla counts the empty line after a final newline.
+            tail = max(tail - 1, 0)
+        else:
+            if lines == old:
+                return None
+            head = 0
+            while head < limit and old[head] == lines[head]:
+                head += 1
+            tail = 0
+            while tail < limit - head and old[-1 - tail] == lines[-1 - tail]:
+                tail += 1
+        head = min(head, limit)
+        return head, min(tail, limit - head)
+
+    def _check_change(self, lines, head, tail):
+        """
+        Checks again the blocks touched by a change to the lines from head
+        up to the last tail lines. Returns False if the change can't be
+        checked on its own, in which case nothing is updated.
+        """
+        blocks = self.blocks
+        old_count = len(self.lines)
+        starts = [block['start'] for block in blocks]
+        last_line = min(max(old_count - tail - 1, head), old_count - 1)
+        first = bisect.bisect_right(starts, min(head, old_count - 1)) - 1
+        # The block after the change is checked too, as the blank lines and
+        # statement before a block affect its results.
+        last = min(bisect.bisect_right(starts, last_line), len(blocks) - 1)
+        shift = len(lines) - old_count
+        end = blocks[last]['end'] + shift
+        at_end = last == len(blocks) - 1
+        end_state = None if at_end else blocks[last + 1]['state']
+        while True:
+            # The block before the change is checked too, as it sets the
+            # scene for the changed blocks, but its own results don't change
+            # (unless the change joins something on to it, in which case go
+            # back another block).
+            context = blocks[first - 1] if first else None
+            start = context['start'] if context else 0
+            if end <= start:
+                return False
+            new_blocks = self._check_lines(lines[start:end],
+                                           context['state'] if context
+                                           else None, at_end, end_state)
+            if new_blocks is None:
+                return False
+            if not context or new_blocks[0]['end'] == context['end'] - start:
+                break
+            first -= 1
+        if self._tokenize_failed(new_blocks):
+            return False
+        if context:
+            new_blocks[0] = context
+        for block in new_blocks[1:] if context else new_blocks:
+            block['start'] += start
+            block['end'] += start
+        for block in blocks[last + 1:]:
+            new_blocks.append(dict(block, start=block['start'] + shift,
+                                   end=block['end'] + shift))
+        self.blocks = blocks[:max(first - 1, 0)] + new_blocks
+        self.checked = end - start
+        return True
+
+    @staticmethod
+    def _tokenize_failed(blocks):
+        """
+        Returns True if the results for the referenced blocks include a
+        problem (E9xx) that stopped PyCodeStyle reading the code properly, in
+        which case the blocks' states can't be relied on and the whole file
+        must be checked again.
+        """
+        return any(problem['code'].startswith('E9')
+                   for block in blocks
+                   for problems in block['feedback'].values()
+                   for problem in problems)
+
+    def _check_lines(self, lines, state, at_end, end_state=None):
+        """
+        Checks the lines with the checker starting in the referenced state,
+        and returns them divided into blocks.
+
+        Unless the lines are at_end of the file, the checks must leave the
+        checker in end_state (the state at the start of the next block) and
+        the lines must not have any problems that stop them being checked
+        on their own, otherwise None is returned.
+        """
+        checkers = get_checkers()
+        report = checkers.MuStyleReport(self.options)
+        checker = checkers.MuStyleChecker(lines, self.options, report, state)
+        checker.check_all()
+        feedback = report.feedback
+        if not at_end:
+            if checker.state != end_state:
+                return None
+            for problems in feedback.values():
+                if any(p['code'].startswith('E9') for p in problems):
+                    return None
+            # These are about the end of the file, which this isn't.
+            last_problems = feedback.get(len(lines) - 1, [])
+            last_problems[:] = [p for p in last_problems
+                                if p['code'] not in ('W391', 'W292')]
+            if not last_problems:
+                feedback.pop(len(lines) - 1, None)
+        checker.block_states[0] = state
+        starts = sorted(checker.block_states)
+        blocks = []
+        for i, start in enumerate(starts):
+            blocks.append({
+                'start': start,
+                'end': starts[i + 1] if i + 1 < len(starts) else len(lines),
+                'state': checker.block_states[start],
+                'feedback': {},
             })
-    return style_feedback
+        for line_no, problems in feedback.items():
+            block = blocks[max(bisect.bisect_right(starts, line_no) - 1, 0)]
+            block['feedback'][line_no - block['start']] = problems
+        return blocks
 
 
 class MuFlakeCodeReporter:
@@ -328,6 +666,279 @@ class MuFlakeCodeReporter:
             })
 
 
+class LintWorker:
+    """
+    Checks code with check_flake and check_pycodestyle on a background thread
+    so that large files don't freeze the editor while they're checked.
+
+    Only the most recent request for each tab is of interest, so a new request
+    cancels one for the same tab that is still waiting to start.
+
+    The results for the last LINT_CACHE_SIZE versions of code checked are
+    kept, keyed by a hash of the code, so going back to a version that was
+    already checked (with undo, for example) costs nothing.
+    """
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending = {}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, key, filename, code, callback, check_style=None):
+        """
+        Queues the code to be checked and returns the resulting future. Once
+        finished, callback(flake, pep8) is called from the worker thread with
+        the feedback from check_flake and check_pycodestyle. The key (usually
+        the tab containing the code) identifies requests that supersede each
+        other. If given, check_style(code) is used in place of
+        check_pycodestyle to check the style of the code.
+
+        If the code has been checked before the callback is called straight
+        away, from the calling thread, with the results from then.
+        """
+        digest = hashlib.sha1(code.encode('utf-8')).hexdigest()
+        cache_key = (filename, digest)
+        with self._lock:
+            stale = self._pending.pop(key, None)
+            cached = self._cache.get(cache_key)
+            if cached is None:
+                future = self._executor.submit(self._check, filename, code,
+                                               callback, cache_key,
+                                               check_style)
+                self._pending[key] = future
+            else:
+                self._cache.move_to_end(cache_key)
+        # Cancelling runs the stale future's done callbacks (which take the
+        # lock) straight away, so this must happen after releasing it.
+        if stale is not None and stale.cancel():
+            logger.debug('Cancelled stale check of {}'.format(filename))
+        if cached is not None:
+            logger.debug('Reused check of {}'.format(filename))
+            future = Future()
+            future.set_result(cached)
+            callback(*cached)
+            return future
+        future.add_done_callback(lambda f: self._finished(key, f))
+        return future
+
+    def _check(self, filename, code, callback, cache_key, check_style):
+        """
+        Runs on the worker thread to check the code and report the results.
+        """
+        flake = check_flake(filename, code)
+        if flake:
+            logger.log(TRACE, 'Flake feedback: %s', flake)
+        pep8 = (check_style or check_pycodestyle)(code)
+        if pep8:
+            logger.log(TRACE, 'Style feedback: %s', pep8)
+        with self._lock:
+            self._cache[cache_key] = (flake, pep8)
+            if len(self._cache) > LINT_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        callback(flake, pep8)
+        return flake, pep8
+
+    def _finished(self, key, future):
+        """
+        Forgets the referenced request once it is done (or cancelled).
+        """
+        with self._lock:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+        if not future.cancelled() and future.exception():
+            logger.error('Could not check code: {}'.format(
+                         future.exception()))
+
+
+def check_file(path):
+    """
+    Checks the Python file at the referenced path with check_flake and
+    check_pycodestyle. Returns a dictionary containing the number of errors
+    (found by PyFlakes), the number of style problems (found by PyCodeStyle)
+    and a list of all the problems in order, or a description of the error
+    if the file can't be read.
+
+    When checking many files this runs in another process, so everything in
+    the result can be pickled (and saved as JSON).
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            code = f.read()
+    except (OSError, UnicodeDecodeError) as ex:
+        return {'error': str(ex)}
+    flake = check_flake(path, code)
+    pep8 = check_pycodestyle(code)
+    problems = []
+    for problem_type, feedback in (('error', flake), ('style', pep8)):
+        for line_problems in feedback.values():
+            for problem in line_problems:
+                problems.append(dict(problem, type=problem_type))
+    problems.sort(key=lambda p: (p['line_no'], p.get('column', 0)))
+    return {
+        'errors': sum(len(p) for p in flake.values()),
+        'style': sum(len(p) for p in pep8.values()),
+        'problems': problems,
+    }
+
+
+def check_workspace(directory, cache_file=CHECK_CACHE_FILE, workers=None):
+    """
+    Checks every Python file in the referenced directory, and the
+    directories within it, with check_file. The files are checked in
+    parallel by a pool of worker processes (as many as there are CPUs,
+    unless the number of workers is given).
+
+    The results for each file are kept in cache_file (if given), together
+    with the file's modification time and size, and reused until either
+    changes.
+
+    Returns a report: a dictionary of the directory, the results for each
+    file (by its path relative to the directory) and the totals.
+    """
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        paths.extend(os.path.join(root, name) for name in sorted(files)
+                     if name.endswith('.py'))
+    cache = {}
+    if cache_file:
+        try:
+            with open(cache_file) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            logger.debug('No usable check cache at {}'.format(cache_file))
+    results = {}
+    to_check = []
+    for path in paths:
+        key = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except OSError as ex:
+            results[path] = {'error': str(ex)}
+            continue
+        signature = [stat.st_mtime, stat.st_size, __version__]
+        cached = cache.get(key)
+        if cached and cached['signature'] == signature:
+            results[path] = cached['result']
+        else:
+            to_check.append((path, key, signature))
+    logger.info('Checking {} of {} files in {}'.format(
+                len(to_check), len(paths), directory))
+    checked = None
+    if len(to_check) > 1:
+        try:
+            # Importing this starts up multiprocessing, so it waits until
+            # it's needed.
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                checked = list(executor.map(check_file,
+                                            [c[0] for c in to_check]))
+        except (OSError, RuntimeError) as ex:
+            # Processes can't be started or one of them died.
+            logger.error('Could not check files in parallel: {}'.format(ex))
+    if checked is None:
+        checked = [check_file(c[0]) for c in to_check]
+    for (path, key, signature), result in zip(to_check, checked):
+        results[path] = result
+        if 'error' not in result:
+            cache[key] = {'signature': signature, 'result': result}
+    if cache_file and to_check:
+        # Forget files that have gone.
+        cache = {k: v for k, v in cache.items() if os.path.exists(k)}
+        try:
+            with open_atomic(cache_file, 'w') as f:
+                json.dump(cache, f)
+        except OSError as ex:
+            logger.error('Could not save check cache: {}'.format(ex))
+    files = {os.path.relpath(path, directory): results[path]
+             for path in paths}
+    return {
+        'directory': directory,
+        'files': files,
+        'totals': {
+            'files': len(files),
+            'checked': len(to_check),
+            'errors': sum(r.get('errors', 0) for r in files.values()),
+            'style': sum(r.get('style', 0) for r in files.values()),
+            'unreadable': sum('error' in r for r in files.values()),
+        },
+    }
+
+
+def summarise_report(report):
+    """
+    Returns a summary of the referenced report from check_workspace as a
+    list of (relative path, text) tuples: a line of totals (without a path)
+    and then a line for each file with problems.
+    """
+    totals = report['totals']
+    summary = [(None, '{} files checked in {}: {} errors, {} style '
+                      'problems.'.format(totals['files'], report['directory'],
+                                         totals['errors'], totals['style']))]
+    for path, result in sorted(report['files'].items()):
+        if 'error' in result:
+            summary.append((path, '{}: could not be checked ({})'.format(
+                path, result['error'])))
+        elif result['errors'] or result['style']:
+            summary.append((path, '{}: {} errors, {} style problems'.format(
+                path, result['errors'], result['style'])))
+    return summary
+
+
+def write_report(report, path):
+    """
+    Writes the referenced report from check_workspace to path as JSON.
+    """
+    with open_atomic(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+
+def freeze_support():
+    """
+    In a frozen (packaged) Mu, the processes started by check_workspace run
+    the program's entry point again, which must hand them straight over to
+    multiprocessing rather than starting another Mu. Entry points call this
+    first. multiprocessing is only imported if Mu is frozen, as it takes a
+    while to import.
+    """
+    if getattr(sys, 'frozen', False):
+        import multiprocessing
+        multiprocessing.freeze_support()
+
+
+def check_workspace_main(argv=None):
+    """
+    Entry point for the mu-check command, which checks all the Python files
+    in a directory (the Mu workspace by default), prints a summary and,
+    if asked, writes the full report as JSON.
+    """
+    freeze_support()
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Check all the Python files in a directory for '
+                    'mistakes and style problems.')
+    parser.add_argument('directory', nargs='?',
+                        help='the directory to check (defaults to the Mu '
+                             'workspace)')
+    parser.add_argument('-o', '--output',
+                        help='write the full report as JSON to this file')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='the number of files to check at once')
+    parser.add_argument('--no-cache', action='store_true',
+                        help="don't reuse results from earlier checks")
+    args = parser.parse_args(argv)
+    directory = args.directory or get_workspace_dir()
+    report = check_workspace(directory,
+                             None if args.no_cache else CHECK_CACHE_FILE,
+                             args.workers)
+    for _, line in summarise_report(report):
+        print(line)
+    if args.output:
+        write_report(report, args.output)
+        print('Report written to {}'.format(args.output))
+
+
 class REPL:
     """
     Read, Evaluate, Print, Loop.
@@ -361,46 +972,106 @@ class Editor:
         self.fs = None
         self.theme = 'day'
         self.user_defined_microbit_path = None
+        self.lint_worker = LintWorker()
+        # Each tab's StyleChecker, dropped when the tab goes.
+        self._style_checkers = weakref.WeakKeyDictionary()
         if not os.path.exists(DATA_DIR):
             logger.debug('Creating directory: {}'.format(DATA_DIR))
             os.makedirs(DATA_DIR)
-        if not os.path.exists(get_workspace_dir()):
-            logger.debug('Creating directory: {}'.format(get_workspace_dir()))
-            os.makedirs(get_workspace_dir())
+        workspace_dir = get_workspace_dir()
+        if not os.path.exists(workspace_dir):
+            logger.debug('Creating directory: {}'.format(workspace_dir))
+            os.makedirs(workspace_dir)
 
     def restore_session(self, passed_filename=None):
         """
         Attempts to recreate the tab state from the last time the editor was
         run.
         """
-        settings_path = get_settings_path()
-        with open(settings_path) as f:
-            try:
-                old_session = json.load(f)
-            except ValueError:
-                logger.error('Settings file {} could not be parsed.'.format(
-                             settings_path))
-            else:
-                logger.info('Restoring session from: {}'.format(settings_path))
-                logger.debug(old_session)
-                if 'theme' in old_session:
-                    self.theme = old_session['theme']
-                if 'paths' in old_session:
-                    for path in old_session['paths']:
-                        # if the os passed in a file, defer loading it now
-                        if passed_filename and path in passed_filename:
-                            continue
-                        self.direct_load(path)
+        logger.info('Restoring session from: {}'.format(SETTINGS.path))
+        self.theme = SETTINGS.get('theme', self.theme)
+        cursors = SETTINGS.get('cursors', {})
+        # Files from the previous session get placeholder tabs, which are
+        # only turned into editors when shown, while the files are read in
+        # the background.
+        placeholders = []
+        for path in SETTINGS.get('paths', []):
+            # if the os passed in a file, defer loading it now
+            if passed_filename and path in passed_filename:
+                continue
+            placeholders.append(self._view.add_placeholder(path,
+                                                           cursors.get(path)))
         # handle os passed file last,
         # so it will not be focused over by another tab
         if passed_filename:
             self.direct_load(passed_filename)
+            self._restore_cursor(passed_filename, cursors.get(passed_filename))
+        elif placeholders:
+            self._view.focus_tab(placeholders[-1])
+        if placeholders:
+            # Read the file in the tab that's shown first.
+            threading.Thread(target=self._read_placeholders,
+                             args=(placeholders[::-1], ), daemon=True).start()
         if not self._view.tab_count:
             py = 'from microbit import *{}{}# Write your code here :-)'.format(
                 os.linesep, os.linesep)
             self._view.add_tab(None, py)
         self._view.set_theme(self.theme)
 
+    def _read_placeholders(self, placeholders):
+        """
+        Runs in the background to read the files for the referenced
+        placeholder tabs, sending the text of each to the view.
+        """
+        for placeholder in placeholders:
+            try:
+                with open(placeholder.path, newline='') as f:
+                    text = f.read()
+            except (OSError, UnicodeDecodeError) as ex:
+                logger.warning('could not load {}: {}'.format(placeholder.path,
+                                                              ex))
+                text = None
+            self._view.tab_text_ready.emit(placeholder, text)
+
+    def placeholder_loaded(self, placeholder, text):
+        """
+        Keeps the text read for the referenced placeholder tab, replacing the
+        placeholder with an editor if it's being shown. If the file could not
+        be read (text is None) the tab is removed.
+        """
+        if text is None:
+            self._view.remove_placeholder(placeholder)
+            return
+        placeholder.contents = text
+        if self._view.is_current(placeholder):
+            self._replace_placeholder(placeholder)
+
+    def show_placeholder(self, placeholder):
+        """
+        Replaces the referenced placeholder tab, which has just been shown,
+        with an editor. If its file hasn't been read yet, this happens once
+        it has.
+        """
+        if placeholder.contents is not None:
+            self._replace_placeholder(placeholder)
+
+    def _replace_placeholder(self, placeholder):
+        tab = self._view.replace_placeholder(placeholder, placeholder.path,
+                                             placeholder.contents)
+        if placeholder.cursor:
+            tab.setCursorPosition(*placeholder.cursor)
+            tab.ensureCursorVisible()
+
+    def _restore_cursor(self, path, position):
+        """
+        Moves the cursor of the tab just loaded from the referenced path back
+        to its position, a (line, index) pair, from the previous session.
+        """
+        tab = self._view.current_tab
+        if position and tab and tab.path == path:
+            tab.setCursorPosition(*position)
+            tab.ensureCursorVisible()
+
     def flash(self):
         """
         Takes the currently active tab, compiles the Python script therein into
@@ -413,8 +1084,7 @@ class Editor:
             # There is no active text editor.
             return
         python_script = tab.text().encode('utf-8')
-        logger.debug('Python script:')
-        logger.debug(python_script)
+        logger.log(TRACE, 'Python script: %r', python_script)
         if len(python_script) >= 8192:
             message = 'Unable to flash "{}"'.format(tab.label)
             information = ("Your script is too long!")
@@ -422,6 +1092,7 @@ class Editor:
             return
         # Determine the location of the BBC micro:bit. If it can't be found
         # fall back to asking the user to locate it.
+        uflash = get_uflash()
         path_to_microbit = uflash.find_microbit()
         if path_to_microbit is None:
             # Has the path to the device already been specified?
@@ -476,7 +1147,7 @@ class Editor:
         if self.repl is None:
             if self.fs is None:
                 try:
-                    microfs.get_serial()
+                    get_microfs().get_serial()
                     self._view.add_filesystem(home=get_workspace_dir())
                     self.fs = True
                 except IOError:
@@ -586,6 +1257,7 @@ class Editor:
             self.theme = 'day'
         logger.info('Toggle theme to: {}'.format(self.theme))
         self._view.set_theme(self.theme)
+        self._view.notify_session_changed()
 
     def new(self):
         """
@@ -617,13 +1289,13 @@ class Editor:
                 # name to None, thus forcing the user to work out what to name
                 # the recovered script.
                 with open(path, newline='') as f:
-                    text = uflash.extract_script(f.read())
+                    text = get_uflash().extract_script(f.read())
                 name = None
         except FileNotFoundError:
             logger.warning('could not load {}'.format(path))
             pass
         else:
-            logger.debug(text)
+            logger.log(TRACE, 'Script: %r', text)
             self._view.add_tab(name, text)
 
     def load(self):
@@ -657,9 +1329,11 @@ class Editor:
             try:
                 with open_atomic(tab.path, 'w', newline='') as f:
                     logger.info('Saving script to: {}'.format(tab.path))
-                    logger.debug(tab.text())
-                    f.write(tab.text())
+                    text = tab.text()
+                    logger.log(TRACE, 'Script: %r', text)
+                    f.write(text)
                 tab.setModified(False)
+                self._view.notify_session_changed()
             except OSError as e:
                 logger.error(e)
                 message = 'Could not save file.'
@@ -693,20 +1367,102 @@ class Editor:
         if tab is None:
             # There is no active text editor so abort.
             return
+        self.lint(tab)
+
+    def lint(self, tab):
+        """
+        Checks the code in the referenced tab in the background. The view
+        also calls this whenever typing in a tab pauses.
+
+        The tab is sent the results via its lint_finished signal, together
+        with the revision of the code that was checked so the tab can drop
+        results that are out of date.
+
+        PyFlakes checks the whole of the code every time, but only the parts
+        of the code edited since the last check are checked for style (see
+        StyleChecker).
+        """
         filename = tab.path if tab.path else 'untitled'
-        flake = check_flake(filename, tab.text())
-        if flake:
-            logger.info(flake)
-            self._view.annotate_code(flake, 'error')
-        pep8 = check_pycodestyle(tab.text())
-        if pep8:
-            logger.info(pep8)
-            self._view.annotate_code(pep8, 'style')
+        revision = tab.revision
+        changes = tab.take_changes()
+        style_checker = self._style_checkers.get(tab)
+        if style_checker is None:
+            style_checker = self._style_checkers[tab] = StyleChecker()
+
+        def report(flake, pep8):
+            try:
+                tab.lint_finished.emit(revision, flake, pep8)
+            except RuntimeError:
+                # The tab was closed while its code was being checked.
+                logger.debug('Tab closed before check of {} finished'.format(
+                             filename))
+
+        self.lint_worker.check(
+            tab, filename, tab.text(), report,
+            lambda code: style_checker.check(code, revision, changes))
+
+    def check_all(self):
+        """
+        Checks all the Python files in the workspace in the background. The
+        full report is written to CHECK_REPORT_FILENAME in the workspace and
+        a summary is shown. If a summary is already showing, it's hidden.
+        """
+        if self._view.report is not None:
+            self._view.remove_report()
+            return
+        directory = get_workspace_dir()
+        threading.Thread(target=self._check_all, args=(directory, ),
+                         daemon=True).start()
+
+    def _check_all(self, directory):
+        """
+        Runs in the background to check all the files in the referenced
+        directory, then sends the summary to the view.
+        """
+        try:
+            report = check_workspace(directory)
+            write_report(report, os.path.join(directory,
+                                              CHECK_REPORT_FILENAME))
+        except Exception as ex:
+            logger.error('Could not check all files: {}'.format(ex))
+            return
+        self._view.report_ready.emit(directory, summarise_report(report))
+
+    def session(self):
+        """
+        Returns a dictionary describing the current session: the files open
+        in tabs, the position of the cursor in each of them and the theme.
+        """
+        paths = []
+        cursors = {}
+        for widget in self._view.widgets:
+            if widget.path:
+                paths.append(widget.path)
+                cursors[widget.path] = list(widget.getCursorPosition())
+        return {
+            'theme': self.theme,
+            'paths': paths,
+            'cursors': cursors,
+            'workspace': get_workspace_dir(),
+            'microbit_runtime_hex': get_runtime_hex_path()
+        }
+
+    def save_session(self):
+        """
+        Records the current session in the settings and writes them to disk
+        in the background. The view calls this once changes to the tabs have
+        settled, so a burst of changes causes a single write.
+        """
+        session = self.session()
+        logger.log(TRACE, 'Session: %s', session)
+        SETTINGS.update(session)
+        SETTINGS.save_in_background()
 
     def show_help(self):
         """
         Display browser based help about Mu.
         """
+        import webbrowser
         webbrowser.open_new('http://codewith.mu/help/{}'.format(__version__))
 
     def quit(self, *args, **kwargs):
@@ -724,19 +1480,10 @@ class Editor:
                     # The function is handling an event, so ignore it.
                     args[0].ignore()
                 return
-        paths = []
-        for widget in self._view.widgets:
-            if widget.path:
-                paths.append(widget.path)
-        session = {
-            'theme': self.theme,
-            'paths': paths,
-            'workspace': get_workspace_dir(),
-            'microbit_runtime_hex': get_runtime_hex_path()
-        }
-        logger.debug(session)
-        settings_path = get_settings_path()
-        with open(settings_path, 'w') as out:
-            logger.debug('Saving session to: {}'.format(settings_path))
-            json.dump(session, out, indent=2)
+        # The session is normally saved as it changes, so this only writes
+        # whatever has changed since.
+        session = self.session()
+        logger.log(TRACE, 'Session: %s', session)
+        SETTINGS.update(session)
+        SETTINGS.save()
         sys.exit(0)
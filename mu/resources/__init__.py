@@ -17,38 +17,55 @@ GNU General Public License for more details.
 You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
-from pkg_resources import resource_filename, resource_string
+import os
+from functools import lru_cache
 from PyQt5.QtGui import QPixmap, QIcon
 from PyQt5.QtCore import QDir
 
 
+#: The directory containing the resources.
+RESOURCE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 # The following lines add the images and css directories to the search path.
-QDir.addSearchPath('images', resource_filename(__name__, 'images'))
-QDir.addSearchPath('css', resource_filename(__name__, 'css'))
+QDir.addSearchPath('images', os.path.join(RESOURCE_DIR, 'images'))
+QDir.addSearchPath('css', os.path.join(RESOURCE_DIR, 'css'))
 
 
 def path(name, resource_dir="images/"):
     """Return the filename for the referenced image."""
-    return resource_filename(__name__, resource_dir + name)
+    return os.path.join(RESOURCE_DIR, resource_dir, name)
 
 
+@lru_cache(maxsize=None)
 def load_icon(name):
-    """Load an icon from the resources directory."""
+    """
+    Load an icon from the resources directory. Each icon is only loaded once.
+    """
     return QIcon(path(name))
 
 
+@lru_cache(maxsize=None)
 def load_pixmap(name):
-    """Load a pixmap from the resources directory."""
+    """
+    Load a pixmap from the resources directory. Each pixmap is only loaded
+    once.
+    """
     return QPixmap(path(name))
 
 
+@lru_cache(maxsize=None)
 def load_stylesheet(name):
-    """Load a CSS stylesheet from the resources directory."""
-    return resource_string(__name__, "css/" + name).decode('utf8')
+    """
+    Load a CSS stylesheet from the resources directory. Each stylesheet is
+    only read once.
+    """
+    with open(path(name, "css/"), encoding='utf8') as f:
+        return f.read()
 
 
 def load_font_data(name):
     """
     Load the (binary) content of a font as bytes
     """
-    return resource_string(__name__, "fonts/" + name)
+    with open(path(name, "fonts/"), 'rb') as f:
+        return f.read()
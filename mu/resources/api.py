@@ -28,6 +28,7 @@ MICROPYTHON_APIS = [
     "microbit.sleep(time) \nPut micro:bit to sleep for some milliseconds (1 second = 1000 ms) of time.\nsleep(2000) gives micro:bit a 2 second nap.",
     "microbit.running_time() \nReturn running_time() in milliseconds since micro:bit's last reset.",
     "microbit.temperature() \nReturn micro:bit's temperature in degrees Celcius.",
+    "microbit.reset() \nRestart micro:bit, running your script again from the start.",
     # Accelerometer 3D orientation
     "microbit.accelerometer.get_x() \nReturn micro:bit's tilt (X acceleration) in milli-g's.",
     "microbit.accelerometer.get_y() \nReturn micro:bit's tilt (Y acceleration) in milli-g's.",
@@ -2,30 +2,123 @@
 """
 Tests for the app script.
 """
+import json
 import logging
+import os
 import sys
+import threading
+import uuid
 from unittest import mock
-from mu.app import excepthook, run, setup_logging
-from mu.logic import LOG_FILE, LOG_DIR
+import pytest
+from PyQt5.QtWidgets import QApplication
+import mu.app
+from mu.app import (excepthook, run, setup_logging, StartupTimer,
+                    startup_profile_path, startup_finished, InstanceServer,
+                    send_to_instance, get_log_level, PROFILE_STARTUP_ENV,
+                    PROFILE_STARTUP_FLAG, STARTUP_PROFILE_FILE, LOG_LEVEL_ENV,
+                    DEFAULT_LOG_LEVEL, LOG_MAX_BYTES, LOG_BACKUP_COUNT)
+from mu.logic import LOG_FILE, LOG_DIR, TRACE
 
 
 def test_setup_logging():
     """
-    Ensure that logging is set up in some way.
+    Ensure that logging is set up to write to the log file from a background
+    thread, with the previous log kept.
     """
-    with mock.patch('mu.app.logging.basicConfig',
-                    return_value=None) as log_conf, \
-            mock.patch('mu.app.os.path.exists', return_value=False),\
-            mock.patch('mu.app.os.makedirs', return_value=None) as mkdir:
-        setup_logging()
+    root = mock.MagicMock()
+    with mock.patch('mu.app.os.path.exists', return_value=False), \
+            mock.patch('mu.app.os.makedirs', return_value=None) as mkdir, \
+            mock.patch('mu.app.RotatingFileHandler') as rfh, \
+            mock.patch('mu.app.QueueListener') as ql, \
+            mock.patch('mu.app.QueueHandler') as qh, \
+            mock.patch('mu.app.logging.getLogger', return_value=root), \
+            mock.patch('mu.app.atexit.register') as register, \
+            mock.patch.dict(os.environ, {LOG_LEVEL_ENV: ''}):
+        listener = setup_logging()
         mkdir.assert_called_once_with(LOG_DIR)
+        rfh.assert_called_once_with(LOG_FILE, maxBytes=LOG_MAX_BYTES,
+                                    backupCount=LOG_BACKUP_COUNT,
+                                    encoding='utf-8', delay=True)
+        assert rfh().doRollover.call_count == 0
         fmt = '%(asctime)s - %(name)s(%(funcName)s) %(levelname)s: %(message)s'
-        log_conf.assert_called_once_with(filename=LOG_FILE, filemode='w',
-                                         format=fmt,
-                                         level=logging.DEBUG)
+        assert rfh().setFormatter.call_args[0][0]._fmt == fmt
+        log_queue = qh.call_args[0][0]
+        ql.assert_called_once_with(log_queue, rfh())
+        root.addHandler.assert_called_once_with(qh())
+        root.setLevel.assert_called_once_with(logging.DEBUG)
+        assert listener == ql()
+        listener.start.assert_called_once_with()
+        register.assert_called_once_with(listener.stop)
         assert sys.excepthook == excepthook
 
 
+def test_setup_logging_rolls_over():
+    """
+    Each start begins a new log file, keeping the last one.
+    """
+    with mock.patch('mu.app.os.path.exists', return_value=True), \
+            mock.patch('mu.app.os.path.getsize', return_value=10), \
+            mock.patch('mu.app.RotatingFileHandler') as rfh, \
+            mock.patch('mu.app.QueueListener'), \
+            mock.patch('mu.app.QueueHandler'), \
+            mock.patch('mu.app.logging.getLogger'), \
+            mock.patch('mu.app.atexit.register'):
+        setup_logging()
+    rfh().doRollover.assert_called_once_with()
+
+
+def test_setup_logging_writes_in_background(tmpdir):
+    """
+    Records are written to the log file by the listener, not as they are
+    logged, and messages for levels that aren't enabled aren't formatted.
+    """
+    log_file = str(tmpdir.join('mu.log'))
+    with open(log_file, 'w') as f:
+        f.write('last time\n')
+    root = logging.getLogger()
+    old_level = root.level
+    old_handlers = root.handlers[:]
+    old_excepthook = sys.excepthook
+    payload = mock.MagicMock()
+    try:
+        with mock.patch('mu.app.LOG_DIR', str(tmpdir)), \
+                mock.patch('mu.app.LOG_FILE', log_file), \
+                mock.patch('mu.app.atexit.register'), \
+                mock.patch.dict(os.environ, {LOG_LEVEL_ENV: 'debug'}):
+            listener = setup_logging()
+        logging.getLogger('mu.test').info('Hello')
+        logging.getLogger('mu.test').log(TRACE, 'Script: %s', payload)
+        listener.stop()
+    finally:
+        root.handlers = old_handlers
+        root.setLevel(old_level)
+        sys.excepthook = old_excepthook
+    assert payload.__str__.call_count == 0
+    with open(log_file) as f:
+        log = f.read()
+    assert '(test_setup_logging_writes_in_background) INFO: Hello' in log
+    assert 'Script' not in log
+    with open(log_file + '.1') as f:
+        assert f.read() == 'last time\n'
+
+
+def test_get_log_level():
+    """
+    The level named by the environment variable is used, falling back to the
+    default if it isn't set or isn't a level.
+    """
+    with mock.patch.dict(os.environ, {LOG_LEVEL_ENV: 'trace'}):
+        assert get_log_level() == TRACE
+    with mock.patch.dict(os.environ, {LOG_LEVEL_ENV: 'WARNING'}):
+        assert get_log_level() == logging.WARNING
+    with mock.patch.dict(os.environ, {LOG_LEVEL_ENV: 'LOUD'}), \
+            mock.patch('builtins.print') as mock_print:
+        assert get_log_level() == DEFAULT_LOG_LEVEL
+    mock_print.assert_called_once_with('Unknown log level: LOUD')
+    with mock.patch.dict(os.environ, {}, clear=True):
+        assert get_log_level() == DEFAULT_LOG_LEVEL
+
+
 def test_run():
     """
     Ensure the run function sets things up in the expected way.
@@ -44,8 +137,16 @@ def test_run():
             mock.patch('mu.app.Editor') as ed, \
             mock.patch('mu.app.load_pixmap'), \
             mock.patch('mu.app.Window') as win, \
+            mock.patch('mu.app.Font'), \
+            mock.patch('mu.app.shared_api') as api, \
+            mock.patch('mu.app.QTimer') as timer, \
+            mock.patch('mu.app.send_to_instance', return_value=False), \
+            mock.patch('mu.app.InstanceServer') as server, \
             mock.patch('sys.exit') as ex:
         run()
+        server().start.assert_called_once_with()
+        assert api.call_count == 1
+        assert timer.singleShot.call_count == 1
         assert set_log.call_count == 1
         # foo.call_count is instantiating the class
         assert qa.call_count == 1
@@ -56,10 +157,243 @@ def test_run():
         assert ed.call_count == 1
         assert len(ed.mock_calls) == 2
         assert win.call_count == 1
-        assert len(win.mock_calls) == 14
+        assert len(win.mock_calls) == 20
         assert ex.call_count == 1
 
 
+def test_run_profile_startup():
+    """
+    The timings are written where the command line flag asks once the event
+    loop is running, and the flag isn't mistaken for a file to open.
+    """
+    with mock.patch('mu.app.setup_logging'), \
+            mock.patch('mu.app.QApplication'), \
+            mock.patch('mu.app.QSplashScreen'), \
+            mock.patch('mu.app.Editor') as ed, \
+            mock.patch('mu.app.load_pixmap'), \
+            mock.patch('mu.app.Window'), \
+            mock.patch('mu.app.Font'), \
+            mock.patch('mu.app.shared_api'), \
+            mock.patch('mu.app.QTimer') as timer, \
+            mock.patch('mu.app.startup_finished') as finished, \
+            mock.patch('mu.app.send_to_instance', return_value=False), \
+            mock.patch('mu.app.InstanceServer'), \
+            mock.patch('sys.argv', ['mu', PROFILE_STARTUP_FLAG]), \
+            mock.patch('sys.exit'):
+        run()
+        ed().restore_session.assert_called_once_with(None)
+        callback = timer.singleShot.call_args[0][1]
+        callback()
+        finished.assert_called_once_with(STARTUP_PROFILE_FILE)
+
+
+def test_run_passes_on_to_instance():
+    """
+    If a running Mu answers, it is passed the file to open and nothing else
+    is started (not even logging, which would empty the running Mu's log).
+    """
+    with mock.patch('mu.app.setup_logging') as set_log, \
+            mock.patch('mu.app.QApplication') as qa, \
+            mock.patch('mu.app.send_to_instance',
+                       return_value=True) as send, \
+            mock.patch('sys.argv', ['mu', 'foo.py']), \
+            mock.patch('sys.exit', side_effect=SystemExit) as ex:
+        with pytest.raises(SystemExit):
+            run()
+    send.assert_called_once_with('foo.py')
+    ex.assert_called_once_with(0)
+    assert set_log.call_count == 0
+    assert qa.call_count == 0
+
+
+def pass_on(path, name):
+    """
+    Calls send_to_instance on another thread while handling events on this
+    one, so the referenced server can answer. Returns its result.
+    """
+    app = QApplication.instance()
+    result = []
+    sender = threading.Thread(
+        target=lambda: result.append(send_to_instance(path, name, 2000)))
+    sender.start()
+    while sender.is_alive():
+        app.processEvents()
+    return result[0]
+
+
+def test_InstanceServer_send_to_instance():
+    """
+    A file passed on by another Mu is opened in this one, by absolute path,
+    and the window is brought to the front even if no file was passed on.
+    """
+    app = QApplication.instance() or QApplication([])
+    name = 'mu-test-{}'.format(uuid.uuid4().hex)
+    server = InstanceServer(app)
+    opened = []
+    activated = []
+    server.file_requested.connect(opened.append)
+    server.activate_requested.connect(lambda: activated.append(True))
+    assert server.start(name)
+    try:
+        assert pass_on('foo.py', name) is True
+        for i in range(10):
+            app.processEvents()
+        assert opened == [os.path.abspath('foo.py')]
+        assert len(activated) == 1
+        assert pass_on(None, name) is True
+        for i in range(10):
+            app.processEvents()
+        assert len(opened) == 1
+        assert len(activated) == 2
+    finally:
+        server.close()
+
+
+def test_send_to_instance_none_running():
+    """
+    If nothing is listening, Mu starts as usual.
+    """
+    name = 'mu-test-{}'.format(uuid.uuid4().hex)
+    assert send_to_instance('foo.py', name, 100) is False
+
+
+def test_InstanceServer_start_stale():
+    """
+    A socket left behind by a Mu that crashed is removed so this one can
+    listen, and failing to listen is logged.
+    """
+    server = InstanceServer()
+    server.listen = mock.MagicMock(side_effect=[False, True])
+    with mock.patch('mu.app.QLocalSocket') as socket, \
+            mock.patch('mu.app.QLocalServer.removeServer') as remove:
+        socket().waitForConnected.return_value = False
+        assert server.start('foo')
+    socket().connectToServer.assert_called_once_with('foo')
+    remove.assert_called_once_with('foo')
+    server.listen = mock.MagicMock(return_value=False)
+    with mock.patch('mu.app.QLocalServer.removeServer'), \
+            mock.patch('mu.app.logging.error') as error:
+        assert server.start('foo') is False
+    assert error.call_count == 1
+
+
+def test_InstanceServer_start_other_listening():
+    """
+    If another Mu answers on the socket (it started since this one checked)
+    the socket is left alone and this Mu doesn't listen.
+    """
+    app = QApplication.instance() or QApplication([])
+    name = 'mu-test-{}'.format(uuid.uuid4().hex)
+    other = InstanceServer(app)
+    assert other.start(name)
+    try:
+        server = InstanceServer(app)
+        with mock.patch('mu.app.QLocalServer.removeServer') as remove:
+            assert server.start(name) is False
+        assert remove.call_count == 0
+        assert other.isListening()
+    finally:
+        other.close()
+
+
+def test_run_other_instance_started():
+    """
+    If another Mu started listening since the check for a running Mu, the
+    file is passed on to it after all, before any window is shown.
+    """
+    with mock.patch('mu.app.setup_logging'), \
+            mock.patch('mu.app.QApplication'), \
+            mock.patch('mu.app.Window') as win, \
+            mock.patch('mu.app.send_to_instance',
+                       side_effect=[False, True]) as send, \
+            mock.patch('mu.app.InstanceServer') as server, \
+            mock.patch('sys.exit', side_effect=SystemExit), \
+            mock.patch('sys.argv', ['mu', 'foo.py']):
+        server().start.return_value = False
+        with pytest.raises(SystemExit):
+            run()
+    assert send.call_args_list == [mock.call('foo.py'), mock.call('foo.py')]
+    assert win.call_count == 0
+
+
+def test_StartupTimer():
+    """
+    Each phase lasts from the end of the previous one, and the timings are
+    logged and written as JSON.
+    """
+    with mock.patch('mu.app.time.monotonic', side_effect=[1.0, 1.5, 3.0]):
+        timer = StartupTimer()
+        timer.mark('one')
+        timer.mark('two')
+    assert timer.phases == [('one', 0.0, 0.5), ('two', 0.5, 1.5)]
+    assert timer.total == 2.0
+    with mock.patch('mu.app.logging.info') as info:
+        timer.log()
+    assert info.call_count == 3
+    info.assert_called_with('Startup took 2000.0ms')
+    result = timer.as_dict()
+    assert result['version'] == mu.app.__version__
+    assert result['phases'][1] == {'name': 'two', 'start': 0.5,
+                                   'duration': 1.5}
+    assert result['total'] == 2.0
+    mock_open = mock.mock_open()
+    with mock.patch('builtins.open', mock_open):
+        timer.write('startup.json')
+    mock_open.assert_called_once_with('startup.json', 'w')
+    written = ''.join(c[0][0] for c in mock_open().write.call_args_list)
+    assert json.loads(written) == result
+
+
+def test_startup_profile_path():
+    """
+    The command line flag is removed from argv and takes precedence over the
+    environment variable, and without either the timings are only logged.
+    """
+    argv = ['mu', PROFILE_STARTUP_FLAG, 'foo.py']
+    with mock.patch.dict(os.environ, {PROFILE_STARTUP_ENV: 'env.json'}):
+        assert startup_profile_path(argv) == STARTUP_PROFILE_FILE
+        assert argv == ['mu', 'foo.py']
+        assert startup_profile_path(argv) == 'env.json'
+    with mock.patch.dict(os.environ, {PROFILE_STARTUP_ENV: ''}):
+        assert startup_profile_path(argv) is None
+
+
+def test_startup_finished():
+    """
+    The end of startup is marked and logged, and the timings are only written
+    if asked for. Failing to write them is logged rather than raised.
+    """
+    with mock.patch('mu.app.STARTUP') as startup:
+        startup_finished()
+        startup.mark.assert_called_once_with('first event')
+        assert startup.log.call_count == 1
+        assert startup.write.call_count == 0
+        startup.write.side_effect = OSError('BANG')
+        with mock.patch('mu.app.logging.error') as error:
+            startup_finished('startup.json')
+        startup.write.assert_called_once_with('startup.json')
+        assert error.call_count == 1
+
+
+def test_run_freeze_support():
+    """
+    Ensure run hands the processes started by Check All in a frozen Mu over to
+    multiprocessing before anything else, so they don't start (or pass their
+    arguments on to) another Mu.
+    """
+    calls = mock.MagicMock()
+    with mock.patch('multiprocessing.freeze_support', calls.freeze_support), \
+            mock.patch.object(sys, 'frozen', True, create=True), \
+            mock.patch('mu.app.startup_profile_path',
+                       calls.startup_profile_path), \
+            mock.patch('mu.app.send_to_instance', calls.send_to_instance), \
+            mock.patch('sys.exit', side_effect=SystemExit):
+        with pytest.raises(SystemExit):
+            run()
+    assert calls.mock_calls[0] == mock.call.freeze_support()
+    assert calls.send_to_instance.call_count == 1
+
+
 def test_excepthook():
     """
     Test that custom excepthook logs error and calls sys.exit.
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the checkers customised for Mu.
+"""
+import ast
+from mu.checkers import (MuFlakeChecker, MuStyleReport, StyleGuide,
+                         style_options)
+
+
+def test_style_options():
+    """
+    The options are PyCodeStyle's defaults.
+    """
+    options = style_options()
+    assert options.max_line_length == 79
+    assert not options.select
+
+
+def test_MuFlakeChecker_namespaces():
+    """
+    Names provided by a star import from one of the referenced modules are
+    known, but other names are still undefined.
+    """
+    tree = ast.parse('from board import *\nled.on()\nfoo()\n')
+    checker = MuFlakeChecker(tree, filename='foo.py',
+                             namespaces={'board': {'led'}})
+    messages = [str(m) for m in checker.messages]
+    assert len(messages) == 1
+    assert "undefined name 'foo'" in messages[0]
+
+
+def test_MuFlakeChecker_no_namespaces():
+    """
+    Without namespaces a star import is reported as usual.
+    """
+    tree = ast.parse('from board import *\nled.on()\n')
+    checker = MuFlakeChecker(tree, filename='foo.py')
+    assert any('import *' in str(m) for m in checker.messages)
+
+
+def test_MuStyleReport_error():
+    """
+    Problems are recorded as structured data per line, ordered by column and
+    code, and ignored problems are skipped.
+    """
+    style = StyleGuide(parse_argv=False, config_file=False,
+                       ignore=['E501'])
+    report = MuStyleReport(style.options)
+    report.init_file('foo.py', [], [], 0)
+    assert report.error(1, 4, 'W291 trailing whitespace', None) == 'W291'
+    assert report.error(1, 0, 'W191 indentation contains tabs', None)
+    assert report.error(1, 0, 'E101 indentation contains mixed spaces and '
+                              'tabs', None) == 'E101'
+    assert report.error(2, 80, 'E501 line too long (81 > 79 characters)',
+                        None) is None
+    assert report.get_file_results() == 3
+    assert [p['code'] for p in report.feedback[0]] == ['E101', 'W191',
+                                                       'W291']
+    assert report.feedback[0][2] == {
+        'line_no': 0,
+        'column': 4,
+        'message': 'Trailing whitespace',
+        'code': 'W291',
+    }
+    assert 1 not in report.feedback
@@ -5,7 +5,8 @@ Tests for the user interface elements of Mu.
 from PyQt5.QtWidgets import (QApplication, QAction, QWidget, QFileDialog,
                              QMessageBox, QLabel, QListWidget)
 from PyQt5.QtCore import QIODevice, Qt, QSize
-from PyQt5.QtGui import QTextCursor, QIcon
+from PyQt5.QtGui import QTextCursor, QIcon, QFont
+from PyQt5.Qsci import QsciLexerPython
 from unittest import mock
 from mu import __version__
 import os
@@ -47,6 +48,93 @@ def test_Font():
     assert f.italic
 
 
+def test_Font_register():
+    """
+    Each font file is only loaded when a font in its style is first needed.
+    """
+    mu.interface.Font._DATABASE = None
+    try:
+        with mock.patch("mu.interface.QFontDatabase") as db, \
+                mock.patch("mu.interface.load_font_data",
+                           return_value=b'font') as load_font_data:
+            db.return_value.font.return_value = QFont()
+            mu.interface.Font().load()
+            mu.interface.Font(color='red').load(20)
+            assert load_font_data.call_args_list == [
+                mock.call('SourceCodePro-Regular.otf')]
+            mu.interface.Font(bold=True, italic=True).load()
+            assert load_font_data.call_args_list[1] == \
+                mock.call('SourceCodePro-SemiboldIt.otf')
+            assert mu.interface.Font._REGISTERED == {'Regular', 'SemiboldIt'}
+            db.return_value.addApplicationFontFromData.assert_called_with(
+                b'font')
+    finally:
+        mu.interface.Font._DATABASE = None
+
+
+def test_Font_register_fails():
+    """
+    A font file that can't be loaded is logged.
+    """
+    mu.interface.Font._DATABASE = None
+    try:
+        with mock.patch("mu.interface.QFontDatabase") as db, \
+                mock.patch('mu.interface.logger') as logger:
+            db.return_value.addApplicationFontFromData.return_value = -1
+            mu.interface.Font.register('Italic')
+        logger.warning.assert_called_once_with(
+            'Could not load font SourceCodePro-It.otf')
+    finally:
+        mu.interface.Font._DATABASE = None
+
+
+def test_Font_cache():
+    """
+    Each style and size of font is only loaded from the database once, and
+    copies are returned so changing one doesn't change the others.
+    """
+    mu.interface.Font._DATABASE = None
+    try:
+        with mock.patch("mu.interface.QFontDatabase") as db:
+            db.return_value.font.side_effect = lambda name, style, size: \
+                QFont(name, size)
+            loaded = mu.interface.Font.loaded
+            first = mu.interface.Font().load()
+            first.setPointSize(30)
+            second = mu.interface.Font(color='red').load()
+            assert second.pointSize() == 14
+            mu.interface.Font(bold=True).load()
+            mu.interface.Font().load(20)
+            mu.interface.Font().load(20)
+            assert db.return_value.font.call_count == 3
+            assert mu.interface.Font.loaded == loaded + 3
+    finally:
+        mu.interface.Font._DATABASE = None
+
+
+def test_Font_cache_size():
+    """
+    Only the most recently used fonts are kept, and a new font database
+    means fonts are loaded again.
+    """
+    mu.interface.Font._DATABASE = None
+    try:
+        with mock.patch("mu.interface.QFontDatabase") as db, \
+                mock.patch('mu.interface.FONT_CACHE_SIZE', 2):
+            db.return_value.font.return_value = QFont()
+            mu.interface.Font().load(10)
+            mu.interface.Font().load(12)
+            mu.interface.Font().load(10)
+            mu.interface.Font().load(14)
+            assert list(mu.interface.Font._CACHE) == [('Regular', 10),
+                                                      ('Regular', 14)]
+            mu.interface.Font._DATABASE = None
+            mu.interface.Font().load(10)
+            assert db.return_value.font.call_count == 4
+    finally:
+        mu.interface.Font._DATABASE = None
+
+
 def test_theme_apply_to():
     """
     Ensure that the apply_to class method updates the passed in lexer with the
@@ -65,10 +153,63 @@ def test_theme_apply_to():
     assert lexer.setPaper.call_count == 16
 
 
+def test_theme_style_table():
+    """
+    Each theme's styles are worked out once, so applying a theme again
+    doesn't load any fonts.
+    """
+    day = mu.interface.DayTheme.style_table()
+    night = mu.interface.NightTheme.style_table()
+    assert day is not night
+    default_font, styles = night
+    assert len(styles) == 16
+    style_num, color, paper, font = [style for style in styles if
+                                     style[0] == QsciLexerPython.Keyword][0]
+    assert color.name() == '#eeeeee'
+    assert paper.name() == '#000000'
+    assert font.family() == default_font.family()
+    lexer = mu.interface.PythonLexer()
+    with mock.patch('mu.interface.Font.load') as load:
+        mu.interface.NightTheme.apply_to(lexer)
+        assert mu.interface.NightTheme.style_table() is night
+    assert load.call_count == 0
+    assert lexer.color(QsciLexerPython.Keyword).name() == '#eeeeee'
+
+
+def test_LatencyMonitor_record():
+    """
+    The count, mean and worst times are kept and slow cases are logged.
+    """
+    monitor = mu.interface.LatencyMonitor('keystroke', 0.05, 1000)
+    assert monitor.mean == 0.0
+    with mock.patch('mu.interface.logger') as logger:
+        monitor.record(0.01)
+        monitor.record(0.07)
+    assert monitor.count == 2
+    assert monitor.mean == pytest.approx(0.04)
+    assert monitor.worst == 0.07
+    logger.debug.assert_called_once_with('Slow keystroke: 70.0ms')
+    assert logger.info.call_count == 0
+    assert str(monitor) == ('keystroke: 2 recorded, mean 40.00ms, '
+                            'worst 70.00ms')
+
+
+def test_LatencyMonitor_report():
+    """
+    A summary is logged every report_interval times.
+    """
+    monitor = mu.interface.LatencyMonitor('keystroke', 1, 2)
+    with mock.patch('mu.interface.logger') as logger:
+        for i in range(5):
+            monitor.record(0.001)
+    assert logger.info.call_args_list == [mock.call(monitor)] * 2
+
+
 def test_Font_loading():
     mu.interface.Font._DATABASE = None
     try:
         with mock.patch("mu.interface.QFontDatabase") as db:
+            db.return_value.font.return_value = QFont()
             mu.interface.Font().load()
             mu.interface.Font(bold=True).load()
             mu.interface.Font(italic=True).load()
@@ -138,6 +279,7 @@ def test_EditorPane_configure():
     ep.setBraceMatching = mock.MagicMock()
     ep.SendScintilla = mock.MagicMock()
     ep.set_theme = mock.MagicMock()
+    ep.setLexer = mock.MagicMock()
     ep.markerDefine = mock.MagicMock()
     ep.indicatorDefine = mock.MagicMock()
     ep.setMarginSensitivity = mock.MagicMock()
@@ -147,8 +289,13 @@ def test_EditorPane_configure():
     ep.setAnnotationDisplay = mock.MagicMock()
     ep.selectionChanged = mock.MagicMock()
     ep.selectionChanged.connect = mock.MagicMock()
-    ep.configure()
+    ep.textChanged = mock.MagicMock()
+    ep.lint_finished = mock.MagicMock()
+    mock_timer = mock.MagicMock()
+    with mock.patch('mu.interface.QTimer', return_value=mock_timer):
+        ep.configure()
     assert ep.api == api
+    assert ep.lexer.apis() == mu.interface.shared_api(api)
     assert ep.setFont.call_count == 1
     assert ep.setUtf8.call_count == 1
     assert ep.setAutoIndent.call_count == 1
@@ -161,12 +308,18 @@ def test_EditorPane_configure():
     assert ep.setBraceMatching.call_count == 1
     assert ep.SendScintilla.call_count == 1
     assert ep.set_theme.call_count == 1
+    ep.setLexer.assert_called_once_with(ep.lexer)
     assert ep.markerDefine.call_count == 1
     assert ep.setMarginSensitivity.call_count == 1
     assert ep.setIndicatorDrawUnder.call_count == 1
     assert ep.marginClicked.connect.call_count == 1
     assert ep.setAnnotationDisplay.call_count == 1
     assert ep.selectionChanged.connect.call_count == 1
+    ep.textChanged.connect.assert_called_once_with(ep.on_text_changed)
+    ep.lint_finished.connect.assert_called_once_with(ep.on_lint_finished)
+    mock_timer.setSingleShot.assert_called_once_with(True)
+    mock_timer.setInterval.assert_called_once_with(mu.interface.LINT_DELAY)
+    mock_timer.timeout.connect.assert_called_once_with(ep.lint_requested)
     ep.indicatorDefine.assert_has_calls(
         [mock.call(ep.SquiggleIndicator,
                    ep.check_indicators['error']['id']),
@@ -177,6 +330,153 @@ def test_EditorPane_configure():
         any_order=True)
 
 
+def test_shared_api():
+    """
+    Autocomplete APIs are prepared once for each set of entries and shared.
+    """
+    with mock.patch.dict('mu.interface._SHARED_APIS', clear=True), \
+            mock.patch('mu.interface.QsciAPIs') as mapi:
+        first = mu.interface.shared_api(['a', 'b'])
+        assert mu.interface.shared_api(['a', 'b']) == first
+        mapi.assert_called_once_with(mu.interface._SHARED_APIS[('a', 'b')])
+        assert mapi.return_value.add.call_args_list == [mock.call('a'),
+                                                        mock.call('b')]
+        mapi.return_value.prepare.assert_called_once_with()
+        mu.interface.shared_api(['c'])
+        assert mapi.call_count == 2
+
+
+def test_prepared_api_filename():
+    """
+    The file for prepared APIs depends on the entries and the version of Mu.
+    """
+    name = mu.interface.prepared_api_filename(['a', 'b'])
+    assert name.startswith('api-') and name.endswith('.prepared')
+    assert mu.interface.prepared_api_filename(['a', 'b']) == name
+    assert mu.interface.prepared_api_filename(['ab']) != name
+    assert mu.interface.prepared_api_filename(['a', 'b', 'c']) != name
+    with mock.patch('mu.interface.__version__', '0.0.0'):
+        assert mu.interface.prepared_api_filename(['a', 'b']) != name
+
+
+def test_shared_api_cached(tmpdir):
+    """
+    Prepared APIs are saved once ready and loaded by later runs instead of
+    being prepared again.
+    """
+    cache_dir = str(tmpdir)
+    entries = ['foo.bar(x) \nDoes foo.', 'foo.baz() \nDoes baz.']
+    path = tmpdir.join(mu.interface.prepared_api_filename(entries))
+    with mock.patch.dict('mu.interface._SHARED_APIS', clear=True), \
+            mock.patch('mu.interface.QsciAPIs') as mapi:
+        mapi.return_value.savePrepared.side_effect = \
+            lambda name: open(name, 'w').close() is None
+        mu.interface.shared_api(entries, cache_dir)
+        assert mapi.return_value.loadPrepared.call_count == 0
+        assert mapi.return_value.add.call_count == 2
+        mapi.return_value.prepare.assert_called_once_with()
+        # Once prepared, the APIs are saved.
+        finished = mapi.return_value.apiPreparationFinished.connect
+        finished.call_args[0][0]()
+    assert path.exists()
+    with mock.patch.dict('mu.interface._SHARED_APIS', clear=True), \
+            mock.patch('mu.interface.QsciAPIs') as mapi:
+        mapi.return_value.loadPrepared.return_value = True
+        mu.interface.shared_api(entries, cache_dir)
+    mapi.return_value.loadPrepared.assert_called_once_with(str(path))
+    assert mapi.return_value.add.call_count == 0
+    assert mapi.return_value.prepare.call_count == 0
+
+
+def test_shared_api_bad_cache(tmpdir):
+    """
+    If the prepared APIs can't be loaded they're prepared again.
+    """
+    entries = ['foo.bar(x) \nDoes foo.']
+    tmpdir.join(mu.interface.prepared_api_filename(entries)).write('junk')
+    with mock.patch.dict('mu.interface._SHARED_APIS', clear=True), \
+            mock.patch('mu.interface.QsciAPIs') as mapi:
+        mapi.return_value.loadPrepared.return_value = False
+        mu.interface.shared_api(entries, str(tmpdir))
+    mapi.return_value.prepare.assert_called_once_with()
+
+
+def test_save_prepared_api(tmpdir):
+    """
+    Prepared APIs are saved to a temporary file which then replaces the file
+    used before, and the files for other versions are removed.
+    """
+    tmpdir.join('api-old.prepared').write('old')
+    tmpdir.join('other.txt').write('other')
+    path = str(tmpdir.join('api-new.prepared'))
+    api = mock.MagicMock()
+    api.savePrepared.side_effect = lambda name: open(name, 'w').close() is None
+    mu.interface.save_prepared_api(api, path)
+    api.savePrepared.assert_called_once_with(path + '.tmp')
+    assert sorted(os.listdir(str(tmpdir))) == ['api-new.prepared',
+                                               'other.txt']
+
+
+def test_save_prepared_api_fails(tmpdir):
+    """
+    A failure to save the prepared APIs is logged.
+    """
+    tmpdir.join('api-old.prepared').write('old')
+    api = mock.MagicMock()
+    api.savePrepared.return_value = False
+    with mock.patch('mu.interface.logger') as logger:
+        mu.interface.save_prepared_api(api, str(tmpdir.join('api-new')))
+    assert logger.warning.call_count == 1
+    assert os.listdir(str(tmpdir)) == ['api-old.prepared']
+
+
+def test_save_prepared_api_replace_fails(tmpdir):
+    """
+    If the saved APIs can't replace the file used before (for example, if
+    it's in use), the error is logged, the temporary file removed and the
+    files for other versions left alone.
+    """
+    tmpdir.join('api-old.prepared').write('old')
+    path = str(tmpdir.join('api-new.prepared'))
+    api = mock.MagicMock()
+    api.savePrepared.side_effect = lambda name: open(name, 'w').close() is None
+    with mock.patch('mu.interface.logger') as logger, \
+            mock.patch('os.replace', side_effect=PermissionError('Bang')):
+        mu.interface.save_prepared_api(api, path)
+    assert logger.error.call_count == 2
+    assert os.listdir(str(tmpdir)) == ['api-old.prepared']
+
+
+def test_save_prepared_api_remove_fails(tmpdir):
+    """
+    A failure to remove the files for other versions is logged.
+    """
+    tmpdir.join('api-old.prepared').write('old')
+    path = str(tmpdir.join('api-new.prepared'))
+    api = mock.MagicMock()
+    api.savePrepared.side_effect = lambda name: open(name, 'w').close() is None
+    with mock.patch('mu.interface.logger') as logger, \
+            mock.patch('os.remove', side_effect=PermissionError('Bang')):
+        mu.interface.save_prepared_api(api, path)
+    assert logger.warning.call_count == 2
+    assert sorted(os.listdir(str(tmpdir))) == ['api-new.prepared',
+                                               'api-old.prepared']
+
+
+def test_EditorPane_shared_api():
+    """
+    Editors share the same autocomplete APIs, which outlive them.
+    """
+    api = ['api help text', ]
+    first = mu.interface.EditorPane('/foo/bar.py', 'baz', api)
+    second = mu.interface.EditorPane('/foo/baz.py', 'baz', api)
+    shared = first.lexer.apis()
+    assert shared is not None
+    assert second.lexer.apis() == shared
+    assert shared.parent() not in (first.lexer, second.lexer)
+    assert mu.interface.EditorPane('/foo/qux.py', 'baz').lexer.apis() is None
+
+
 def test_EditorPane_set_theme():
     """
     Check all the expected configuration calls are made to ensure the widget's
@@ -189,15 +489,14 @@ def test_EditorPane_set_theme():
     ep.setMarginsForegroundColor = mock.MagicMock()
     ep.setIndicatorForegroundColor = mock.MagicMock()
     ep.setLexer = mock.MagicMock()
-    mock_api = mock.MagicMock()
-    with mock.patch('mu.interface.QsciAPIs', return_value=mock_api) as mapi:
+    with mock.patch('mu.interface.QsciAPIs') as mapi:
         ep.set_theme()
-        mapi.assert_called_once_with(ep.lexer)
-        mock_api.add.assert_called_once_with('api help text')
+    assert mapi.call_count == 0
     assert ep.setCaretForegroundColor.call_count == 1
     assert ep.setMarginsBackgroundColor.call_count == 1
     assert ep.setMarginsForegroundColor.call_count == 1
-    assert ep.setLexer.call_count == 1
+    # The editor follows changes to the lexer it already has.
+    assert ep.setLexer.call_count == 0
     assert ep.setIndicatorForegroundColor.call_count == 3
 
 
@@ -316,6 +615,89 @@ def test_EditorPane_annotate_code():
     assert ep.fillIndicatorRange.call_count == 3  # once for each message.
 
 
+def test_EditorPane_revision():
+    """
+    The revision of the text increases with every change.
+    """
+    ep = mu.interface.EditorPane('/foo/bar.py', 'baz')
+    assert ep.revision == 0
+    ep._lint_timer = mock.MagicMock()
+    ep.on_text_changed()
+    ep.on_text_changed()
+    assert ep.revision == 2
+    assert ep._lint_timer.start.call_count == 2
+
+
+def test_EditorPane_take_changes():
+    """
+    The lines touched by insertions and deletions are noted until the changes
+    are taken.
+    """
+    ep = mu.interface.EditorPane('/foo/bar.py', 'a\nb\nc\nd\ne\n')
+    assert ep.take_changes() == (0, None, None)
+    ep.insertAt('x\ny', 3, 0)
+    assert ep._changed_lines == (3, 2)
+    ep.insertAt('z', 1, 0)
+    assert ep._changed_lines == (1, 2)
+    ep.setSelection(5, 0, 6, 0)
+    ep.removeSelectedText()
+    assert ep.take_changes() == (0, 1, 0)
+    assert ep.take_changes() == (ep.revision, None, None)
+    assert ep.text() == 'a\nzb\nc\nx\nyd\n'
+
+
+def test_EditorPane_on_modified_other():
+    """
+    Modifications other than insertions and deletions aren't noted.
+    """
+    ep = mu.interface.EditorPane('/foo/bar.py', 'a\nb\n')
+    ep.on_modified(0, ep.SC_MOD_CHANGESTYLE, None, 2, 0)
+    assert ep.take_changes() == (0, None, None)
+
+
+def test_EditorPane_keyPressEvent():
+    """
+    The time taken to handle each key press is recorded.
+    """
+    ep = mu.interface.EditorPane('/foo/bar.py', 'baz')
+    event = mock.MagicMock()
+    with mock.patch('mu.interface.QsciScintilla.keyPressEvent') as kpe, \
+            mock.patch('mu.interface.KEYSTROKES') as keystrokes:
+        ep.keyPressEvent(event)
+    kpe.assert_called_once_with(event)
+    assert keystrokes.record.call_count == 1
+    assert keystrokes.record.call_args[0][0] >= 0
+
+
+def test_EditorPane_on_lint_finished():
+    """
+    The results of checking the current revision of the code are shown.
+    """
+    ep = mu.interface.EditorPane('/foo/bar.py', 'baz')
+    ep.reset_annotations = mock.MagicMock()
+    ep.annotate_code = mock.MagicMock()
+    flake = {0: [{'line_no': 0, 'message': 'a message'}]}
+    pep8 = {1: [{'line_no': 1, 'message': 'another message'}]}
+    ep.on_lint_finished(ep.revision, flake, pep8)
+    ep.reset_annotations.assert_called_once_with()
+    ep.annotate_code.assert_has_calls([mock.call(flake, 'error'),
+                                       mock.call(pep8, 'style')])
+
+
+def test_EditorPane_on_lint_finished_stale():
+    """
+    The results of checking an older revision of the code are dropped.
+    """
+    ep = mu.interface.EditorPane('/foo/bar.py', 'baz')
+    ep.reset_annotations = mock.MagicMock()
+    ep.annotate_code = mock.MagicMock()
+    revision = ep.revision
+    ep.on_text_changed()
+    ep.on_lint_finished(revision, {0: []}, {})
+    assert ep.reset_annotations.call_count == 0
+    assert ep.annotate_code.call_count == 0
+
+
 def test_EditorPane_on_marker_clicked_on():
     """
     Ensure the annotation is shown when the marker is clicked.
@@ -583,7 +965,7 @@ def test_ButtonBar_init():
         mock_tool_button_size.assert_called_once_with(3)
         mock_context_menu_policy.assert_called_once_with(Qt.PreventContextMenu)
         mock_object_name.assert_called_once_with('StandardToolBar')
-        assert mock_add_action.call_count == 12
+        assert mock_add_action.call_count == 13
         assert mock_add_separator.call_count == 3
 
 
@@ -622,6 +1004,18 @@ def test_ButtonBar_add_action():
     assert isinstance(bb.slots['save'], QAction)
 
 
+def test_ButtonBar_add_action_icon():
+    """
+    An action can have an icon with a different name.
+    """
+    bb = mu.interface.ButtonBar(None)
+    with mock.patch('mu.interface.load_icon',
+                    return_value=QIcon()) as load_icon:
+        bb.addAction('check-all', 'check everything', icon='check')
+    load_icon.assert_called_once_with('check')
+    assert bb.slots['check-all'].text() == 'Check-all'
+
+
 def test_ButtonBar_connect():
     """
     Check the named slot is connected to the slot handler.
@@ -660,7 +1054,9 @@ def test_FileTabs_removeTab_cancel():
     qtw = mu.interface.FileTabs()
     mock_window = mock.MagicMock()
     mock_window.show_confirmation.return_value = QMessageBox.Cancel
-    mock_window.current_tab.isModified.return_value = True
+    mock_tab = mock.MagicMock()
+    mock_tab.isModified.return_value = True
+    qtw.widget = mock.MagicMock(return_value=mock_tab)
     qtw.nativeParentWidget = mock.MagicMock(return_value=mock_window)
     tab_id = 1
     with mock.patch('mu.interface.QTabWidget.removeTab',
@@ -670,6 +1066,7 @@ def test_FileTabs_removeTab_cancel():
               'lose it.'
         mock_window.show_confirmation.assert_called_once_with(msg)
         assert rt.call_count == 0
+        assert mock_window.notify_session_changed.call_count == 0
 
 
 def test_FileTabs_removeTab_ok():
@@ -680,7 +1077,9 @@ def test_FileTabs_removeTab_ok():
     qtw = mu.interface.FileTabs()
     mock_window = mock.MagicMock()
     mock_window.show_confirmation.return_value = QMessageBox.Ok
-    mock_window.current_tab.isModified.return_value = True
+    mock_tab = mock.MagicMock()
+    mock_tab.isModified.return_value = True
+    qtw.widget = mock.MagicMock(return_value=mock_tab)
     qtw.nativeParentWidget = mock.MagicMock(return_value=mock_window)
     tab_id = 1
     with mock.patch('mu.interface.QTabWidget.removeTab',
@@ -690,6 +1089,8 @@ def test_FileTabs_removeTab_ok():
               'lose it.'
         mock_window.show_confirmation.assert_called_once_with(msg)
         rt.assert_called_once_with(tab_id)
+        qtw.widget.assert_called_once_with(tab_id)
+        mock_window.notify_session_changed.assert_called_once_with()
 
 
 def test_FileTabs_change_tab():
@@ -708,6 +1109,20 @@ def test_FileTabs_change_tab():
     mock_window.update_title.assert_called_once_with(mock_tab.label)
 
 
+def test_FileTabs_change_tab_placeholder():
+    """
+    Showing a placeholder tab asks for it to be turned into an editor.
+    """
+    qtw = mu.interface.FileTabs()
+    placeholder = mu.interface.PlaceholderPane('/foo/bar.py')
+    qtw.widget = mock.MagicMock(return_value=placeholder)
+    mock_window = mock.MagicMock()
+    qtw.nativeParentWidget = mock.MagicMock(return_value=mock_window)
+    qtw.change_tab(1)
+    mock_window.update_title.assert_called_once_with('bar.py')
+    mock_window.tab_requested.emit.assert_called_once_with(placeholder)
+
+
 def test_FileTabs_change_tab_no_tabs():
     """
     If there are no tabs left, ensure change_tab updates the title of the
@@ -792,6 +1207,18 @@ def test_Window_current_tab():
     assert w.current_tab == 'foo'
 
 
+def test_Window_current_tab_placeholder():
+    """
+    A placeholder tab isn't an editor, so there's no current tab.
+    """
+    w = mu.interface.Window()
+    w.tabs = mock.MagicMock()
+    w.tabs.currentWidget.return_value = mu.interface.PlaceholderPane('a.py')
+    assert w.current_tab is None
+    assert w.is_current(w.tabs.currentWidget.return_value)
+    assert not w.is_current(mu.interface.PlaceholderPane('a.py'))
+
+
 def test_Window_get_load_path():
     """
     Ensure the QFileDialog is called with the expected arguments and the
@@ -842,6 +1269,17 @@ def test_Window_get_microbit_path():
                                                          ShowDirsOnly)
 
 
+def test_Window_notify_session_changed():
+    """
+    Changes to the session are only announced once they've settled.
+    """
+    w = mu.interface.Window()
+    w._session_timer = mock.MagicMock()
+    w.notify_session_changed(1, 2)
+    w.notify_session_changed()
+    assert w._session_timer.start.call_count == 2
+
+
 def test_Window_add_tab():
     """
     Ensure adding a tab works as expected and the expected on_modified handler
@@ -856,9 +1294,11 @@ def test_Window_add_tab():
     w.tabs.setTabText = mock.MagicMock(return_value=None)
     w.connect_zoom = mock.MagicMock(return_value=None)
     w.set_theme = mock.MagicMock(return_value=None)
-    w.theme = mock.MagicMock()
+    w.notify_session_changed = mock.MagicMock(return_value=None)
+    w.theme = 'night'
     w.api = ['an api help text', ]
     ep = mu.interface.EditorPane('/foo/bar.py', 'baz')
+    ep.set_theme = mock.MagicMock()
     ep.modificationChanged = mock.MagicMock()
     ep.modificationChanged.connect = mock.MagicMock(return_value=None)
     ep.setFocus = mock.MagicMock(return_value=None)
@@ -871,11 +1311,130 @@ def test_Window_add_tab():
     w.tabs.addTab.assert_called_once_with(ep, ep.label)
     w.tabs.setCurrentIndex.assert_called_once_with(new_tab_index)
     w.connect_zoom.assert_called_once_with(ep)
-    w.set_theme.assert_called_once_with(w.theme)
+    # Only the new tab is themed.
+    assert w.set_theme.call_count == 0
+    ep.set_theme.assert_called_once_with(mu.interface.NightTheme)
     ep.setFocus.assert_called_once_with()
+    w.notify_session_changed.assert_called_once_with()
+    # Moving the cursor doesn't save the session.
+    ep.cursorPositionChanged.emit(1, 2)
+    w.notify_session_changed.assert_called_once_with()
     on_modified = ep.modificationChanged.connect.call_args[0][0]
     on_modified()
     w.tabs.setTabText.assert_called_once_with(new_tab_index, ep.label)
+    lint_requested = mock.MagicMock()
+    w.lint_requested.connect(lint_requested)
+    ep.lint_requested.emit()
+    lint_requested.assert_called_once_with(ep)
+
+
+def test_Window_add_placeholder():
+    """
+    A placeholder tab is added without being shown.
+    """
+    w = mu.interface.Window()
+    w.tabs = mock.MagicMock()
+    w.connect_zoom = mock.MagicMock()
+    placeholder = w.add_placeholder('/foo/bar.py', [3, 4])
+    assert isinstance(placeholder, mu.interface.PlaceholderPane)
+    assert placeholder.path == '/foo/bar.py'
+    assert placeholder.cursor == [3, 4]
+    assert placeholder.contents is None
+    w.tabs.addTab.assert_called_once_with(placeholder, 'bar.py')
+    w.connect_zoom.assert_called_once_with(placeholder)
+    assert w.tabs.setCurrentIndex.call_count == 0
+
+
+def test_Window_replace_placeholder():
+    """
+    A placeholder that's being shown is replaced by an editor, in the same
+    place, themed and zoomed to match the others.
+    """
+    w = mu.interface.Window()
+    w.tabs = mock.MagicMock()
+    w.tabs.indexOf.return_value = 3
+    w.tabs.currentIndex.return_value = 3
+    w.theme = 'night'
+    w.api = ['an api help text', ]
+    w.connect_zoom = mock.MagicMock()
+    w.remove_placeholder = mock.MagicMock()
+    placeholder = mu.interface.PlaceholderPane('/foo/bar.py')
+    placeholder.zoomIn(2)
+    ep = mock.MagicMock()
+    with mock.patch('mu.interface.EditorPane', return_value=ep) as mock_ed:
+        assert w.replace_placeholder(placeholder, '/foo/bar.py', 'x') == ep
+    mock_ed.assert_called_once_with('/foo/bar.py', 'x', w.api)
+    ep.set_theme.assert_called_once_with(mu.interface.NightTheme)
+    ep.zoomTo.assert_called_once_with(2)
+    w.connect_zoom.assert_called_once_with(ep)
+    w.tabs.insertTab.assert_called_once_with(3, ep, ep.label)
+    w.tabs.setCurrentIndex.assert_called_once_with(3)
+    ep.setFocus.assert_called_once_with()
+    w.remove_placeholder.assert_called_once_with(placeholder)
+
+
+def test_Window_replace_placeholder_not_current():
+    """
+    A placeholder that isn't being shown is replaced without being shown.
+    """
+    w = mu.interface.Window()
+    w.tabs = mock.MagicMock()
+    w.tabs.indexOf.return_value = 3
+    w.tabs.currentIndex.return_value = 1
+    w.theme = 'day'
+    w.api = []
+    w.remove_placeholder = mock.MagicMock()
+    placeholder = mu.interface.PlaceholderPane('/foo/bar.py')
+    ep = mock.MagicMock()
+    with mock.patch('mu.interface.EditorPane', return_value=ep):
+        w.replace_placeholder(placeholder, '/foo/bar.py', 'x')
+    ep.set_theme.assert_called_once_with(mu.interface.DayTheme)
+    assert ep.zoomTo.call_count == 0
+    assert w.tabs.setCurrentIndex.call_count == 0
+    w.remove_placeholder.assert_called_once_with(placeholder)
+
+
+def test_Window_remove_placeholder():
+    """
+    A placeholder's tab is removed without asking and it stops zooming.
+    """
+    w = mu.interface.Window()
+    w.tabs = mu.interface.FileTabs()
+    w.tabs.removeTab = mock.MagicMock()
+    w.tabs.nativeParentWidget = mock.MagicMock(return_value=w)
+    w.update_title = mock.MagicMock()
+    placeholder = w.add_placeholder('/foo/bar.py')
+    w.remove_placeholder(placeholder)
+    assert w.tabs.count() == 0
+    assert w.tabs.removeTab.call_count == 0
+    w.zoom_in()
+    assert placeholder.zoom == 0
+
+
+def test_PlaceholderPane():
+    """
+    A placeholder stands in for an editor of its file.
+    """
+    placeholder = mu.interface.PlaceholderPane('/foo/bar.py', [3, 4])
+    assert placeholder.label == 'bar.py'
+    assert placeholder.isModified() is False
+    assert placeholder.getCursorPosition() == (3, 4)
+    assert mu.interface.PlaceholderPane('a.py').getCursorPosition() == (0, 0)
+    placeholder.set_theme(mu.interface.NightTheme)
+
+
+def test_PlaceholderPane_zoom():
+    """
+    Zooming is remembered, within the editor's limits.
+    """
+    placeholder = mu.interface.PlaceholderPane('/foo/bar.py')
+    placeholder.zoomIn(2)
+    placeholder.zoomOut()
+    assert placeholder.zoom == 1
+    placeholder.zoomIn(100)
+    assert placeholder.zoom == 20
+    placeholder.zoomOut(100)
+    assert placeholder.zoom == -10
 
 
 def test_Window_focus_tab():
@@ -985,6 +1544,42 @@ def test_Window_add_repl():
     w.connect_zoom.assert_called_once_with(mock_repl)
 
 
+def test_Window_show_report():
+    """
+    The summary of checking all the files is shown in a pane of its own,
+    which is reused for later summaries.
+    """
+    w = mu.interface.Window()
+    w.splitter = mock.MagicMock()
+    w.connect_zoom = mock.MagicMock()
+    mock_pane = mock.MagicMock()
+    summary = [(None, 'totals')]
+    with mock.patch('mu.interface.CheckReportPane',
+                    return_value=mock_pane) as pane_class:
+        w.show_report('ws', summary)
+        w.show_report('ws', summary)
+    pane_class.assert_called_once_with(w.splitter)
+    assert w.report == mock_pane
+    mock_pane.open_file.connect.assert_called_once_with(w.open_file)
+    w.splitter.addWidget.assert_called_once_with(mock_pane)
+    w.connect_zoom.assert_called_once_with(mock_pane)
+    assert mock_pane.show_summary.call_args_list == \
+        [mock.call('ws', summary)] * 2
+
+
+def test_Window_remove_report():
+    """
+    The pane summarising the results of checking all the files is removed.
+    """
+    w = mu.interface.Window()
+    mock_pane = mock.MagicMock()
+    w.report = mock_pane
+    w.remove_report()
+    mock_pane.setParent.assert_called_once_with(None)
+    mock_pane.deleteLater.assert_called_once_with()
+    assert w.report is None
+
+
 def test_Window_remove_filesystem():
     """
     Check all the necessary calls to remove / reset the file system pane are
@@ -1037,7 +1632,7 @@ def test_Window_set_theme():
     w.repl = mock.MagicMock()
     w.repl.set_theme = mock.MagicMock()
     w.set_theme('night')
-    assert w.setStyleSheet.call_count == 2
+    w.setStyleSheet.assert_called_once_with(mu.interface.NIGHT_STYLE)
     assert w.theme == 'night'
     tab1.set_theme.assert_called_once_with(mu.interface.NightTheme)
     tab2.set_theme.assert_called_once_with(mu.interface.NightTheme)
@@ -1195,11 +1790,30 @@ def test_Window_autosize_window():
     mock_qdw.assert_called_once_with()
     w.resize.assert_called_once_with(int(1024 * 0.8), int(768 * 0.8))
     w.geometry.assert_called_once_with()
-    x = (1024 - 819) / 2
-    y = (768 - 614) / 2
+    x = (1024 - 819) // 2
+    y = (768 - 614) // 2
     w.move.assert_called_once_with(x, y)
 
 
+def test_Window_bring_to_front():
+    """
+    A minimised window is restored, and the window is raised and activated.
+    """
+    w = mu.interface.Window()
+    w.isMinimized = mock.MagicMock(return_value=True)
+    w.showNormal = mock.MagicMock()
+    w.raise_ = mock.MagicMock()
+    w.activateWindow = mock.MagicMock()
+    w.bring_to_front()
+    w.showNormal.assert_called_once_with()
+    w.raise_.assert_called_once_with()
+    w.activateWindow.assert_called_once_with()
+    w.isMinimized.return_value = False
+    w.bring_to_front()
+    assert w.showNormal.call_count == 1
+    assert w.raise_.call_count == 2
+
+
 def test_Window_reset_annotations():
     """
     Ensure the current tab has its annotations reset.
@@ -1225,6 +1839,17 @@ def test_Window_annotate_code():
     tab.annotate_code.assert_called_once_with(feedback, 'error')
 
 
+def test_Window_annotations_placeholder():
+    """
+    If there's no editor being shown there's nothing to annotate.
+    """
+    w = mu.interface.Window()
+    w.tabs = mock.MagicMock()
+    w.tabs.currentWidget.return_value = mu.interface.PlaceholderPane('a.py')
+    w.reset_annotations()
+    w.annotate_code('foo', 'error')
+
+
 def test_Window_setup():
     """
     Ensures the various default attributes of the window are set to the
@@ -1262,10 +1887,12 @@ def test_Window_setup():
             mock.patch('mu.interface.QSplitter', mock_splitter_class), \
             mock.patch('mu.interface.QVBoxLayout', mock_layout_class), \
             mock.patch('mu.interface.ButtonBar', mock_button_bar_class), \
-            mock.patch('mu.interface.FileTabs', mock_qtw_class):
-        w.setup(theme, api)
+            mock.patch('mu.interface.FileTabs', mock_qtw_class), \
+            mock.patch('mu.interface.shared_api') as shared_api:
+        w.setup(theme, api, 'data')
     assert w.theme == theme
     assert w.api == api
+    shared_api.assert_called_once_with(api, 'data')
     assert w.setWindowIcon.call_count == 1
     assert isinstance(w.setWindowIcon.call_args[0][0], QIcon)
     w.update_title.assert_called_once_with()
@@ -1282,6 +1909,12 @@ def test_Window_setup():
     w.set_theme.assert_called_once_with(theme)
     w.show.assert_called_once_with()
     w.autosize_window.assert_called_once_with()
+    assert w._session_timer.isSingleShot()
+    assert w._session_timer.interval() == mu.interface.SESSION_SAVE_DELAY
+    tab_bar = mock_qtw.tabBar.return_value
+    tab_bar.tabMoved.connect.assert_called_once_with(w.notify_session_changed)
+    mock_qtw.currentChanged.connect.assert_called_once_with(
+        w.notify_session_changed)
 
 
 def test_REPLPane_init_default_args():
@@ -1296,7 +1929,7 @@ def test_REPLPane_init_default_args():
     mock_serial.readyRead.connect = mock.MagicMock(return_value=None)
     mock_serial.write = mock.MagicMock(return_value=None)
     mock_serial_class = mock.MagicMock(return_value=mock_serial)
-    with mock.patch('mu.interface.QSerialPort', mock_serial_class):
+    with mock.patch('PyQt5.QtSerialPort.QSerialPort', mock_serial_class):
         rp = mu.interface.REPLPane('COM0')
     assert mock_serial_class.call_count == 1
     mock_serial.setPortName.assert_called_once_with('COM0')
@@ -1315,7 +1948,7 @@ def test_REPLPane_init_cannot_open():
     mock_serial.setBaudRate = mock.MagicMock(return_value=None)
     mock_serial.open = mock.MagicMock(return_value=False)
     mock_serial_class = mock.MagicMock(return_value=mock_serial)
-    with mock.patch('mu.interface.QSerialPort', mock_serial_class):
+    with mock.patch('PyQt5.QtSerialPort.QSerialPort', mock_serial_class):
         with pytest.raises(IOError):
             mu.interface.REPLPane('COM0')
 
@@ -1336,7 +1969,7 @@ def test_REPLPane_paste():
     mock_clipboard.text.return_value = 'paste me!'
     mock_application = mock.MagicMock()
     mock_application.clipboard.return_value = mock_clipboard
-    with mock.patch('mu.interface.QSerialPort', mock_serial_class):
+    with mock.patch('PyQt5.QtSerialPort.QSerialPort', mock_serial_class):
         with mock.patch('mu.interface.QApplication', mock_application):
             rp = mu.interface.REPLPane('COM0')
             mock_serial.write.reset_mock()
@@ -1360,7 +1993,7 @@ def test_REPLPane_paste_only_works_if_there_is_something_to_paste():
     mock_clipboard.text.return_value = ''
     mock_application = mock.MagicMock()
     mock_application.clipboard.return_value = mock_clipboard
-    with mock.patch('mu.interface.QSerialPort', mock_serial_class):
+    with mock.patch('PyQt5.QtSerialPort.QSerialPort', mock_serial_class):
         with mock.patch('mu.interface.QApplication', mock_application):
             rp = mu.interface.REPLPane('COM0')
             mock_serial.write.reset_mock()
@@ -1385,7 +2018,7 @@ def test_REPLPane_context_menu():
     mock_platform.system.return_value = 'WinNT'
     mock_qmenu = mock.MagicMock()
     mock_qmenu_class = mock.MagicMock(return_value=mock_qmenu)
-    with mock.patch('mu.interface.QSerialPort', mock_serial_class), \
+    with mock.patch('PyQt5.QtSerialPort.QSerialPort', mock_serial_class), \
             mock.patch('mu.interface.platform', mock_platform), \
             mock.patch('mu.interface.QMenu', mock_qmenu_class), \
             mock.patch('mu.interface.QCursor'):
@@ -1420,7 +2053,7 @@ def test_REPLPane_context_menu_darwin():
     mock_platform.system.return_value = 'Darwin'
     mock_qmenu = mock.MagicMock()
     mock_qmenu_class = mock.MagicMock(return_value=mock_qmenu)
-    with mock.patch('mu.interface.QSerialPort', mock_serial_class), \
+    with mock.patch('PyQt5.QtSerialPort.QSerialPort', mock_serial_class), \
             mock.patch('mu.interface.platform', mock_platform), \
             mock.patch('mu.interface.QMenu', mock_qmenu_class), \
             mock.patch('mu.interface.QCursor'):
@@ -1449,7 +2082,7 @@ def test_REPLPane_cursor_to_end():
     mock_serial.open = mock.MagicMock(return_value=True)
     mock_serial_class = mock.MagicMock(return_value=mock_serial)
     mock_text_cursor = mock.MagicMock()
-    with mock.patch('mu.interface.QSerialPort', mock_serial_class):
+    with mock.patch('PyQt5.QtSerialPort.QSerialPort', mock_serial_class):
         rp = mu.interface.REPLPane('COM0')
         rp.textCursor = mock.MagicMock(return_value=mock_text_cursor)
         rp.setTextCursor = mock.MagicMock()
@@ -1467,7 +2100,7 @@ def test_REPLPane_set_theme():
     mock_serial.setBaudRate = mock.MagicMock(return_value=None)
     mock_serial.open = mock.MagicMock(return_value=True)
     mock_serial_class = mock.MagicMock(return_value=mock_serial)
-    with mock.patch('mu.interface.QSerialPort', mock_serial_class):
+    with mock.patch('PyQt5.QtSerialPort.QSerialPort', mock_serial_class):
         rp = mu.interface.REPLPane('COM0')
         rp.setStyleSheet = mock.MagicMock(return_value=None)
         rp.set_theme('day')
@@ -1487,7 +2120,7 @@ def test_REPLPane_on_serial_read():
     mock_serial.open = mock.MagicMock(return_value=True)
     mock_serial.readAll = mock.MagicMock(return_value='abc'.encode('utf-8'))
     mock_serial_class = mock.MagicMock(return_value=mock_serial)
-    with mock.patch('mu.interface.QSerialPort', mock_serial_class):
+    with mock.patch('PyQt5.QtSerialPort.QSerialPort', mock_serial_class):
         rp = mu.interface.REPLPane('COM0')
         rp.process_bytes = mock.MagicMock()
         rp.on_serial_read()
@@ -1504,7 +2137,7 @@ def test_REPLPane_keyPressEvent():
     mock_serial.open = mock.MagicMock(return_value=True)
     mock_serial.write = mock.MagicMock(return_value=None)
     mock_serial_class = mock.MagicMock(return_value=mock_serial)
-    with mock.patch('mu.interface.QSerialPort', mock_serial_class):
+    with mock.patch('PyQt5.QtSerialPort.QSerialPort', mock_serial_class):
         rp = mu.interface.REPLPane('COM0')
         mock_serial.write.reset_mock()  # write is called during __init__()
         data = mock.MagicMock
@@ -1525,7 +2158,7 @@ def test_REPLPane_keyPressEvent_backspace():
     mock_serial.open = mock.MagicMock(return_value=True)
     mock_serial.write = mock.MagicMock(return_value=None)
     mock_serial_class = mock.MagicMock(return_value=mock_serial)
-    with mock.patch('mu.interface.QSerialPort', mock_serial_class):
+    with mock.patch('PyQt5.QtSerialPort.QSerialPort', mock_serial_class):
         rp = mu.interface.REPLPane('COM0')
         mock_serial.write.reset_mock()  # write is called during __init__()
         data = mock.MagicMock
@@ -1546,7 +2179,7 @@ def test_REPLPane_keyPressEvent_up():
     mock_serial.open = mock.MagicMock(return_value=True)
     mock_serial.write = mock.MagicMock(return_value=None)
     mock_serial_class = mock.MagicMock(return_value=mock_serial)
-    with mock.patch('mu.interface.QSerialPort', mock_serial_class):
+    with mock.patch('PyQt5.QtSerialPort.QSerialPort', mock_serial_class):
         rp = mu.interface.REPLPane('COM0')
         mock_serial.write.reset_mock()  # write is called during __init__()
         data = mock.MagicMock
@@ -1567,7 +2200,7 @@ def test_REPLPane_keyPressEvent_down():
     mock_serial.open = mock.MagicMock(return_value=True)
     mock_serial.write = mock.MagicMock(return_value=None)
     mock_serial_class = mock.MagicMock(return_value=mock_serial)
-    with mock.patch('mu.interface.QSerialPort', mock_serial_class):
+    with mock.patch('PyQt5.QtSerialPort.QSerialPort', mock_serial_class):
         rp = mu.interface.REPLPane('COM0')
         mock_serial.write.reset_mock()  # write is called during __init__()
         data = mock.MagicMock
@@ -1588,7 +2221,7 @@ def test_REPLPane_keyPressEvent_right():
     mock_serial.open = mock.MagicMock(return_value=True)
     mock_serial.write = mock.MagicMock(return_value=None)
     mock_serial_class = mock.MagicMock(return_value=mock_serial)
-    with mock.patch('mu.interface.QSerialPort', mock_serial_class):
+    with mock.patch('PyQt5.QtSerialPort.QSerialPort', mock_serial_class):
         rp = mu.interface.REPLPane('COM0')
         mock_serial.write.reset_mock()  # write is called during __init__()
         data = mock.MagicMock
@@ -1609,7 +2242,7 @@ def test_REPLPane_keyPressEvent_left():
     mock_serial.open = mock.MagicMock(return_value=True)
     mock_serial.write = mock.MagicMock(return_value=None)
     mock_serial_class = mock.MagicMock(return_value=mock_serial)
-    with mock.patch('mu.interface.QSerialPort', mock_serial_class):
+    with mock.patch('PyQt5.QtSerialPort.QSerialPort', mock_serial_class):
         rp = mu.interface.REPLPane('COM0')
         mock_serial.write.reset_mock()  # write is called during __init__()
         data = mock.MagicMock
@@ -1630,7 +2263,7 @@ def test_REPLPane_keyPressEvent_home():
     mock_serial.open = mock.MagicMock(return_value=True)
     mock_serial.write = mock.MagicMock(return_value=None)
     mock_serial_class = mock.MagicMock(return_value=mock_serial)
-    with mock.patch('mu.interface.QSerialPort', mock_serial_class):
+    with mock.patch('PyQt5.QtSerialPort.QSerialPort', mock_serial_class):
         rp = mu.interface.REPLPane('COM0')
         mock_serial.write.reset_mock()  # write is called during __init__()
         data = mock.MagicMock
@@ -1651,7 +2284,7 @@ def test_REPLPane_keyPressEvent_end():
     mock_serial.open = mock.MagicMock(return_value=True)
     mock_serial.write = mock.MagicMock(return_value=None)
     mock_serial_class = mock.MagicMock(return_value=mock_serial)
-    with mock.patch('mu.interface.QSerialPort', mock_serial_class):
+    with mock.patch('PyQt5.QtSerialPort.QSerialPort', mock_serial_class):
         rp = mu.interface.REPLPane('COM0')
         mock_serial.write.reset_mock()  # write is called during __init__()
         data = mock.MagicMock
@@ -1672,7 +2305,7 @@ def test_REPLPane_keyPressEvent_CTRL_C_Darwin():
     mock_serial.open = mock.MagicMock(return_value=True)
     mock_serial.write = mock.MagicMock(return_value=None)
     mock_serial_class = mock.MagicMock(return_value=mock_serial)
-    with mock.patch('mu.interface.QSerialPort', mock_serial_class):
+    with mock.patch('PyQt5.QtSerialPort.QSerialPort', mock_serial_class):
         rp = mu.interface.REPLPane('COM0')
         rp.copy = mock.MagicMock()
         mock_serial.write.reset_mock()  # write is called during __init__()
@@ -1694,7 +2327,7 @@ def test_REPLPane_keyPressEvent_CTRL_V_Darwin():
     mock_serial.open = mock.MagicMock(return_value=True)
     mock_serial.write = mock.MagicMock(return_value=None)
     mock_serial_class = mock.MagicMock(return_value=mock_serial)
-    with mock.patch('mu.interface.QSerialPort', mock_serial_class):
+    with mock.patch('PyQt5.QtSerialPort.QSerialPort', mock_serial_class):
         rp = mu.interface.REPLPane('COM0')
         rp.paste = mock.MagicMock()
         mock_serial.write.reset_mock()  # write is called during __init__()
@@ -1716,7 +2349,7 @@ def test_REPLPane_keyPressEvent_meta():
     mock_serial.open = mock.MagicMock(return_value=True)
     mock_serial.write = mock.MagicMock(return_value=None)
     mock_serial_class = mock.MagicMock(return_value=mock_serial)
-    with mock.patch('mu.interface.QSerialPort', mock_serial_class):
+    with mock.patch('PyQt5.QtSerialPort.QSerialPort', mock_serial_class):
         rp = mu.interface.REPLPane('COM0')
         mock_serial.write.reset_mock()  # write is called during __init__()
         data = mock.MagicMock
@@ -1731,44 +2364,77 @@ def test_REPLPane_keyPressEvent_meta():
         mock_serial.write.assert_called_once_with(bytes([expected]))
 
 
-def test_REPLPane_process_bytes():
+def make_repl_pane():
     """
-    Ensure bytes coming from the device to the application are processed as
-    expected. Backspace is enacted, carriage-return is ignored, newline moves
-    the cursor position to the end of the line before enacted and all others
-    are simply inserted.
+    Returns a REPLPane whose serial port is a mock.
     """
     mock_serial = mock.MagicMock()
-    mock_serial.setPortName = mock.MagicMock(return_value=None)
-    mock_serial.setBaudRate = mock.MagicMock(return_value=None)
     mock_serial.open = mock.MagicMock(return_value=True)
     mock_serial_class = mock.MagicMock(return_value=mock_serial)
-    mock_tc = mock.MagicMock()
-    mock_tc.movePosition = mock.MagicMock(side_effect=[True, False, True,
-                                                       True])
-    mock_tc.deleteChar = mock.MagicMock(return_value=None)
-    with mock.patch('mu.interface.QSerialPort', mock_serial_class):
-        rp = mu.interface.REPLPane('COM0')
-        rp.textCursor = mock.MagicMock(return_value=mock_tc)
-        rp.setTextCursor = mock.MagicMock(return_value=None)
-        rp.insertPlainText = mock.MagicMock(return_value=None)
-        rp.ensureCursorVisible = mock.MagicMock(return_value=None)
-        bs = bytes([8, 13, 10, 65, ])  # \b, \r, \n, 'A'
-        rp.process_bytes(bs)
-        rp.textCursor.assert_called_once_with()
-        assert mock_tc.movePosition.call_count == 4
-        assert mock_tc.movePosition.call_args_list[0][0][0] == QTextCursor.Down
-        assert mock_tc.movePosition.call_args_list[1][0][0] == QTextCursor.Down
-        assert mock_tc.movePosition.call_args_list[2][0][0] == QTextCursor.Left
-        assert mock_tc.movePosition.call_args_list[3][0][0] == QTextCursor.End
-        assert rp.setTextCursor.call_count == 3
-        assert rp.setTextCursor.call_args_list[0][0][0] == mock_tc
-        assert rp.setTextCursor.call_args_list[1][0][0] == mock_tc
-        assert rp.setTextCursor.call_args_list[2][0][0] == mock_tc
-        assert rp.insertPlainText.call_count == 2
-        assert rp.insertPlainText.call_args_list[0][0][0] == chr(10)
-        assert rp.insertPlainText.call_args_list[1][0][0] == chr(65)
-        rp.ensureCursorVisible.assert_called_once_with()
+    with mock.patch('PyQt5.QtSerialPort.QSerialPort', mock_serial_class):
+        return mu.interface.REPLPane('COM0')
+
+
+def test_VT100Parser_feed():
+    """
+    Text (without carriage returns) is returned in runs, and the escape
+    sequences MicroPython uses become cursor movements and erasing. Other
+    escape sequences are ignored.
+    """
+    parser = mu.interface.VT100Parser()
+    assert parser.feed(b'>>> ab\r\ncd\x08\x1b[3C\x1b[D\x1b[2A\x1b[B'
+                       b'\x1b[0K\x1b[K\x1b[2K\x1b[?25l\x1b[1;2H\x1bZ'
+                       b'e\tf') == [
+        ('text', '>>> ab\ncd'),
+        ('left', 1),
+        ('right', 3),
+        ('left', 1),
+        ('up', 2),
+        ('down', 1),
+        ('erase', None),
+        ('erase', None),
+        ('text', 'e\tf'),
+    ]
+
+
+def test_VT100Parser_feed_partial():
+    """
+    An escape sequence or UTF-8 character split between reads is handled
+    once the rest arrives.
+    """
+    parser = mu.interface.VT100Parser()
+    assert parser.feed(b'abc\x1b') == [('text', 'abc')]
+    assert parser.feed(b'[') == []
+    assert parser.feed(b'1') == []
+    assert parser.feed(b'2Dd\xc3') == [('left', 12), ('text', 'd')]
+    assert parser.feed(b'\xa9') == [('text', '\xe9')]
+    # A broken sequence is dropped, but what follows it isn't.
+    assert parser.feed(b'\x1b[1\n') == [('text', '\n')]
+
+
+def test_REPLPane_process_bytes():
+    """
+    Ensure bytes coming from the device to the application are processed as
+    expected. Backspace is enacted, carriage-return is ignored, newline moves
+    the cursor position to the end of the document before it's enacted and
+    other text replaces what's after the cursor on the same line.
+    """
+    rp = make_repl_pane()
+    rp.ensureCursorVisible = mock.MagicMock(return_value=None)
+    rp.process_bytes(b'MicroPython\r\n>>> ')
+    assert rp.toPlainText() == 'MicroPython\n>>> '
+    rp.process_bytes(b'print(1)\x08\x08')
+    assert rp.textCursor().position() == len('MicroPython\n>>> print(')
+    rp.process_bytes(b'23')
+    assert rp.toPlainText() == 'MicroPython\n>>> print(23'
+    # The cursor is moved to the last line, and newlines go at the end.
+    cursor = rp.textCursor()
+    cursor.setPosition(0)
+    rp.setTextCursor(cursor)
+    rp.process_bytes(b'4\r\n5')
+    assert rp.toPlainText() == 'MicroPython\n4>> print(23\n5'
+    assert rp.textCursor().atEnd()
+    assert rp.ensureCursorVisible.call_count == 4
 
 
 def test_REPLPane_process_bytes_VT100():
@@ -1776,49 +2442,32 @@ def test_REPLPane_process_bytes_VT100():
     Ensure bytes coming from the device to the application are processed as
     expected. In this case, make sure VT100 related codes are handled properly.
     """
-    mock_serial = mock.MagicMock()
-    mock_serial.setPortName = mock.MagicMock(return_value=None)
-    mock_serial.setBaudRate = mock.MagicMock(return_value=None)
-    mock_serial.open = mock.MagicMock(return_value=True)
-    mock_serial_class = mock.MagicMock(return_value=mock_serial)
-    mock_tc = mock.MagicMock()
-    mock_tc.movePosition = mock.MagicMock(return_value=False)
-    mock_tc.removeSelectedText = mock.MagicMock()
-    mock_tc.deleteChar = mock.MagicMock(return_value=None)
-    with mock.patch('mu.interface.QSerialPort', mock_serial_class):
-        rp = mu.interface.REPLPane('COM0')
-        rp.textCursor = mock.MagicMock(return_value=mock_tc)
-        rp.setTextCursor = mock.MagicMock(return_value=None)
-        rp.insertPlainText = mock.MagicMock(return_value=None)
-        rp.ensureCursorVisible = mock.MagicMock(return_value=None)
-        bs = bytes([
-            27, 91, ord('1'), ord('A'),  # <Esc>[1A
-            27, 91, ord('1'), ord('B'),  # <Esc>[1B
-            27, 91, ord('1'), ord('C'),  # <Esc>[1C
-            27, 91, ord('1'), ord('D'),  # <Esc>[1D
-            27, 91, ord('K'),  # <Esc>[K
-        ])
-        rp.process_bytes(bs)
-        rp.textCursor.assert_called_once_with()
-        assert mock_tc.movePosition.call_count == 6
-        assert mock_tc.movePosition.call_args_list[0][0][0] == QTextCursor.Down
-        assert mock_tc.movePosition.call_args_list[1][0][0] == QTextCursor.Up
-        assert mock_tc.movePosition.call_args_list[2][0][0] == QTextCursor.Down
-        assert mock_tc.movePosition.call_args_list[3][0][0] == \
-            QTextCursor.Right
-        assert mock_tc.movePosition.call_args_list[4][0][0] == QTextCursor.Left
-        assert mock_tc.movePosition.call_args_list[5][0][0] == \
-            QTextCursor.EndOfLine
-        assert mock_tc.movePosition.call_args_list[5][1]['mode'] == \
-            QTextCursor.KeepAnchor
-        assert rp.setTextCursor.call_count == 5
-        assert rp.setTextCursor.call_args_list[0][0][0] == mock_tc
-        assert rp.setTextCursor.call_args_list[1][0][0] == mock_tc
-        assert rp.setTextCursor.call_args_list[2][0][0] == mock_tc
-        assert rp.setTextCursor.call_args_list[3][0][0] == mock_tc
-        assert rp.setTextCursor.call_args_list[4][0][0] == mock_tc
-        mock_tc.removeSelectedText.assert_called_once_with()
-        rp.ensureCursorVisible.assert_called_once_with()
+    rp = make_repl_pane()
+    rp.process_bytes(b'abc\r\ndef\r\n>>> xyz')
+    rp.process_bytes(b'\x1b[2A')  # up 2
+    assert rp.textCursor().blockNumber() == 0
+    rp = make_repl_pane()
+    rp.process_bytes(b'>>> xyz\x1b[3D\x1b[1D\x1b[1C')  # left 4, right 1
+    assert rp.textCursor().position() == 4
+    rp.process_bytes(b'\x1b[1B\x1b[K')  # down (already at the end), erase
+    assert rp.toPlainText() == '>>> '
+    # A sequence split between reads.
+    rp.process_bytes(b'x\x1b[')
+    rp.process_bytes(b'1Dy')
+    assert rp.toPlainText() == '>>> y'
+
+
+def test_REPLPane_process_bytes_single_edit():
+    """
+    The edits for each read are made as a single change to the document.
+    """
+    rp = make_repl_pane()
+    changes = []
+    rp.document().contentsChange.connect(
+        lambda position, removed, added: changes.append(added))
+    rp.process_bytes(b'x = 1\r\n' * 100)
+    assert len(changes) == 1
+    assert rp.toPlainText() == 'x = 1\n' * 100
 
 
 def test_REPLPane_clear():
@@ -1830,7 +2479,7 @@ def test_REPLPane_clear():
     mock_serial.setBaudRate = mock.MagicMock(return_value=None)
     mock_serial.open = mock.MagicMock(return_value=True)
     mock_serial_class = mock.MagicMock(return_value=mock_serial)
-    with mock.patch('mu.interface.QSerialPort', mock_serial_class):
+    with mock.patch('PyQt5.QtSerialPort.QSerialPort', mock_serial_class):
         rp = mu.interface.REPLPane('COM0')
         rp.setText = mock.MagicMock(return_value=None)
         rp.clear()
@@ -1867,6 +2516,46 @@ def test_MuFileList_enable():
     mock_sibling.setAcceptDrops.assert_called_once_with(True)
 
 
+def test_CheckReportPane_show_summary():
+    """
+    Each line of the summary is listed, with the full path of the file it's
+    about.
+    """
+    pane = mu.interface.CheckReportPane()
+    pane.addItem('old')
+    pane.show_summary('ws', [(None, 'totals'), ('a.py', 'a.py: problems')])
+    assert pane.count() == 2
+    assert pane.item(0).text() == 'totals'
+    assert pane.item(0).data(Qt.UserRole) is None
+    assert pane.item(1).data(Qt.UserRole) == os.path.join('ws', 'a.py')
+
+
+def test_CheckReportPane_on_item_activated():
+    """
+    Activating the line for a file asks for the file to be opened.
+    """
+    pane = mu.interface.CheckReportPane()
+    pane.show_summary('ws', [(None, 'totals'), ('a.py', 'a.py: problems')])
+    open_file = mock.MagicMock()
+    pane.open_file.connect(open_file)
+    pane.on_item_activated(pane.item(0))
+    pane.on_item_activated(pane.item(1))
+    open_file.assert_called_once_with(os.path.join('ws', 'a.py'))
+
+
+def test_CheckReportPane_zoom():
+    """
+    The text can be made bigger and smaller, within limits.
+    """
+    pane = mu.interface.CheckReportPane()
+    pane.zoomIn()
+    assert pane.font.pointSize() == mu.interface.DEFAULT_FONT_SIZE + 2
+    pane.zoomOut(100)
+    assert pane.font.pointSize() == 4
+    pane.zoomIn(100)
+    assert pane.font.pointSize() == 34
+
+
 def test_MuFileList_show_confirm_overwrite_dialog():
     """
     """
@@ -1914,19 +2603,22 @@ def test_MicrobitFileList_dropEvent():
     mfs.disable = mock.MagicMock()
     mfs.enable = mock.MagicMock()
     mfs.parent = mock.MagicMock()
-    with mock.patch('mu.interface.microfs.get_serial',
+    with mock.patch('mu.contrib.microfs.get_serial',
                     return_value=mock_context), \
             mock.patch('mu.interface.MuFileList.dropEvent',
                        return_value=None) as mock_dropEvent, \
-            mock.patch('mu.interface.microfs.put',
-                       return_value=True) as mock_put:
+            mock.patch('mu.contrib.microfs.put',
+                       return_value=True) as mock_put, \
+            mock.patch('mu.interface.os.path.getsize', return_value=123):
         mfs.dropEvent(mock_event)
         mfs.disable.assert_called_once_with(source)
         home = os.path.join('homepath', 'foo.py')
         mock_put.assert_called_once_with(mock_serial, home)
         mock_dropEvent.assert_called_once_with(mock_event)
         mfs.enable.assert_called_once_with(source)
-        mfs.parent().ls.assert_called_once_with()
+        mfs.parent().microbit_file_changed.assert_called_once_with('foo.py',
+                                                                   123)
+        assert mfs.parent().ls.call_count == 0
 
 
 def test_MicrobitFileList_dropEvent_error():
@@ -1947,9 +2639,9 @@ def test_MicrobitFileList_dropEvent_error():
     mfs.disable = mock.MagicMock()
     mfs.enable = mock.MagicMock()
     ex = IOError('BANG')
-    with mock.patch('mu.interface.microfs.get_serial',
+    with mock.patch('mu.contrib.microfs.get_serial',
                     return_value=mock_context), \
-            mock.patch('mu.interface.microfs.put', side_effect=ex), \
+            mock.patch('mu.contrib.microfs.put', side_effect=ex), \
             mock.patch('mu.interface.logger.error', return_value=None) as log:
         mfs.dropEvent(mock_event)
         log.assert_called_once_with(ex)
@@ -1968,7 +2660,7 @@ def test_MicrobitFileList_dropEvent_wrong_source():
     mfs = mu.interface.MicrobitFileList('homepath')
     mfs.disable = mock.MagicMock()
     mfs.enable = mock.MagicMock()
-    with mock.patch('mu.interface.microfs.put', return_value=None) as mp:
+    with mock.patch('mu.contrib.microfs.put', return_value=None) as mp:
         mfs.dropEvent(mock_event)
         assert mp.call_count == 0
     mfs.disable.assert_called_once_with(source)
@@ -1996,9 +2688,9 @@ def test_MicrobitFileList_contextMenuEvent():
     mock_serial.port = 'COM0'
     mock_context.__enter__.return_value = mock_serial
     mock_event = mock.MagicMock()
-    with mock.patch('mu.interface.microfs.get_serial',
+    with mock.patch('mu.contrib.microfs.get_serial',
                     return_value=mock_context), \
-            mock.patch('mu.interface.microfs.rm',
+            mock.patch('mu.contrib.microfs.rm',
                        return_value=None) as mock_rm, \
             mock.patch('mu.interface.QMenu', return_value=mock_menu):
         mfs.contextMenuEvent(mock_event)
@@ -2007,6 +2699,29 @@ def test_MicrobitFileList_contextMenuEvent():
         assert mfs.setAcceptDrops.call_count == 2
 
 
+def test_MicrobitFileList_contextMenuEvent_updates_listing():
+    """
+    Ensure that deleting a file updates the cached listing in the parent
+    rather than listing the device again.
+    """
+    mock_menu = mock.MagicMock()
+    mock_action = mock.MagicMock()
+    mock_menu.addAction.return_value = mock_action
+    mock_menu.exec_.return_value = mock_action
+    mfs = mu.interface.MicrobitFileList('homepath')
+    mock_current = mock.MagicMock()
+    mock_current.text.return_value = 'foo.py'
+    mfs.currentItem = mock.MagicMock(return_value=mock_current)
+    mfs.mapToGlobal = mock.MagicMock(return_value=None)
+    mfs.parent = mock.MagicMock()
+    with mock.patch('mu.contrib.microfs.get_serial'), \
+            mock.patch('mu.contrib.microfs.rm', return_value=None), \
+            mock.patch('mu.interface.QMenu', return_value=mock_menu):
+        mfs.contextMenuEvent(mock.MagicMock())
+    mfs.parent().microbit_file_removed.assert_called_once_with('foo.py')
+    assert mfs.parent().ls.call_count == 0
+
+
 def test_MicrobitFileList_contextMenuEvent_error():
     """
     Ensure that if there's an error while preparing for the rm operation that
@@ -2030,9 +2745,9 @@ def test_MicrobitFileList_contextMenuEvent_error():
     mock_context.__enter__.return_value = mock_serial
     mock_event = mock.MagicMock()
     ex = IOError('BANG')
-    with mock.patch('mu.interface.microfs.get_serial',
+    with mock.patch('mu.contrib.microfs.get_serial',
                     return_value=mock_context), \
-            mock.patch('mu.interface.microfs.rm', side_effect=ex), \
+            mock.patch('mu.contrib.microfs.rm', side_effect=ex), \
             mock.patch('mu.interface.QMenu', return_value=mock_menu), \
             mock.patch('mu.interface.logger.error', return_value=None) as log:
         mfs.contextMenuEvent(mock_event)
@@ -2069,11 +2784,11 @@ def test_LocalFileList_dropEvent():
     lfs.disable = mock.MagicMock()
     lfs.enable = mock.MagicMock()
     lfs.parent = mock.MagicMock()
-    with mock.patch('mu.interface.microfs.get_serial',
+    with mock.patch('mu.contrib.microfs.get_serial',
                     return_value=mock_context), \
             mock.patch('mu.interface.MuFileList.dropEvent',
                        return_value=None) as mock_dropEvent, \
-            mock.patch('mu.interface.microfs.get',
+            mock.patch('mu.contrib.microfs.get',
                        return_value=True) as mock_get:
         lfs.dropEvent(mock_event)
         lfs.disable.assert_called_once_with(source)
@@ -2081,7 +2796,8 @@ def test_LocalFileList_dropEvent():
         mock_get.assert_called_once_with(mock_serial, 'foo.py', home)
         mock_dropEvent.assert_called_once_with(mock_event)
         lfs.enable.assert_called_once_with(source)
-        lfs.parent().ls.assert_called_once_with()
+        lfs.parent().show_files.assert_called_once_with()
+        assert lfs.parent().ls.call_count == 0
 
 
 def test_LocalFileList_dropEvent_error():
@@ -2102,9 +2818,9 @@ def test_LocalFileList_dropEvent_error():
     lfs.disable = mock.MagicMock()
     lfs.enable = mock.MagicMock()
     ex = IOError('BANG')
-    with mock.patch('mu.interface.microfs.get_serial',
+    with mock.patch('mu.contrib.microfs.get_serial',
                     return_value=mock_context), \
-            mock.patch('mu.interface.microfs.get', side_effect=ex), \
+            mock.patch('mu.contrib.microfs.get', side_effect=ex), \
             mock.patch('mu.interface.logger.error', return_value=None) as log:
         lfs.dropEvent(mock_event)
         log.assert_called_once_with(ex)
@@ -2123,7 +2839,7 @@ def test_LocalFileList_dropEvent_wrong_source():
     lfs = mu.interface.LocalFileList('homepath')
     lfs.disable = mock.MagicMock()
     lfs.enable = mock.MagicMock()
-    with mock.patch('mu.interface.microfs.put', return_value=None) as mp:
+    with mock.patch('mu.contrib.microfs.put', return_value=None) as mp:
         lfs.dropEvent(mock_event)
         assert mp.call_count == 0
     lfs.disable.assert_called_once_with(source)
@@ -2148,16 +2864,16 @@ def test_FileSystemPane_ls():
     """
     Ensure the ls method works as expected.
     """
-    microbit_files = ['foo.py', 'bar.py', 'baz.py']
+    microbit_files = [('foo.py', 1), ('bar.py', 2), ('baz.py', 3)]
     local_files = ['spam.py', 'eggs.py']
     # MOCK ALL TEH THIGNS!
     with mock.patch('mu.interface.MicrobitFileList.clear',
                     return_value=None) as mfs_clear, \
             mock.patch('mu.interface.LocalFileList.clear',
                        return_value=None) as lfs_clear, \
-            mock.patch('mu.interface.microfs.ls',
-                       return_value=microbit_files), \
-            mock.patch('mu.interface.microfs.get_serial', return_value=None), \
+            mock.patch('mu.contrib.microfs.ls_long',
+                       return_value=(microbit_files, None)), \
+            mock.patch('mu.contrib.microfs.get_serial', return_value=None), \
             mock.patch('mu.interface.os.listdir', return_value=local_files), \
             mock.patch('mu.interface.os.path.isfile', return_value=True), \
             mock.patch('mu.interface.os.path.join', return_value=None):
@@ -2166,6 +2882,60 @@ def test_FileSystemPane_ls():
         lfs_clear.assert_called_once_with()
         assert fsp.microbit_fs.count() == 3
         assert fsp.local_fs.count() == 2
+    assert fsp.microbit_files == dict(microbit_files)
+    assert fsp.microbit_fs.item(0).text() == 'bar.py'
+    assert fsp.microbit_fs.item(0).toolTip() == '2 bytes'
+    assert fsp.microbit_label.text() == 'Files on your micro:bit:'
+
+
+def test_FileSystemPane_show_files_free_space():
+    """
+    If the device reports its free space, show it in the label.
+    """
+    microfs = mock.MagicMock()
+    microfs.ls_long.return_value = ([('foo.py', 10)], 2048)
+    with mock.patch('mu.interface.get_microfs', return_value=microfs), \
+            mock.patch('mu.interface.os.listdir', return_value=[]):
+        fsp = mu.interface.FileSystemPane(None, 'homepath')
+    microfs.ls_long.assert_called_once_with(microfs.get_serial())
+    assert fsp.microbit_label.text() == \
+        'Files on your micro:bit (2048 bytes free):'
+
+
+def test_FileSystemPane_microbit_file_changed():
+    """
+    Putting a file updates the cached listing without asking the device.
+    """
+    with mock.patch('mu.interface.FileSystemPane.ls', return_value=None):
+        fsp = mu.interface.FileSystemPane(None, 'homepath')
+    fsp.microbit_files = {'foo.py': 10}
+    fsp.microbit_free = 100
+    fsp.show_files = mock.MagicMock()
+    with mock.patch('mu.interface.get_microfs') as get_microfs:
+        fsp.microbit_file_changed('foo.py', 30)
+        fsp.microbit_file_changed('bar.py', 5)
+        assert get_microfs.call_count == 0
+    assert fsp.microbit_files == {'foo.py': 30, 'bar.py': 5}
+    assert fsp.microbit_free == 75
+    assert fsp.show_files.call_count == 2
+
+
+def test_FileSystemPane_microbit_file_removed():
+    """
+    Removing a file updates the cached listing without asking the device.
+    """
+    with mock.patch('mu.interface.FileSystemPane.ls', return_value=None):
+        fsp = mu.interface.FileSystemPane(None, 'homepath')
+    fsp.microbit_files = {'foo.py': 10, 'bar.py': 5}
+    fsp.microbit_free = None
+    fsp.show_files = mock.MagicMock()
+    fsp.microbit_file_removed('foo.py')
+    assert fsp.microbit_files == {'bar.py': 5}
+    assert fsp.microbit_free is None
+    fsp.show_files.assert_called_once_with()
+    fsp.microbit_free = 100
+    fsp.microbit_file_removed('bar.py')
+    assert fsp.microbit_free == 105
 
 
 def test_FileSystemPane_set_theme_day():
@@ -4,6 +4,10 @@ Tests for the Editor and REPL logic.
 """
 import sys
 import os.path
+import random
+import logging
+import subprocess
+import threading
 import json
 import pytest
 import mu.logic
@@ -29,13 +33,14 @@ def test_CONSTANTS():
     assert mu.logic.DATA_DIR
     assert mu.logic.WORKSPACE_NAME
     assert isinstance(mu.logic.BOARD_IDS, set)
+    assert logging.getLevelName(mu.logic.TRACE) == 'TRACE'
 
 
 def test_find_microbit_no_ports():
     """
     There are no connected devices so return None.
     """
-    with mock.patch('mu.logic.QSerialPortInfo.availablePorts',
+    with mock.patch('PyQt5.QtSerialPort.QSerialPortInfo.availablePorts',
                     return_value=[]):
         assert mu.logic.find_microbit() is None
 
@@ -47,11 +52,29 @@ def test_find_microbit_no_device():
     mock_port = mock.MagicMock()
     mock_port.productIdentifier = mock.MagicMock(return_value=666)
     mock_port.vendorIdentifier = mock.MagicMock(return_value=999)
-    with mock.patch('mu.logic.QSerialPortInfo.availablePorts',
+    with mock.patch('PyQt5.QtSerialPort.QSerialPortInfo.availablePorts',
                     return_value=[mock_port, ]):
         assert mu.logic.find_microbit() is None
 
 
+def test_deferred_imports():
+    """
+    The checkers, flashing, the micro:bit's file system and the serial port
+    aren't imported until they're first used, so Mu starts sooner.
+    """
+    code = ('import sys, mu.logic, mu.interface; print(" ".join(m for m in ('
+            '"pyflakes", "pycodestyle", "mu.contrib.uflash", '
+            '"mu.contrib.microfs", "serial", "PyQt5.QtSerialPort", '
+            '"multiprocessing") if m in sys.modules))')
+    result = subprocess.run([sys.executable, '-c', code],
+                            stdout=subprocess.PIPE, check=True)
+    assert result.stdout.strip() == b''
+    assert mu.logic.get_checkers().style_options()
+    assert mu.logic.get_uflash().find_microbit
+    assert mu.logic.get_microfs().get_serial
+    assert mu.logic.get_qtserialport().QSerialPort
+
+
 def test_find_microbit_with_device():
     """
     If a device is found, return the port name.
@@ -64,7 +87,7 @@ def test_find_microbit_with_device():
         mock_port.vendorIdentifier = mock.MagicMock()
         mock_port.vendorIdentifier.return_value = vid
         mock_port.portName = mock.MagicMock(return_value='COM0')
-        with mock.patch('mu.logic.QSerialPortInfo.availablePorts',
+        with mock.patch('PyQt5.QtSerialPort.QSerialPortInfo.availablePorts',
                         return_value=[mock_port, ]):
             assert mu.logic.find_microbit() == 'COM0'
 
@@ -167,13 +190,190 @@ def test_get_settings_no_files_cannot_create():
         logger.error.assert_called_once_with(msg)
 
 
+def test_Settings_path():
+    """
+    The location of the settings file is only looked up once.
+    """
+    with mock.patch('mu.logic.get_settings_path',
+                    return_value='a.json') as gsp:
+        settings = mu.logic.Settings()
+        assert settings.path == 'a.json'
+        assert settings.path == 'a.json'
+    assert gsp.call_count == 1
+
+
+def test_Settings_get_cached():
+    """
+    Values are served from memory while the settings file is unchanged.
+    """
+    settings = mu.logic.Settings('tests/settings.json')
+    mock_stat = mock.MagicMock()
+    mock_stat.return_value.st_mtime = 1
+    with mock.patch('os.stat', mock_stat), \
+            mock.patch('builtins.open',
+                       mock.mock_open(read_data=SESSION)) as mock_open:
+        assert settings.get('theme') == 'night'
+        assert settings.get('paths') == ['path/foo.py', 'path/bar.py']
+        assert settings.get('missing', 'default') == 'default'
+    assert mock_open.call_count == 1
+    assert mock_stat.call_count == 3
+
+
+def test_Settings_get_reloads_on_change():
+    """
+    The settings file is read again if its modification time changes.
+    """
+    settings = mu.logic.Settings('tests/settings.json')
+    mock_stat = mock.MagicMock()
+    mock_stat.return_value.st_mtime = 1
+    with mock.patch('os.stat', mock_stat), \
+            mock.patch('builtins.open',
+                       mock.mock_open(read_data=SESSION)) as mock_open:
+        assert settings.get('theme') == 'night'
+        mock_stat.return_value.st_mtime = 2
+        mock_open.return_value.read.return_value = '{"theme": "day"}'
+        assert settings.get('theme') == 'day'
+    assert mock_open.call_count == 2
+
+
+def test_Settings_get_missing_file_logged_once():
+    """
+    A missing settings file is only reported once.
+    """
+    settings = mu.logic.Settings('a.json')
+    with mock.patch('mu.logic.logger', return_value=None) as logger:
+        assert settings.get('theme') is None
+        assert settings.get('theme', 'day') == 'day'
+    assert logger.error.call_count == 1
+
+
+def test_Settings_get_not_an_object():
+    """
+    A settings file that doesn't contain a JSON object is ignored.
+    """
+    settings = mu.logic.Settings('a.json')
+    with mock.patch('builtins.open', mock.mock_open(read_data='[1, 2]')), \
+            mock.patch('mu.logic.logger', return_value=None) as logger:
+        assert settings.get('theme') is None
+    assert logger.error.call_count == 1
+
+
+def test_Settings_save():
+    """
+    Updated values are merged with the existing settings and written back
+    atomically.
+    """
+    settings = mu.logic.Settings('tests/settings.json')
+    mock_open_atomic = mock.MagicMock()
+    mock_open_atomic.return_value.__enter__ = lambda s: s
+    mock_open_atomic.return_value.__exit__ = mock.Mock()
+    mock_open_atomic.return_value.write = mock.MagicMock()
+    with mock.patch('mu.logic.open_atomic', mock_open_atomic):
+        settings.update({'theme': 'day'})
+        settings.save()
+    mock_open_atomic.assert_called_once_with('tests/settings.json', 'w')
+    recovered = ''.join([i[0][0] for i
+                        in mock_open_atomic.return_value.write.call_args_list])
+    saved = json.loads(recovered)
+    assert saved['theme'] == 'day'
+    assert saved['workspace'] == '/home/foo/mycode'
+    assert settings.get('theme') == 'day'
+
+
+def test_Settings_save_not_reloaded():
+    """
+    Saving the settings doesn't cause the file to be read again.
+    """
+    settings = mu.logic.Settings('a.json')
+    mock_stat = mock.MagicMock()
+    mock_stat.return_value.st_mtime = 1
+    mock_open_atomic = mock.MagicMock()
+    with mock.patch('os.stat', mock_stat), \
+            mock.patch('mu.logic.open_atomic', mock_open_atomic), \
+            mock.patch('builtins.open',
+                       mock.mock_open(read_data=SESSION)) as mock_open:
+        settings.update({'theme': 'day'})
+        mock_stat.return_value.st_mtime = 2
+        settings.save()
+        assert settings.get('theme') == 'day'
+    assert mock_open.call_count == 1
+
+
+def test_Settings_save_does_not_block_readers():
+    """
+    The settings can be read and changed while a save is writing to disk.
+    """
+    settings = mu.logic.Settings('a.json')
+    settings._loaded = True
+    settings.update({'theme': 'day'})
+    writing = threading.Event()
+    release = threading.Event()
+
+    def slow_write(content):
+        writing.set()
+        release.wait(5)
+
+    mock_open_atomic = mock.MagicMock()
+    mock_open_atomic.return_value.__enter__ = lambda s: s
+    mock_open_atomic.return_value.__exit__ = mock.Mock(return_value=False)
+    mock_open_atomic.return_value.write = slow_write
+    results = []
+
+    def use_settings():
+        settings.update({'theme': 'night'})
+        results.append(settings.get('theme'))
+
+    with mock.patch('mu.logic.open_atomic', mock_open_atomic):
+        saver = threading.Thread(target=settings.save)
+        saver.start()
+        assert writing.wait(5)
+        user = threading.Thread(target=use_settings)
+        user.start()
+        user.join(5)
+        assert results == ['night']
+        release.set()
+        saver.join(5)
+    assert settings._changed
+
+
+def test_Settings_save_in_background():
+    """
+    Unsaved changes are written by a background thread.
+    """
+    settings = mu.logic.Settings('a.json')
+    settings._loaded = True
+    mock_thread = mock.MagicMock()
+    with mock.patch('mu.logic.threading.Thread', mock_thread):
+        settings.save_in_background()
+        assert mock_thread.call_count == 0
+        settings.update({'theme': 'day'})
+        settings.save_in_background()
+    mock_thread.assert_called_once_with(target=settings._save_quietly,
+                                        daemon=True)
+    mock_thread.return_value.start.assert_called_once_with()
+
+
+def test_Settings_save_quietly():
+    """
+    Errors saving the settings in the background are logged.
+    """
+    settings = mu.logic.Settings('a.json')
+    settings._loaded = True
+    settings.update({'theme': 'day'})
+    with mock.patch('mu.logic.open_atomic', side_effect=OSError('Bang')), \
+            mock.patch('mu.logic.logger', return_value=None) as logger:
+        settings._save_quietly()
+    logger.error.assert_called_once_with('Could not save settings: Bang')
+    assert settings.get('theme') == 'day'
+
+
 def test_get_workspace_valid():
     """
     Return settings file workspace value.
     """
     # read from our demo settings.json
-    with mock.patch('mu.logic.get_settings_path',
-                    return_value='tests/settings.json'), \
+    with mock.patch('mu.logic.SETTINGS',
+                    mu.logic.Settings('tests/settings.json')), \
             mock.patch('os.path.isdir', return_value=True):
         assert mu.logic.get_workspace_dir() == '/home/foo/mycode'
 
@@ -184,8 +384,8 @@ def test_get_workspace_not_present():
     """
     default_workspace = os.path.join(mu.logic.HOME_DIRECTORY,
                                      mu.logic.WORKSPACE_NAME)
-    with mock.patch('mu.logic.get_settings_path',
-                    return_value='tests/settingswithoutworkspace.json'):
+    with mock.patch('mu.logic.SETTINGS',
+                    mu.logic.Settings('tests/settingswithoutworkspace.json')):
         assert mu.logic.get_workspace_dir() == default_workspace
 
 
@@ -196,8 +396,8 @@ def test_get_workspace_invalid_value():
     default_workspace = os.path.join(mu.logic.HOME_DIRECTORY,
                                      mu.logic.WORKSPACE_NAME)
     # read from our demo settings.json
-    with mock.patch('mu.logic.get_settings_path',
-                    return_value='tests/settings.json'), \
+    with mock.patch('mu.logic.SETTINGS',
+                    mu.logic.Settings('tests/settings.json')), \
             mock.patch('os.path.isdir', return_value=False), \
             mock.patch('mu.logic.logger', return_value=None) as logger:
         assert mu.logic.get_workspace_dir() == default_workspace
@@ -211,7 +411,7 @@ def test_get_workspace_invalid_json():
     default_workspace = os.path.join(mu.logic.HOME_DIRECTORY,
                                      mu.logic.WORKSPACE_NAME)
     mock_open = mock.mock_open(read_data='{"workspace": invalid}')
-    with mock.patch('mu.logic.get_settings_path', return_value='a.json'), \
+    with mock.patch('mu.logic.SETTINGS', mu.logic.Settings('a.json')), \
             mock.patch('builtins.open', mock_open), \
             mock.patch('mu.logic.logger', return_value=None) as logger:
         assert mu.logic.get_workspace_dir() == default_workspace
@@ -225,8 +425,8 @@ def test_get_workspace_no_settings_file():
     default_workspace = os.path.join(mu.logic.HOME_DIRECTORY,
                                      mu.logic.WORKSPACE_NAME)
     mock_open = mock.MagicMock(side_effect=FileNotFoundError())
-    with mock.patch('mu.logic.get_settings_path',
-                    return_value='tests/settings.json'), \
+    with mock.patch('mu.logic.SETTINGS',
+                    mu.logic.Settings('tests/settings.json')), \
             mock.patch('builtins.open', mock_open), \
             mock.patch('mu.logic.logger', return_value=None) as logger:
         assert mu.logic.get_workspace_dir() == default_workspace
@@ -235,33 +435,73 @@ def test_get_workspace_no_settings_file():
 
 def test_check_flake():
     """
-    Ensure the check_flake method calls PyFlakes with the expected code
-    reporter.
+    Ensure the check_flake method checks the code with PyFlakes and groups
+    the messages by line.
     """
     mock_r = mock.MagicMock()
     mock_r.log = [{'line_no': 2, 'column': 0, 'message': 'b'}]
+    mock_message = mock.MagicMock(lineno=3)
+    mock_checker = mock.MagicMock()
+    mock_checker.messages = [mock_message]
     with mock.patch('mu.logic.MuFlakeCodeReporter', return_value=mock_r), \
-            mock.patch('mu.logic.check', return_value=None) as mock_check:
-        result = mu.logic.check_flake('foo.py', 'some code')
+            mock.patch('mu.checkers.MuFlakeChecker',
+                       return_value=mock_checker) as checker:
+        result = mu.logic.check_flake('foo.py', 'some = code')
         assert result == {2: mock_r.log}
-        mock_check.assert_called_once_with('some code', 'foo.py', mock_r)
+        assert checker.call_args[1] == {
+            'filename': 'foo.py',
+            'namespaces': mu.logic.BOARD_NAMESPACES,
+        }
+        mock_r.flake.assert_called_once_with(mock_message)
 
 
-def test_check_flake_needing_expansion():
+def test_check_flake_syntax_error():
     """
-    Ensure the check_flake method calls PyFlakes with the expected code
-    reporter.
+    Code that can't be parsed is reported as a syntax error.
     """
-    mock_r = mock.MagicMock()
-    msg = "'microbit.foo' imported but unused"
-    mock_r.log = [{'line_no': 2, 'column': 0, 'message': msg}]
-    with mock.patch('mu.logic.MuFlakeCodeReporter', return_value=mock_r), \
-            mock.patch('mu.logic.check', return_value=None) as mock_check:
-        code = 'from microbit import *'
-        result = mu.logic.check_flake('foo.py', code)
-        assert result == {}
-        mock_check.assert_called_once_with(mu.logic.EXPANDED_IMPORT, 'foo.py',
-                                           mock_r)
+    result = mu.logic.check_flake('foo.py', 'x = (\n')
+    assert len(result) == 1
+    assert result[0][0]['message'].startswith('Syntax error.')
+
+
+def test_check_flake_board_namespace():
+    """
+    The names provided by "from microbit import *" are known without the
+    code being changed, unused names aren't reported and other names are
+    still undefined.
+    """
+    code = 'from microbit import *\ndisplay.scroll(reset)\nfoo()\n'
+    result = mu.logic.check_flake('foo.py', code)
+    messages = [log['message'] for logs in result.values() for log in logs]
+    assert messages == ["undefined name 'foo'"]
+    assert mu.logic.check_flake('foo.py', 'from microbit import *\n') == {}
+
+
+def test_check_flake_board_namespace_not_module_level():
+    """
+    The board's names are only provided by a star import at module level.
+    """
+    code = 'def f():\n    from microbit import *\n'
+    result = mu.logic.check_flake('foo.py', code)
+    messages = [log['message'] for logs in result.values() for log in logs]
+    assert messages == ["'from microbit import *' only allowed at module "
+                        "level"]
+
+
+def test_board_namespace():
+    """
+    The names a module provides are found from its API descriptions.
+    """
+    apis = [
+        'board.led.on() \nTurn on the LED.',
+        'board.led.off() \nTurn off the LED.',
+        'board.sleep(ms) \nWait.',
+        'other.thing() \nNot on this board.',
+        'abs(x) \nA builtin.',
+    ]
+    assert mu.logic.board_namespace('board', apis) == {'led', 'sleep'}
+    microbit = mu.logic.BOARD_NAMESPACES['microbit']
+    assert {'display', 'Image', 'pin0', 'reset', 'compass'} <= microbit
 
 
 def test_check_pycodestyle():
@@ -277,6 +517,238 @@ def test_check_pycodestyle():
     assert result[6][0]['code'] == 'E303'
 
 
+def test_check_pycodestyle_no_io():
+    """
+    The code is checked without writing to the disk or swapping stdout.
+    """
+    code = "x=1\r\n"
+    stdout = sys.stdout
+    mock_open = mock.MagicMock(side_effect=OSError('Bang'))
+    with mock.patch('builtins.open', mock_open), \
+            mock.patch('mu.logic.open_atomic', mock_open):
+        result = mu.logic.check_pycodestyle(code)
+    assert mock_open.call_count == 0
+    assert sys.stdout is stdout
+    assert result[0][0]['code'] == 'E225'
+    assert result[0][0]['column'] == 1
+
+
+#: A module to check the style of, with problems in several places.
+STYLE_SAMPLE = """import os
+x=1
+
+
+def foo():
+    return os.name
+
+
+
+class Bar:
+    def baz(self):
+        y = [1,2]
+        return y
+def qux():
+    pass
+"""
+
+
+def edit(code, line_no, old, new):
+    """
+    Returns the code with the first old text on the referenced line replaced
+    with the new text.
+    """
+    lines = code.splitlines(True)
+    lines[line_no] = lines[line_no].replace(old, new, 1)
+    return ''.join(lines)
+
+
+def test_StyleChecker_check():
+    """
+    The results of checking the whole file are the same as those from
+    check_pycodestyle.
+    """
+    checker = mu.logic.StyleChecker()
+    result = checker.check(STYLE_SAMPLE, 1)
+    assert result == mu.logic.check_pycodestyle(STYLE_SAMPLE)
+    assert sorted(result) == [1, 9, 11, 13]
+    assert checker.checked == 15
+    assert [b['start'] for b in checker.blocks] == [0, 1, 4, 9, 13]
+
+
+def test_StyleChecker_check_unchanged():
+    """
+    Nothing is checked again if the code hasn't changed.
+    """
+    checker = mu.logic.StyleChecker()
+    expected = checker.check(STYLE_SAMPLE, 1)
+    assert checker.check(STYLE_SAMPLE, 2) == expected
+    assert checker.checked == 0
+    assert checker.check(STYLE_SAMPLE, 3, (2, None, None)) == expected
+    assert checker.checked == 0
+
+
+def test_StyleChecker_check_edit():
+    """
+    Only the blocks around an edit are checked again, and the results are
+    the same as checking the whole file.
+    """
+    checker = mu.logic.StyleChecker()
+    checker.check(STYLE_SAMPLE, 1)
+    code = edit(STYLE_SAMPLE, 11, '1,2', '1, 2')
+    assert checker.check(code) == mu.logic.check_pycodestyle(code)
+    assert 11 not in checker.check(code)
+    assert checker.checked < 15
+    # Deleting lines moves the results for the blocks after the change.
+    code = edit(code, 6, '\n', '')
+    assert checker.check(code) == mu.logic.check_pycodestyle(code)
+    assert checker.checked < 14
+
+
+def test_StyleChecker_check_changes():
+    """
+    The lines edited since the last revision checked can be given, so the
+    code doesn't need comparing with the last version checked.
+    """
+    checker = mu.logic.StyleChecker()
+    checker.check(STYLE_SAMPLE, 1)
+    code = edit(STYLE_SAMPLE, 1, 'x=1', 'x = 1')
+    with mock.patch('mu.logic.bisect.bisect_right',
+                    wraps=mu.logic.bisect.bisect_right) as bisect_right:
+        result = checker.check(code, 2, (1, 1, 14))
+    assert bisect_right.call_count > 0
+    assert result == mu.logic.check_pycodestyle(code)
+    assert checker.revision == 2
+    assert checker.checked < 15
+
+
+def test_StyleChecker_check_stale_changes():
+    """
+    Changes since a revision other than the last one checked are ignored in
+    favour of comparing the code with the last version checked.
+    """
+    checker = mu.logic.StyleChecker()
+    checker.check(STYLE_SAMPLE, 1)
+    code = edit(STYLE_SAMPLE, 11, '1,2', '1, 2')
+    # Claims only the first line changed since revision 0.
+    assert checker.check(code, 3, (0, 0, 15)) == \
+        mu.logic.check_pycodestyle(code)
+    assert 11 not in checker.blocks[3]['feedback']
+
+
+def test_StyleChecker_check_later_blocks_affected():
+    """
+    If an edit affects the results for blocks further on (here, a
+    statement before the imports makes every later import out of place) the
+    whole file is checked again.
+    """
+    code = "import os\nimport sys\n\nx = 1\nimport re\n"
+    checker = mu.logic.StyleChecker()
+    checker.check(code)
+    code = "y = 2\nimport sys\n\nx = 1\nimport re\n"
+    assert checker.check(code) == mu.logic.check_pycodestyle(code)
+    assert checker.checked == 5
+    assert len(checker.check(code)) == 2
+
+
+def test_StyleChecker_check_open_bracket():
+    """
+    An edit that leaves a bracket open is checked with the whole file.
+    """
+    checker = mu.logic.StyleChecker()
+    checker.check(STYLE_SAMPLE)
+    code = edit(STYLE_SAMPLE, 5, 'os.name', '(os.name')
+    assert checker.check(code) == mu.logic.check_pycodestyle(code)
+    assert checker.checked == 15
+
+
+def test_StyleChecker_check_end_of_file():
+    """
+    Problems with the end of the file are only reported at the end of the
+    file.
+    """
+    checker = mu.logic.StyleChecker()
+    checker.check(STYLE_SAMPLE)
+    code = STYLE_SAMPLE + '\n'
+    result = checker.check(code)
+    assert result == mu.logic.check_pycodestyle(code)
+    assert result[15][0]['code'] == 'W391'
+    assert checker.checked < 16
+    code = edit(code, 1, 'x=1', 'x = 1')
+    assert checker.check(code) == mu.logic.check_pycodestyle(code)
+
+
+def test_StyleChecker_check_everything_deleted():
+    """
+    Deleting everything leaves nothing to report.
+    """
+    checker = mu.logic.StyleChecker()
+    checker.check(STYLE_SAMPLE)
+    assert checker.check('') == {}
+    assert checker.check(STYLE_SAMPLE) == \
+        mu.logic.check_pycodestyle(STYLE_SAMPLE)
+
+
+def test_StyleChecker_check_tokenize_error():
+    """
+    While the last results include a problem that stopped PyCodeStyle
+    reading the code (E9xx) the whole file is checked again.
+    """
+    checker = mu.logic.StyleChecker()
+    code = STYLE_SAMPLE + '    )\n'
+    result = checker.check(code)
+    assert any(p['code'].startswith('E9') for problems in result.values()
+               for p in problems)
+    code = edit(code, 1, 'x=1', 'x = 1')
+    assert checker.check(code) == mu.logic.check_pycodestyle(code)
+    assert checker.checked == len(code.splitlines())
+
+
+#: Lines inserted by test_StyleChecker_check_random_edits, several of which
+# leave the code unreadable for a while.
+RANDOM_LINES = [')\n', '(\n', '\n', 'def f():\n', '    x = 1\n', 'x=[1,\n',
+                '"""\n', 'class A:\n', '  y = 2\n', 'import sys\n']
+
+
+@pytest.mark.parametrize('seed', [3, 4, 9])
+def test_StyleChecker_check_random_edits(seed):
+    """
+    After each of a series of random edits (described to the checker as the
+    editor would, or left for it to find) the results are the same as
+    checking the whole file.
+    """
+    rng = random.Random(seed)
+    code = STYLE_SAMPLE * 6
+    checker = mu.logic.StyleChecker()
+    checker.check(code, 0)
+    for revision in range(1, 41):
+        old = code.splitlines(True)
+        lines = old[:]
+        line_no = rng.randrange(len(lines) + 1)
+        choice = rng.random()
+        if choice < 0.5:
+            lines[line_no:line_no] = [rng.choice(RANDOM_LINES)
+                                      for i in range(rng.randint(1, 2))]
+        elif choice < 0.8:
+            del lines[line_no:line_no + rng.randint(1, 2)]
+        else:
+            lines[min(line_no, len(lines) - 1)] = rng.choice(RANDOM_LINES)
+        code = ''.join(lines)
+        changes = None
+        if revision % 2:
+            head = 0
+            while head < min(len(old), len(lines)) and \
+                    old[head] == lines[head]:
+                head += 1
+            tail = 0
+            while tail < min(len(old), len(lines)) - head and \
+                    old[-1 - tail] == lines[-1 - tail]:
+                tail += 1
+            # Scintilla counts the empty line after the final newline.
+            changes = (revision - 1, head, tail + 1)
+        assert checker.check(code, revision, changes) == \
+            mu.logic.check_pycodestyle(code), revision
+
+
 def test_MuFlakeCodeReporter_init():
     """
     Check state is set up as expected.
@@ -342,6 +814,296 @@ def test_MuFlakeCodeReporter_flake_un_matched():
     assert r.log[0]['message'] == 'something went wrong'
 
 
+def test_LintWorker_check():
+    """
+    The code is checked in the background and the results passed to the
+    callback.
+    """
+    flake = {0: [{'line_no': 0, 'message': 'a message'}]}
+    pep8 = {1: [{'line_no': 1, 'message': 'another message'}]}
+    callback = mock.MagicMock()
+    worker = mu.logic.LintWorker()
+    with mock.patch('mu.logic.check_flake', return_value=flake) as cf, \
+            mock.patch('mu.logic.check_pycodestyle', return_value=pep8) as cp:
+        future = worker.check('tab', 'foo.py', 'code', callback)
+        assert future.result(timeout=5) == (flake, pep8)
+    cf.assert_called_once_with('foo.py', 'code')
+    cp.assert_called_once_with('code')
+    callback.assert_called_once_with(flake, pep8)
+    assert worker._pending == {}
+
+
+def test_LintWorker_check_style():
+    """
+    A different way of checking the style of the code can be given.
+    """
+    callback = mock.MagicMock()
+    check_style = mock.MagicMock(return_value={0: []})
+    worker = mu.logic.LintWorker()
+    with mock.patch('mu.logic.check_flake', return_value={}), \
+            mock.patch('mu.logic.check_pycodestyle') as cp:
+        future = worker.check('tab', 'foo.py', 'code', callback, check_style)
+        assert future.result(timeout=5) == ({}, {0: []})
+    check_style.assert_called_once_with('code')
+    assert cp.call_count == 0
+
+
+def test_LintWorker_check_supersedes():
+    """
+    A new request for the same key cancels one that hasn't yet started.
+    """
+    worker = mu.logic.LintWorker()
+    started = threading.Event()
+    release = threading.Event()
+
+    def check_flake(filename, code):
+        started.set()
+        release.wait(5)
+        return {}
+
+    callback = mock.MagicMock()
+    with mock.patch('mu.logic.check_flake', check_flake), \
+            mock.patch('mu.logic.check_pycodestyle', return_value={}):
+        running = worker.check('other', 'bar.py', 'code', callback)
+        assert started.wait(5)
+        stale = worker.check('tab', 'foo.py', 'old code', callback)
+        latest = worker.check('tab', 'foo.py', 'new code', callback)
+        release.set()
+        latest.result(timeout=5)
+        running.result(timeout=5)
+    assert stale.cancelled()
+    assert callback.call_count == 2
+
+
+def test_LintWorker_check_error():
+    """
+    Errors while checking the code are logged.
+    """
+    worker = mu.logic.LintWorker()
+    callback = mock.MagicMock()
+    with mock.patch('mu.logic.check_flake', side_effect=ValueError('Bang')), \
+            mock.patch('mu.logic.logger') as logger:
+        future = worker.check('tab', 'foo.py', 'code', callback)
+        with pytest.raises(ValueError):
+            future.result(timeout=5)
+    assert callback.call_count == 0
+    logger.error.assert_called_once_with('Could not check code: Bang')
+
+
+def test_LintWorker_check_cached():
+    """
+    Code that has been checked before isn't checked again: the callback is
+    given the earlier results straight away.
+    """
+    flake = {0: [{'line_no': 0, 'message': 'a message'}]}
+    callback = mock.MagicMock()
+    worker = mu.logic.LintWorker()
+    with mock.patch('mu.logic.check_flake', return_value=flake) as cf, \
+            mock.patch('mu.logic.check_pycodestyle', return_value={}):
+        worker.check('tab', 'foo.py', 'old code', callback).result(timeout=5)
+        worker.check('tab', 'foo.py', 'new code', callback).result(timeout=5)
+        callback.reset_mock()
+        future = worker.check('tab', 'foo.py', 'old code', callback)
+        assert future.done()
+        assert future.result() == (flake, {})
+        worker.check('tab', 'bar.py', 'old code', callback).result(timeout=5)
+    assert cf.call_count == 3
+    assert callback.call_args_list[0] == mock.call(flake, {})
+    assert worker._pending == {}
+
+
+def test_LintWorker_cache_size():
+    """
+    Only the results for the LINT_CACHE_SIZE most recently used versions of
+    code are kept.
+    """
+    worker = mu.logic.LintWorker()
+    callback = mock.MagicMock()
+    with mock.patch('mu.logic.LINT_CACHE_SIZE', 2), \
+            mock.patch('mu.logic.check_flake', return_value={}) as cf, \
+            mock.patch('mu.logic.check_pycodestyle', return_value={}):
+        for code in ('a', 'b', 'a', 'c', 'a', 'b'):
+            worker.check('tab', 'foo.py', code, callback).result(timeout=5)
+    # 'b' was dropped to make room for 'c' and so was checked again.
+    assert [c[0][1] for c in cf.call_args_list] == ['a', 'b', 'c', 'b']
+    assert len(worker._cache) == 2
+
+
+def test_check_file(tmpdir):
+    """
+    The problems found in a file are counted and listed in order.
+    """
+    path = tmpdir.join('foo.py')
+    path.write('import os\nx=1\n')
+    result = mu.logic.check_file(str(path))
+    assert result['errors'] == 1
+    assert result['style'] == 1
+    assert [(p['line_no'], p['type']) for p in result['problems']] == \
+        [(0, 'error'), (1, 'style')]
+    assert json.loads(json.dumps(result)) == result
+
+
+def test_check_file_unreadable(tmpdir):
+    """
+    A file that can't be read is reported as an error.
+    """
+    result = mu.logic.check_file(str(tmpdir.join('missing.py')))
+    assert 'No such file' in result['error']
+    path = tmpdir.join('binary.py')
+    path.write_binary(b'\xff\xfe\x00')
+    assert 'codec' in mu.logic.check_file(str(path))['error']
+
+
+def workspace(tmpdir):
+    """
+    Makes a directory of pupils' work to check.
+    """
+    tmpdir.mkdir('ann').join('a.py').write('import os\n')
+    tmpdir.mkdir('bob').join('b.py').write('x=1\n')
+    tmpdir.join('bob', 'notes.txt').write('x=1\n')
+    tmpdir.mkdir('.hidden').join('c.py').write('x=1\n')
+    tmpdir.join('ok.py').write('x = 1\n')
+    return str(tmpdir)
+
+
+def test_check_workspace(tmpdir):
+    """
+    Every Python file in the directory is checked and the results totalled.
+    """
+    directory = workspace(tmpdir)
+    report = mu.logic.check_workspace(directory, None, workers=2)
+    assert report['directory'] == directory
+    assert sorted(report['files']) == [os.path.join('ann', 'a.py'),
+                                       os.path.join('bob', 'b.py'), 'ok.py']
+    assert report['files']['ok.py'] == {'errors': 0, 'style': 0,
+                                        'problems': []}
+    assert report['totals'] == {'files': 3, 'checked': 3, 'errors': 1,
+                                'style': 1, 'unreadable': 0}
+
+
+def test_check_workspace_cached(tmpdir):
+    """
+    Files are only checked again if their modification time or size have
+    changed since they were last checked.
+    """
+    directory = workspace(tmpdir)
+    cache_file = str(tmpdir.join('cache.json'))
+    first = mu.logic.check_workspace(directory, cache_file)
+    with mock.patch('mu.logic.check_file') as check_file:
+        second = mu.logic.check_workspace(directory, cache_file)
+    assert check_file.call_count == 0
+    assert second['files'] == first['files']
+    assert second['totals']['checked'] == 0
+    tmpdir.join('ok.py').write('x = 1\ny=2\n')
+    third = mu.logic.check_workspace(directory, cache_file)
+    assert third['totals']['checked'] == 1
+    assert third['files']['ok.py']['style'] == 1
+
+
+def test_check_workspace_bad_cache(tmpdir):
+    """
+    A damaged cache is ignored and replaced.
+    """
+    directory = workspace(tmpdir)
+    cache_file = tmpdir.join('cache.json')
+    cache_file.write('{not json')
+    report = mu.logic.check_workspace(directory, str(cache_file))
+    assert report['totals']['checked'] == 3
+    assert len(json.loads(cache_file.read())) == 3
+
+
+def test_check_workspace_no_processes(tmpdir):
+    """
+    If worker processes can't be started the files are checked one by one.
+    """
+    directory = workspace(tmpdir)
+    with mock.patch('concurrent.futures.ProcessPoolExecutor',
+                    side_effect=OSError('Bang')), \
+            mock.patch('mu.logic.logger') as logger:
+        report = mu.logic.check_workspace(directory, None)
+    assert report['totals']['errors'] == 1
+    logger.error.assert_called_once_with(
+        'Could not check files in parallel: Bang')
+
+
+def test_summarise_report():
+    """
+    The summary has the totals and then a line for each file with problems.
+    """
+    report = {
+        'directory': '/work',
+        'files': {
+            'b.py': {'errors': 0, 'style': 2, 'problems': []},
+            'a.py': {'errors': 1, 'style': 0, 'problems': []},
+            'ok.py': {'errors': 0, 'style': 0, 'problems': []},
+            'bad.py': {'error': 'Bang'},
+        },
+        'totals': {'files': 4, 'checked': 4, 'errors': 1, 'style': 2,
+                   'unreadable': 1},
+    }
+    assert mu.logic.summarise_report(report) == [
+        (None, '4 files checked in /work: 1 errors, 2 style problems.'),
+        ('a.py', 'a.py: 1 errors, 0 style problems'),
+        ('b.py', 'b.py: 0 errors, 2 style problems'),
+        ('bad.py', 'bad.py: could not be checked (Bang)'),
+    ]
+
+
+def test_check_workspace_main(tmpdir, capsys):
+    """
+    The command prints a summary and writes the full report if asked.
+    """
+    directory = workspace(tmpdir)
+    output = str(tmpdir.join('report.json'))
+    mu.logic.check_workspace_main([directory, '-o', output, '--no-cache'])
+    printed = capsys.readouterr().out.splitlines()
+    assert printed[0].startswith('3 files checked in')
+    assert printed[-1] == 'Report written to {}'.format(output)
+    with open(output) as f:
+        assert json.load(f)['totals']['files'] == 3
+
+
+def test_check_workspace_main_freeze_support():
+    """
+    In a frozen Mu the command first hands the processes it starts over to
+    multiprocessing, before checking anything.
+    """
+    calls = mock.MagicMock()
+    with mock.patch('mu.logic.check_workspace', calls.check_workspace), \
+            mock.patch('mu.logic.summarise_report', return_value=[]), \
+            mock.patch('multiprocessing.freeze_support',
+                       calls.freeze_support), \
+            mock.patch.object(sys, 'frozen', True, create=True):
+        mu.logic.check_workspace_main(['ws', '--no-cache'])
+    assert calls.mock_calls[0] == mock.call.freeze_support()
+    assert calls.check_workspace.call_count == 1
+
+
+def test_freeze_support_not_frozen():
+    """
+    When Mu isn't frozen there's nothing to hand over.
+    """
+    with mock.patch('multiprocessing.freeze_support') as freeze:
+        mu.logic.freeze_support()
+    assert freeze.call_count == 0
+
+
+def test_check_workspace_main_defaults():
+    """
+    By default the workspace is checked, reusing earlier results.
+    """
+    report = {'directory': 'ws', 'files': {}, 'totals': {
+        'files': 0, 'checked': 0, 'errors': 0, 'style': 0, 'unreadable': 0}}
+    with mock.patch('mu.logic.get_workspace_dir', return_value='ws'), \
+            mock.patch('mu.logic.check_workspace',
+                       return_value=report) as check_workspace, \
+            mock.patch('mu.logic.write_report') as write_report:
+        mu.logic.check_workspace_main([])
+    check_workspace.assert_called_once_with('ws', mu.logic.CHECK_CACHE_FILE,
+                                            None)
+    assert write_report.call_count == 0
+
+
 def test_REPL_posix():
     """
     The port is set correctly in a posix environment.
@@ -390,37 +1152,146 @@ def test_editor_init():
 
 def test_editor_restore_session():
     """
-    A correctly specified session is restored properly.
+    A correctly specified session is restored properly: each file gets a
+    placeholder tab, the last is shown and the files are read in the
+    background, starting with the one shown.
     """
     view = mock.MagicMock()
     view.set_theme = mock.MagicMock()
+    placeholders = [mock.MagicMock(), mock.MagicMock()]
+    view.add_placeholder.side_effect = placeholders
     ed = mu.logic.Editor(view)
     ed._view.add_tab = mock.MagicMock()
     mock_open = mock.mock_open(read_data=SESSION)
-    with mock.patch('builtins.open', mock_open), \
-            mock.patch('os.path.exists', return_value=True):
+    with mock.patch('mu.logic.SETTINGS', mu.logic.Settings('a.json')), \
+            mock.patch('builtins.open', mock_open), \
+            mock.patch('os.path.exists', return_value=True), \
+            mock.patch('mu.logic.threading.Thread') as thread:
         ed.restore_session()
     assert ed.theme == 'night'
-    assert mock_open.return_value.read.call_count == 3
-    assert ed._view.add_tab.call_count == 2
+    # Only the settings are read.
+    assert mock_open.return_value.read.call_count == 1
+    assert view.add_placeholder.call_args_list == [
+        mock.call('path/foo.py', None), mock.call('path/bar.py', None)]
+    view.focus_tab.assert_called_once_with(placeholders[1])
+    thread.assert_called_once_with(target=ed._read_placeholders,
+                                   args=(placeholders[::-1], ), daemon=True)
+    thread.return_value.start.assert_called_once_with()
+    assert ed._view.add_tab.call_count == 0
     view.set_theme.assert_called_once_with('night')
 
 
+def test_editor_restore_session_cursors():
+    """
+    Each placeholder tab knows where the cursor was in its file.
+    """
+    view = mock.MagicMock()
+    ed = mu.logic.Editor(view)
+    settings = json.dumps({
+        'paths': ['path/foo.py', 'path/bar.py'],
+        'cursors': {'path/foo.py': [3, 4]},
+    })
+    with mock.patch('mu.logic.SETTINGS', mu.logic.Settings('a.json')), \
+            mock.patch('builtins.open', mock.mock_open(read_data=settings)), \
+            mock.patch('mu.logic.threading.Thread'):
+        ed.restore_session()
+    assert view.add_placeholder.call_args_list == [
+        mock.call('path/foo.py', [3, 4]), mock.call('path/bar.py', None)]
+
+
 def test_editor_restore_session_missing_files():
     """
     Missing files that were opened tabs in the previous session are safely
-    ignored when attempting to restore them.
+    ignored when attempting to restore them: their placeholder tabs are
+    removed once the files can't be read.
     """
     fake_settings = os.path.join(os.path.dirname(__file__), 'settings.json')
     view = mock.MagicMock()
     ed = mu.logic.Editor(view)
     ed._view.add_tab = mock.MagicMock()
-    get_test_settings_path = mock.MagicMock()
-    get_test_settings_path.return_value = fake_settings
+    settings = mu.logic.Settings(fake_settings)
     with mock.patch('os.path.exists', return_value=True), \
-            mock.patch('mu.logic.get_settings_path', get_test_settings_path):
+            mock.patch('mu.logic.SETTINGS', settings), \
+            mock.patch('mu.logic.threading.Thread') as thread:
         ed.restore_session()
     assert ed._view.add_tab.call_count == 0
+    placeholders = thread.call_args[1]['args'][0]
+    for placeholder in placeholders:
+        placeholder.path = 'path/missing.py'
+    with mock.patch('mu.logic.logger') as logger:
+        ed._read_placeholders(placeholders)
+    assert logger.warning.call_count == 2
+    assert view.tab_text_ready.emit.call_args_list == [
+        mock.call(placeholder, None) for placeholder in placeholders]
+    ed.placeholder_loaded(placeholders[0], None)
+    view.remove_placeholder.assert_called_once_with(placeholders[0])
+
+
+def test_read_placeholders(tmpdir):
+    """
+    The text of each placeholder's file is sent to the view.
+    """
+    path = tmpdir.join('foo.py')
+    path.write_binary(b'x = 1\r\n')
+    placeholder = mock.MagicMock()
+    placeholder.path = str(path)
+    view = mock.MagicMock()
+    ed = mu.logic.Editor(view)
+    ed._read_placeholders([placeholder])
+    view.tab_text_ready.emit.assert_called_once_with(placeholder, 'x = 1\r\n')
+
+
+def test_placeholder_loaded():
+    """
+    The text of a placeholder that isn't being shown is kept for later.
+    """
+    view = mock.MagicMock()
+    view.is_current.return_value = False
+    ed = mu.logic.Editor(view)
+    placeholder = mock.MagicMock()
+    ed.placeholder_loaded(placeholder, 'x = 1')
+    assert placeholder.contents == 'x = 1'
+    assert view.replace_placeholder.call_count == 0
+
+
+def test_placeholder_loaded_current():
+    """
+    A placeholder that's being shown is replaced by an editor as soon as its
+    text arrives, with the cursor put back where it was.
+    """
+    view = mock.MagicMock()
+    view.is_current.return_value = True
+    ed = mu.logic.Editor(view)
+    placeholder = mock.MagicMock()
+    placeholder.path = 'foo.py'
+    placeholder.cursor = [3, 4]
+    ed.placeholder_loaded(placeholder, 'x = 1')
+    view.replace_placeholder.assert_called_once_with(placeholder, 'foo.py',
+                                                     'x = 1')
+    tab = view.replace_placeholder.return_value
+    tab.setCursorPosition.assert_called_once_with(3, 4)
+    tab.ensureCursorVisible.assert_called_once_with()
+
+
+def test_show_placeholder():
+    """
+    A placeholder is replaced by an editor when shown, if its text has been
+    read.
+    """
+    view = mock.MagicMock()
+    ed = mu.logic.Editor(view)
+    placeholder = mock.MagicMock()
+    placeholder.contents = None
+    ed.show_placeholder(placeholder)
+    assert view.replace_placeholder.call_count == 0
+    placeholder.path = 'foo.py'
+    placeholder.contents = 'x = 1'
+    placeholder.cursor = None
+    ed.show_placeholder(placeholder)
+    view.replace_placeholder.assert_called_once_with(placeholder, 'foo.py',
+                                                     'x = 1')
+    tab = view.replace_placeholder.return_value
+    assert tab.setCursorPosition.call_count == 0
 
 
 def test_editor_restore_session_no_session_file():
@@ -432,7 +1303,8 @@ def test_editor_restore_session_no_session_file():
     view.tab_count = 0
     ed = mu.logic.Editor(view)
     ed._view.add_tab = mock.MagicMock()
-    with mock.patch('os.path.exists', return_value=False):
+    with mock.patch('mu.logic.SETTINGS', mu.logic.Settings('a.json')), \
+            mock.patch('os.path.exists', return_value=False):
         ed.restore_session()
     py = 'from microbit import *{}{}# Write your code here :-)'.format(
         os.linesep, os.linesep)
@@ -450,7 +1322,8 @@ def test_editor_restore_session_invalid_file():
     ed._view.add_tab = mock.MagicMock()
     mock_open = mock.mock_open(
         read_data='{"paths": ["path/foo.py", "path/bar.py"]}, invalid: 0}')
-    with mock.patch('builtins.open', mock_open), \
+    with mock.patch('mu.logic.SETTINGS', mu.logic.Settings('a.json')), \
+            mock.patch('builtins.open', mock_open), \
             mock.patch('os.path.exists', return_value=True):
         ed.restore_session()
     py = 'from microbit import *{}{}# Write your code here :-)'.format(
@@ -488,17 +1361,18 @@ def test_editor_session_and_open_focus_passed_file():
         "paths": ["path/foo.py",
                   "path/bar.py"]}, )
     mock_open = mock.mock_open(read_data=settings)
-    with mock.patch('builtins.open', mock_open), \
-            mock.patch('os.path.exists', return_value=True):
+    with mock.patch('mu.logic.SETTINGS', mu.logic.Settings('a.json')), \
+            mock.patch('builtins.open', mock_open), \
+            mock.patch('os.path.exists', return_value=True), \
+            mock.patch('mu.logic.threading.Thread'):
         ed.restore_session(passed_filename='path/foo.py')
 
-    # direct_load should be called twice (once for each path)
-    assert ed.direct_load.call_count == 2
-    # However, "foo.py" as the passed_filename should be direct_load-ed
-    # at the end so it has focus, despite being the first file listed in
-    # the restored session.
-    assert ed.direct_load.call_args_list[0][0][0] == 'path/bar.py'
-    assert ed.direct_load.call_args_list[1][0][0] == 'path/foo.py'
+    # Only bar.py gets a placeholder tab.
+    view.add_placeholder.assert_called_once_with('path/bar.py', None)
+    # "foo.py" as the passed_filename is direct_load-ed so it has focus,
+    # despite being the first file listed in the restored session.
+    ed.direct_load.assert_called_once_with('path/foo.py')
+    assert view.focus_tab.call_count == 0
 
 
 def test_flash_no_tab():
@@ -516,11 +1390,11 @@ def test_flash_with_attached_device():
     Ensure the expected calls are made to uFlash and a helpful status message
     is enacted.
     """
-    with mock.patch('mu.logic.uflash.hexlify', return_value=''), \
-            mock.patch('mu.logic.uflash.embed_hex', return_value='foo'), \
-            mock.patch('mu.logic.uflash.find_microbit', return_value='bar'),\
+    with mock.patch('mu.contrib.uflash.hexlify', return_value=''), \
+            mock.patch('mu.contrib.uflash.embed_hex', return_value='foo'), \
+            mock.patch('mu.contrib.uflash.find_microbit', return_value='bar'),\
             mock.patch('mu.logic.os.path.exists', return_value=True),\
-            mock.patch('mu.logic.uflash.save_hex', return_value=None) as s:
+            mock.patch('mu.contrib.uflash.save_hex', return_value=None) as s:
         view = mock.MagicMock()
         view.current_tab.text = mock.MagicMock(return_value='')
         view.show_message = mock.MagicMock()
@@ -536,8 +1410,8 @@ def test_flash_with_attached_device_and_custom_runtime():
     Ensure the expected calls are made to uFlash and a helpful status message
     is enacted.
     """
-    with mock.patch('mu.logic.get_settings_path',
-                    return_value='tests/settingswithcustomhex.json'), \
+    with mock.patch('mu.logic.SETTINGS',
+                    mu.logic.Settings('tests/settingswithcustomhex.json')), \
             mock.patch('mu.logic.get_workspace_dir',
                        return_value=os.path.dirname(__file__)):
         test_flash_with_attached_device()
@@ -549,11 +1423,11 @@ def test_flash_user_specified_device_path():
     prompts the user to locate the device and, assuming a path was given,
     saves the hex in the expected location.
     """
-    with mock.patch('mu.logic.uflash.hexlify', return_value=''), \
-            mock.patch('mu.logic.uflash.embed_hex', return_value='foo'), \
-            mock.patch('mu.logic.uflash.find_microbit', return_value=None),\
+    with mock.patch('mu.contrib.uflash.hexlify', return_value=''), \
+            mock.patch('mu.contrib.uflash.embed_hex', return_value='foo'), \
+            mock.patch('mu.contrib.uflash.find_microbit', return_value=None),\
             mock.patch('mu.logic.os.path.exists', return_value=True),\
-            mock.patch('mu.logic.uflash.save_hex', return_value=None) as s:
+            mock.patch('mu.contrib.uflash.save_hex', return_value=None) as s:
         view = mock.MagicMock()
         view.get_microbit_path = mock.MagicMock(return_value='bar')
         view.current_tab.text = mock.MagicMock(return_value='')
@@ -574,11 +1448,11 @@ def test_flash_existing_user_specified_device_path():
     user has previously specified a path to the device, then the hex is saved
     in the specified location.
     """
-    with mock.patch('mu.logic.uflash.hexlify', return_value=''), \
-            mock.patch('mu.logic.uflash.embed_hex', return_value='foo'), \
-            mock.patch('mu.logic.uflash.find_microbit', return_value=None),\
+    with mock.patch('mu.contrib.uflash.hexlify', return_value=''), \
+            mock.patch('mu.contrib.uflash.embed_hex', return_value='foo'), \
+            mock.patch('mu.contrib.uflash.find_microbit', return_value=None),\
             mock.patch('mu.logic.os.path.exists', return_value=True),\
-            mock.patch('mu.logic.uflash.save_hex', return_value=None) as s:
+            mock.patch('mu.contrib.uflash.save_hex', return_value=None) as s:
         view = mock.MagicMock()
         view.get_microbit_path = mock.MagicMock(return_value='bar')
         view.current_tab.text = mock.MagicMock(return_value='')
@@ -598,12 +1472,12 @@ def test_flash_path_specified_does_not_exist():
     user has previously specified a path to the device, then the hex is saved
     in the specified location.
     """
-    with mock.patch('mu.logic.uflash.hexlify', return_value=''), \
-            mock.patch('mu.logic.uflash.embed_hex', return_value='foo'), \
-            mock.patch('mu.logic.uflash.find_microbit', return_value=None),\
+    with mock.patch('mu.contrib.uflash.hexlify', return_value=''), \
+            mock.patch('mu.contrib.uflash.embed_hex', return_value='foo'), \
+            mock.patch('mu.contrib.uflash.find_microbit', return_value=None),\
             mock.patch('mu.logic.os.path.exists', return_value=False),\
             mock.patch('mu.logic.os.makedirs', return_value=None), \
-            mock.patch('mu.logic.uflash.save_hex', return_value=None) as s:
+            mock.patch('mu.contrib.uflash.save_hex', return_value=None) as s:
         view = mock.MagicMock()
         view.current_tab.text = mock.MagicMock(return_value='')
         view.show_message = mock.MagicMock()
@@ -627,10 +1501,10 @@ def test_flash_without_device():
     If no device is found and the user doesn't provide a path then ensure a
     helpful status message is enacted.
     """
-    with mock.patch('mu.logic.uflash.hexlify', return_value=''), \
-            mock.patch('mu.logic.uflash.embed_hex', return_value='foo'), \
-            mock.patch('mu.logic.uflash.find_microbit', return_value=None), \
-            mock.patch('mu.logic.uflash.save_hex', return_value=None) as s:
+    with mock.patch('mu.contrib.uflash.hexlify', return_value=''), \
+            mock.patch('mu.contrib.uflash.embed_hex', return_value='foo'), \
+            mock.patch('mu.contrib.uflash.find_microbit', return_value=None), \
+            mock.patch('mu.contrib.uflash.save_hex', return_value=None) as s:
         view = mock.MagicMock()
         view.get_microbit_path = mock.MagicMock(return_value=None)
         view.current_tab.text = mock.MagicMock(return_value='')
@@ -671,7 +1545,7 @@ def test_add_fs_no_repl():
     """
     view = mock.MagicMock()
     ed = mu.logic.Editor(view)
-    with mock.patch('mu.logic.microfs.get_serial', return_value=True):
+    with mock.patch('mu.contrib.microfs.get_serial', return_value=True):
         ed.add_fs()
     workspace = mu.logic.get_workspace_dir()
     view.add_filesystem.assert_called_once_with(home=workspace)
@@ -685,7 +1559,7 @@ def test_add_fs_with_repl():
     view = mock.MagicMock()
     ed = mu.logic.Editor(view)
     ed.repl = True
-    with mock.patch('mu.logic.microfs.get_serial', return_value=True):
+    with mock.patch('mu.contrib.microfs.get_serial', return_value=True):
         ed.add_fs()
     assert view.add_filesystem.call_count == 0
 
@@ -698,7 +1572,7 @@ def test_add_fs_no_device():
     view.show_message = mock.MagicMock()
     ex = IOError('BOOM')
     ed = mu.logic.Editor(view)
-    with mock.patch('mu.logic.microfs.get_serial', side_effect=ex):
+    with mock.patch('mu.contrib.microfs.get_serial', side_effect=ex):
         ed.add_fs()
     assert view.show_message.call_count == 1
 
@@ -923,6 +1797,7 @@ def test_toggle_theme_to_night():
     ed.toggle_theme()
     assert ed.theme == 'night'
     view.set_theme.assert_called_once_with(ed.theme)
+    view.notify_session_changed.assert_called_once_with()
 
 
 def test_toggle_theme_to_day():
@@ -1015,7 +1890,7 @@ def test_load_hex_file():
     hex_file = 'RECOVERED'
     with mock.patch('mu.logic.get_workspace_dir', mock_workspace_dir), \
             mock.patch('builtins.open', mock_open), \
-            mock.patch('mu.logic.uflash.extract_script',
+            mock.patch('mu.contrib.uflash.extract_script',
                        return_value=hex_file) as s:
         ed.load()
     assert view.get_load_path.call_count == 1
@@ -1125,12 +2000,17 @@ def test_save_python_file():
     mock_open_atomic.return_value.__exit__ = mock.Mock()
     mock_open_atomic.return_value.write = mock.MagicMock()
     ed = mu.logic.Editor(view)
-    with mock.patch('mu.logic.open_atomic', mock_open_atomic):
+    with mock.patch('mu.logic.open_atomic', mock_open_atomic), \
+            mock.patch('mu.logic.logger') as logger:
         ed.save()
     mock_open_atomic.assert_called_once_with('foo.py', 'w', newline='')
     mock_open_atomic.return_value.write.assert_called_once_with('foo')
+    # The script is only formatted for the log if TRACE is enabled.
+    logger.log.assert_called_once_with(mu.logic.TRACE, 'Script: %r', 'foo')
+    assert view.current_tab.text.call_count == 1
     assert view.get_save_path.call_count == 0
     view.current_tab.setModified.assert_called_once_with(False)
+    view.notify_session_changed.assert_called_once_with()
 
 
 def test_save_with_no_file_extension():
@@ -1178,24 +2058,47 @@ def test_zoom_out():
 
 def test_check_code():
     """
-    Checking code correctly results in something the UI layer can parse.
+    Checking code happens in the background and the results are sent to the
+    tab, along with the revision of the code that was checked.
     """
     view = mock.MagicMock()
     tab = mock.MagicMock()
     tab.path = 'foo.py'
+    tab.revision = 3
     tab.text.return_value = 'import this\n'
     view.current_tab = tab
     flake = {2: {'line_no': 2, 'message': 'a message', }, }
     pep8 = {2: [{'line_no': 2, 'message': 'another message', }],
             3: [{'line_no': 3, 'message': 'yet another message', }]}
-    with mock.patch('mu.logic.check_flake', return_value=flake), \
-            mock.patch('mu.logic.check_pycodestyle', return_value=pep8):
-        ed = mu.logic.Editor(view)
-        ed.check_code()
-        view.reset_annotations.assert_called_once_with()
-        view.annotate_code.assert_has_calls([mock.call(flake, 'error'),
-                                             mock.call(pep8, 'style')],
-                                            any_order=True)
+    ed = mu.logic.Editor(view)
+    ed.lint_worker = mock.MagicMock()
+    ed.check_code()
+    view.reset_annotations.assert_called_once_with()
+    assert ed.lint_worker.check.call_count == 1
+    key, filename, code, report, _ = ed.lint_worker.check.call_args[0]
+    assert key == tab
+    assert filename == 'foo.py'
+    assert code == 'import this\n'
+    report(flake, pep8)
+    tab.lint_finished.emit.assert_called_once_with(3, flake, pep8)
+
+
+def test_check_code_tab_closed():
+    """
+    If the tab is closed before the check finishes, the results are dropped.
+    """
+    view = mock.MagicMock()
+    tab = mock.MagicMock()
+    tab.path = None
+    tab.lint_finished.emit.side_effect = RuntimeError('deleted')
+    view.current_tab = tab
+    ed = mu.logic.Editor(view)
+    ed.lint_worker = mock.MagicMock()
+    ed.check_code()
+    key, filename, code, report, _ = ed.lint_worker.check.call_args[0]
+    assert filename == 'untitled'
+    report({}, {})
+    assert tab.lint_finished.emit.call_count == 1
 
 
 def test_check_code_no_tab():
@@ -1205,8 +2108,137 @@ def test_check_code_no_tab():
     view = mock.MagicMock()
     view.current_tab = None
     ed = mu.logic.Editor(view)
+    ed.lint_worker = mock.MagicMock()
     ed.check_code()
-    assert view.annotate_code.call_count == 0
+    assert ed.lint_worker.check.call_count == 0
+
+
+def test_lint():
+    """
+    Checking a tab as typing pauses leaves its annotations until the results
+    arrive. Each tab has a StyleChecker which is told which lines changed.
+    """
+    view = mock.MagicMock()
+    tab = mock.MagicMock()
+    tab.path = 'foo.py'
+    tab.revision = 7
+    tab.text.return_value = 'x = 1\n'
+    tab.take_changes.return_value = (5, 0, 1)
+    ed = mu.logic.Editor(view)
+    ed.lint_worker = mock.MagicMock()
+    ed.lint(tab)
+    assert view.reset_annotations.call_count == 0
+    key, filename, code, report, check_style = \
+        ed.lint_worker.check.call_args[0]
+    assert (key, filename, code) == (tab, 'foo.py', 'x = 1\n')
+    report({}, {})
+    tab.lint_finished.emit.assert_called_once_with(7, {}, {})
+    style_checker = ed._style_checkers[tab]
+    with mock.patch.object(style_checker, 'check',
+                           return_value={}) as check:
+        assert check_style('x = 1\n') == {}
+    check.assert_called_once_with('x = 1\n', 7, (5, 0, 1))
+    ed.lint(tab)
+    assert ed._style_checkers[tab] is style_checker
+
+
+def test_check_all():
+    """
+    Checking all the files happens in the background.
+    """
+    view = mock.MagicMock()
+    view.report = None
+    ed = mu.logic.Editor(view)
+    with mock.patch('mu.logic.get_workspace_dir', return_value='ws'), \
+            mock.patch('mu.logic.threading.Thread') as thread:
+        ed.check_all()
+    thread.assert_called_once_with(target=ed._check_all, args=('ws', ),
+                                   daemon=True)
+    thread.return_value.start.assert_called_once_with()
+
+
+def test_check_all_hide():
+    """
+    If the summary of checking all the files is showing, it is hidden.
+    """
+    view = mock.MagicMock()
+    ed = mu.logic.Editor(view)
+    with mock.patch('mu.logic.threading.Thread') as thread:
+        ed.check_all()
+    view.remove_report.assert_called_once_with()
+    assert thread.call_count == 0
+
+
+def test_check_all_report():
+    """
+    The report is written to the workspace and the summary sent to the view.
+    """
+    view = mock.MagicMock()
+    ed = mu.logic.Editor(view)
+    with mock.patch('mu.logic.check_workspace',
+                    return_value='report') as check_workspace, \
+            mock.patch('mu.logic.write_report') as write_report, \
+            mock.patch('mu.logic.summarise_report', return_value='summary'):
+        ed._check_all('ws')
+    check_workspace.assert_called_once_with('ws')
+    write_report.assert_called_once_with(
+        'report', os.path.join('ws', mu.logic.CHECK_REPORT_FILENAME))
+    view.report_ready.emit.assert_called_once_with('ws', 'summary')
+
+
+def test_check_all_error():
+    """
+    A failure to check all the files is logged.
+    """
+    view = mock.MagicMock()
+    ed = mu.logic.Editor(view)
+    with mock.patch('mu.logic.check_workspace', side_effect=OSError('Bang')), \
+            mock.patch('mu.logic.logger') as logger:
+        ed._check_all('ws')
+    logger.error.assert_called_once_with('Could not check all files: Bang')
+    assert view.report_ready.emit.call_count == 0
+
+
+def test_session():
+    """
+    The session records the paths of the open files, the position of their
+    cursors and the theme.
+    """
+    view = mock.MagicMock()
+    w1 = mock.MagicMock()
+    w1.path = 'foo.py'
+    w1.getCursorPosition.return_value = (1, 2)
+    w2 = mock.MagicMock()
+    w2.path = None
+    view.widgets = [w1, w2]
+    ed = mu.logic.Editor(view)
+    ed.theme = 'night'
+    with mock.patch('mu.logic.get_workspace_dir', return_value='bar'), \
+            mock.patch('mu.logic.get_runtime_hex_path', return_value=None):
+        session = ed.session()
+    assert session == {
+        'theme': 'night',
+        'paths': ['foo.py'],
+        'cursors': {'foo.py': [1, 2]},
+        'workspace': 'bar',
+        'microbit_runtime_hex': None,
+    }
+
+
+def test_save_session():
+    """
+    Saving the session updates the settings and writes them in the
+    background.
+    """
+    view = mock.MagicMock()
+    ed = mu.logic.Editor(view)
+    ed.session = mock.MagicMock(return_value={'theme': 'night'})
+    mock_settings = mock.MagicMock()
+    with mock.patch('mu.logic.SETTINGS', mock_settings):
+        ed.save_session()
+    mock_settings.update.assert_called_once_with({'theme': 'night'})
+    mock_settings.save_in_background.assert_called_once_with()
+    assert mock_settings.save.call_count == 0
 
 
 def test_show_help():
@@ -1216,7 +2248,7 @@ def test_show_help():
     """
     view = mock.MagicMock()
     ed = mu.logic.Editor(view)
-    with mock.patch('mu.logic.webbrowser.open_new', return_value=None) as wb:
+    with mock.patch('webbrowser.open_new', return_value=None) as wb:
         ed.show_help()
         wb.assert_called_once_with('http://codewith.mu/help/{}'.format(
                                    __version__))
@@ -1236,7 +2268,8 @@ def test_quit_modified_cancelled_from_button():
     mock_open.return_value.__exit__ = mock.Mock()
     mock_open.return_value.write = mock.MagicMock()
     with mock.patch('sys.exit', return_value=None), \
-            mock.patch('builtins.open', mock_open):
+            mock.patch('mu.logic.SETTINGS', mu.logic.Settings('a.json')), \
+            mock.patch('mu.logic.open_atomic', mock_open):
         ed.quit()
     assert view.show_confirmation.call_count == 1
     assert mock_open.call_count == 0
@@ -1258,7 +2291,8 @@ def test_quit_modified_cancelled_from_event():
     mock_event = mock.MagicMock()
     mock_event.ignore = mock.MagicMock(return_value=None)
     with mock.patch('sys.exit', return_value=None), \
-            mock.patch('builtins.open', mock_open):
+            mock.patch('mu.logic.SETTINGS', mu.logic.Settings('a.json')), \
+            mock.patch('mu.logic.open_atomic', mock_open):
         ed.quit(mock_event)
     assert view.show_confirmation.call_count == 1
     assert mock_event.ignore.call_count == 1
@@ -1281,11 +2315,12 @@ def test_quit_modified_ok():
     mock_event = mock.MagicMock()
     mock_event.ignore = mock.MagicMock(return_value=None)
     with mock.patch('sys.exit', return_value=None), \
-            mock.patch('builtins.open', mock_open):
+            mock.patch('mu.logic.SETTINGS', mu.logic.Settings('a.json')), \
+            mock.patch('mu.logic.open_atomic', mock_open):
         ed.quit(mock_event)
     assert view.show_confirmation.call_count == 1
     assert mock_event.ignore.call_count == 0
-    assert mock_open.call_count == 3
+    mock_open.assert_called_once_with('a.json', 'w')
     assert mock_open.return_value.write.call_count > 0
 
 
@@ -1308,11 +2343,12 @@ def test_quit_save_tabs_with_paths():
     mock_event = mock.MagicMock()
     mock_event.ignore = mock.MagicMock(return_value=None)
     with mock.patch('sys.exit', return_value=None), \
-            mock.patch('builtins.open', mock_open):
+            mock.patch('mu.logic.SETTINGS', mu.logic.Settings('a.json')), \
+            mock.patch('mu.logic.open_atomic', mock_open):
         ed.quit(mock_event)
     assert view.show_confirmation.call_count == 1
     assert mock_event.ignore.call_count == 0
-    assert mock_open.call_count == 3
+    mock_open.assert_called_once_with('a.json', 'w')
     assert mock_open.return_value.write.call_count > 0
     recovered = ''.join([i[0][0] for i
                         in mock_open.return_value.write.call_args_list])
@@ -1339,11 +2375,12 @@ def test_quit_save_theme():
     mock_event = mock.MagicMock()
     mock_event.ignore = mock.MagicMock(return_value=None)
     with mock.patch('sys.exit', return_value=None), \
-            mock.patch('builtins.open', mock_open):
+            mock.patch('mu.logic.SETTINGS', mu.logic.Settings('a.json')), \
+            mock.patch('mu.logic.open_atomic', mock_open):
         ed.quit(mock_event)
     assert view.show_confirmation.call_count == 1
     assert mock_event.ignore.call_count == 0
-    assert mock_open.call_count == 3
+    mock_open.assert_called_once_with('a.json', 'w')
     assert mock_open.return_value.write.call_count > 0
     recovered = ''.join([i[0][0] for i
                         in mock_open.return_value.write.call_args_list])
@@ -1370,7 +2407,8 @@ def test_quit_calls_sys_exit():
     mock_event = mock.MagicMock()
     mock_event.ignore = mock.MagicMock(return_value=None)
     with mock.patch('sys.exit', return_value=None) as ex, \
-            mock.patch('builtins.open', mock_open):
+            mock.patch('mu.logic.SETTINGS', mu.logic.Settings('a.json')), \
+            mock.patch('mu.logic.open_atomic', mock_open):
         ed.quit(mock_event)
     ex.assert_called_once_with(0)
 
@@ -1379,8 +2417,8 @@ def test_custom_hex_read():
     """
     Test that a custom hex file path can be read
     """
-    with mock.patch('mu.logic.get_settings_path',
-                    return_value='tests/settingswithcustomhex.json'), \
+    with mock.patch('mu.logic.SETTINGS',
+                    mu.logic.Settings('tests/settingswithcustomhex.json')), \
             mock.patch('mu.logic.get_workspace_dir',
                        return_value=os.path.dirname(__file__)):
         assert "customhextest.hex" in mu.logic.get_runtime_hex_path()
@@ -1388,8 +2426,8 @@ def test_custom_hex_read():
     Test that a corrupt settings file returns None for the
     runtime hex path
     """
-    with mock.patch('mu.logic.get_settings_path',
-                    return_value='tests/settingscorrupt.json'), \
+    with mock.patch('mu.logic.SETTINGS',
+                    mu.logic.Settings('tests/settingscorrupt.json')), \
             mock.patch('mu.logic.get_workspace_dir',
                        return_value=os.path.dirname(__file__)):
         assert mu.logic.get_runtime_hex_path() is None
@@ -1397,8 +2435,8 @@ def test_custom_hex_read():
     Test that a missing settings file returns None for the
     runtime hex path
     """
-    with mock.patch('mu.logic.get_settings_path',
-                    return_value='tests/settingswithmissingcustomhex.json'), \
+    settings = mu.logic.Settings('tests/settingswithmissingcustomhex.json')
+    with mock.patch('mu.logic.SETTINGS', settings), \
             mock.patch('mu.logic.get_workspace_dir',
                        return_value=os.path.dirname(__file__)):
         assert mu.logic.get_runtime_hex_path() is None
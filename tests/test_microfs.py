@@ -0,0 +1,491 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the vendored microfs module, using a fake device that speaks the
+MicroPython raw REPL.
+"""
+import builtins
+import io
+import pytest
+import mu.contrib.microfs as microfs
+from unittest import mock
+
+
+class FakeDevice:
+    """
+    Pretends to be a board attached to a serial port. Commands sent via the
+    raw REPL are run with exec, against a file system held in a dictionary.
+
+    Problems with the connection can be arranged by setting drop_replies to
+    the numbers of the commands (counting from 1) whose reply is lost, or
+    mangle to a function that may change each command before it is run.
+    """
+
+    def __init__(self, files=None, can_rename=True, memory=None, port='FAKE'):
+        self.files = dict(files or {})
+        self.can_rename = can_rename
+        self.memory = memory  # Longest command that fits in memory.
+        self.port = port
+        self.drop_replies = set()
+        self.mangle = None
+        self.hang = False  # Whether the next script runs until CTRL-C.
+        self.running = False
+        self.commands = []
+        self.written = bytearray()
+        self.namespace = {}
+        self.incoming = b''
+        self.outgoing = bytearray()
+        self.stdout = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def write(self, data):
+        self.written.extend(data)
+        for byte in data:
+            byte = bytes([byte])
+            if byte == b'\x03':
+                self.incoming = b''
+                if self.running:
+                    self.running = False
+                    self.outgoing.extend(b'\x04Traceback (most recent call '
+                                         b'last):\r\nKeyboardInterrupt: '
+                                         b'\r\n\x04>')
+                else:
+                    self.outgoing.extend(b'\r\n>>> ')
+            elif byte == b'\x01':
+                self.outgoing.extend(b'raw REPL; CTRL-B to exit\r\n>')
+            elif byte == b'\x04':
+                self.run(self.incoming.decode('utf-8'))
+                self.incoming = b''
+            elif byte != b'\x02':
+                self.incoming += byte
+        return len(data)
+
+    def read_until(self, terminator):
+        end = self.outgoing.find(terminator)
+        end = len(self.outgoing) if end == -1 else end + len(terminator)
+        data = bytes(self.outgoing[:end])
+        del self.outgoing[:end]
+        return data
+
+    def read_all(self):
+        return self.read(len(self.outgoing))
+
+    def read(self, size=1):
+        data = bytes(self.outgoing[:size])
+        del self.outgoing[:size]
+        return data
+
+    @property
+    def in_waiting(self):
+        return len(self.outgoing)
+
+    def run(self, command):
+        if self.mangle:
+            command = self.mangle(command)
+        self.commands.append(command)
+        if self.memory and len(command) > self.memory:
+            self.outgoing.extend(b'OK\x04Traceback (most recent call last):'
+                                 b'\r\nMemoryError: \r\n\x04>')
+            return
+        if self.hang:
+            self.hang = False
+            self.running = True
+            self.outgoing.extend(b'OK')
+            return
+        self.stdout = io.StringIO()
+        error = ''
+        try:
+            exec(command, self.device_namespace())
+        except Exception as ex:
+            error = 'Traceback (most recent call last):\r\n{}: {}\r\n'.format(
+                type(ex).__name__, ex)
+        if len(self.commands) in self.drop_replies:
+            self.outgoing.extend(b'OK')
+            return
+        out = self.stdout.getvalue().replace('\n', '\r\n')
+        self.outgoing.extend(b'OK' + out.encode('latin-1') + b'\x04' +
+                             error.encode('utf-8') + b'\x04>')
+
+    def device_namespace(self):
+        device = self
+
+        class File:
+            def __init__(self, name, mode='r'):
+                self.name = name
+                if 'r' in mode:
+                    if name not in device.files:
+                        raise OSError(2)
+                    self.position = 0
+                else:
+                    device.files[name] = b''
+
+            def write(self, data):
+                device.files[self.name] += bytes(data)
+                return len(data)
+
+            def read(self, size=-1):
+                content = device.files[self.name]
+                end = len(content) if size < 0 else self.position + size
+                data = content[self.position:end]
+                self.position += len(data)
+                return data
+
+            def close(self):
+                pass
+
+        class OS:
+            def listdir():
+                return sorted(device.files)
+
+            def remove(name):
+                if name not in device.files:
+                    raise OSError(2)
+                del device.files[name]
+
+            def size(name):
+                if name not in device.files:
+                    raise OSError(2)
+                return len(device.files[name])
+
+        if self.can_rename:
+            def rename(old, new):
+                device.files[new] = device.files.pop(old)
+            OS.rename = rename
+
+        class Microbit:
+            class uart:
+                def write(data):
+                    device.stdout.write(bytes(data).decode('latin-1'))
+
+        modules = {'os': OS, 'microbit': Microbit}
+
+        def device_import(name, *args, **kwargs):
+            if name in modules:
+                return modules[name]
+            return builtins.__import__(name, *args, **kwargs)
+
+        device_builtins = dict(vars(builtins))
+        device_builtins['open'] = File
+        device_builtins['__import__'] = device_import
+        device_builtins['print'] = lambda *a, **k: builtins.print(
+            *a, file=device.stdout, **k)
+        self.namespace['__builtins__'] = device_builtins
+        return self.namespace
+
+
+class FakeClock:
+    """
+    Stands in for the time module so that pauses and timeouts take no real
+    time: every look at the clock moves it on by a millisecond.
+    """
+
+    def __init__(self):
+        self.now = 0
+
+    def time(self):
+        self.now += 0.001
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture(autouse=True)
+def fresh_pacing():
+    """
+    Every test starts with no learned pacing and a fake clock.
+    """
+    with mock.patch.dict(microfs.PACING, clear=True), \
+            mock.patch('mu.contrib.microfs.list_serial_ports',
+                       return_value=[]), \
+            mock.patch('mu.contrib.microfs.time', FakeClock()), \
+            mock.patch('mu.contrib.microfs._PACING_LOADED', True):
+        microfs._PORT_BOARDS.clear()
+        yield
+
+
+def local_file(tmpdir, content, name='foo.py'):
+    path = tmpdir.join(name)
+    path.write_binary(content)
+    return str(path)
+
+
+def test_put(tmpdir):
+    """
+    A file is copied in chunks to a temporary file which then replaces the
+    target.
+    """
+    content = b'x = 1\r\n' * 100
+    device = FakeDevice({'foo.py': b'old'})
+    assert microfs.put(device, local_file(tmpdir, content))
+    assert device.files == {'foo.py': content}
+    assert any("'foo.py.part'" in c for c in device.commands)
+
+
+def test_put_without_rename(tmpdir):
+    """
+    Devices that can't rename files (the micro:bit) are written directly.
+    """
+    content = b'x = 1\r\n' * 100
+    device = FakeDevice({'foo.py': b'old'}, can_rename=False)
+    assert microfs.put(device, local_file(tmpdir, content))
+    assert device.files == {'foo.py': content}
+    assert not any('.part' in c for c in device.commands)
+
+
+def test_put_dropped_reply_retried(tmpdir):
+    """
+    A chunk whose acknowledgement is lost is retried without being written
+    twice.
+    """
+    content = bytes(range(32, 127)) * 4
+    device = FakeDevice()
+    device.drop_replies = {4}
+    assert microfs.put(device, local_file(tmpdir, content))
+    assert device.files == {'foo.py': content}
+
+
+def test_put_damaged_chunk_retried(tmpdir):
+    """
+    A chunk that loses bytes on the way is still valid Python, but it isn't
+    written and is sent again.
+    """
+    content = b'abcdefgh' * 40
+    device = FakeDevice()
+    damaged = []
+
+    def mangle(command):
+        if command.startswith('d = ') and not damaged:
+            damaged.append(command)
+            return command.replace('abcdefgh', 'abcdgh', 1)
+        return command
+
+    device.mangle = mangle
+    assert microfs.put(device, local_file(tmpdir, content))
+    assert damaged
+    assert device.files == {'foo.py': content}
+
+
+def test_put_fails_and_cleans_up(tmpdir):
+    """
+    If the device stops acknowledging chunks the put fails and the unfinished
+    file is removed.
+    """
+    device = FakeDevice({'foo.py': b'old'})
+    # Lose the replies to every attempt at the first chunk.
+    device.drop_replies = set(range(3, 4 + microfs.RETRIES))
+    with pytest.raises(IOError):
+        microfs.put(device, local_file(tmpdir, b'x' * 500))
+    assert device.files == {'foo.py': b'old'}
+
+
+def test_Pacing_memory_error_backs_off(tmpdir):
+    """
+    A MemoryError shrinks the chunks and stops them growing back to the size
+    that caused it, while the put still succeeds.
+    """
+    content = bytes(range(32, 127)) * 20
+    device = FakeDevice(memory=300)
+    pacing = microfs.get_pacing(device)
+    pacing.put_size = 256
+    assert microfs.put(device, local_file(tmpdir, content))
+    assert device.files == {'foo.py': content}
+    assert pacing.put_limit < 256
+    assert pacing.put_size <= pacing.put_limit
+
+
+def test_Pacing_state_restored():
+    """
+    What is learned about a board can be saved and taken up again, within
+    bounds.
+    """
+    pacing = microfs.Pacing()
+    for i in range(20):
+        pacing.success(0.01)
+    state = pacing.state()
+    restored = microfs.Pacing()
+    restored.restore(state)
+    assert restored.state() == state
+    restored.restore({'write_size': 10 ** 6, 'put_size': 1, 'delay': 'x',
+                      'put_limit': 128, 'rtt': -1})
+    assert restored.write_size == microfs.Pacing.WRITE_SIZES[1]
+    assert restored.put_size == microfs.Pacing.PUT_SIZES[0]
+    assert restored.put_limit == 128
+    assert restored.delay == state['delay']
+    assert restored.rtt is None
+
+
+def test_save_and_load_pacing(tmpdir):
+    """
+    The pacing for each type of board survives between runs.
+    """
+    path = str(tmpdir.join('data', 'pacing.json'))
+    pacing = microfs.Pacing()
+    pacing.put_size = 512
+    microfs.PACING[(0x239A, 0x800B)] = pacing
+    microfs.PACING[None] = microfs.Pacing()
+    microfs.save_pacing(path)
+    microfs.PACING.clear()
+    microfs.load_pacing(path)
+    assert list(microfs.PACING) == [(0x239A, 0x800B)]
+    assert microfs.PACING[(0x239A, 0x800B)].put_size == 512
+
+
+def test_load_pacing_damaged(tmpdir):
+    """
+    A damaged pacing file is ignored.
+    """
+    path = tmpdir.join('pacing.json')
+    path.write('{"0D28:0204": [1, 2]')
+    microfs.load_pacing(str(path))
+    assert microfs.PACING == {}
+
+
+def test_get_pacing_loads_once(tmpdir):
+    """
+    The saved pacing is read the first time it's needed and saved at exit.
+    """
+    device = FakeDevice()
+    with mock.patch('mu.contrib.microfs._PACING_LOADED', False), \
+            mock.patch('mu.contrib.microfs.load_pacing') as load, \
+            mock.patch('mu.contrib.microfs.atexit.register') as register:
+        first = microfs.get_pacing(device)
+        assert microfs.get_pacing(device) is first
+    load.assert_called_once_with()
+    register.assert_called_once_with(microfs.save_pacing)
+
+
+def test_get_dropped_reply_retried(tmpdir):
+    """
+    A chunk lost on the way from the device is asked for again.
+    """
+    content = bytes(range(32, 127)) * 3
+    device = FakeDevice({'data.txt': content})
+    device.drop_replies = {4}
+    target = str(tmpdir.join('data.txt'))
+    assert microfs.get(device, 'data.txt', target)
+    with open(target, 'rb') as f:
+        assert f.read() == content
+
+
+def test_ls_long():
+    """
+    The names and sizes of the files are listed with the free space.
+    """
+    device = FakeDevice({'a.py': b'abc', 'b.py': b''})
+    assert microfs.ls_long(device) == ([('a.py', 3), ('b.py', 0)], None)
+
+
+def test_run():
+    """
+    The script's output is streamed back as it arrives.
+    """
+    device = FakeDevice()
+    out = io.StringIO()
+    assert microfs.run(device, 'for i in range(3):\n    print(i)\n', out=out)
+    assert out.getvalue() == '0\r\n1\r\n2\r\n'
+    assert device.files == {}
+
+
+def test_run_error():
+    """
+    An error in the script is raised with its traceback.
+    """
+    device = FakeDevice()
+    with pytest.raises(IOError) as ex:
+        microfs.run(device, '1 / 0', out=io.StringIO())
+    assert 'ZeroDivisionError' in str(ex.value)
+
+
+def test_run_timeout():
+    """
+    A script still running after the timeout is interrupted with CTRL-C.
+    """
+    device = FakeDevice()
+    device.hang = True
+    with pytest.raises(IOError) as ex:
+        microfs.run(device, 'while True:\n    pass\n', timeout=1,
+                    out=io.StringIO())
+    assert str(ex.value) == 'Timed out after 1 seconds.'
+    script_end = device.written.index(b'pass\n\x04')
+    assert b'\x03' in device.written[script_end:]
+
+
+def test_run_timeout_unresponsive():
+    """
+    If the device ignores CTRL-C as well, give up after TIMEOUT seconds.
+    """
+    device = FakeDevice()
+    device.hang = True
+    write = device.write
+
+    def ignore_interrupt(data):
+        if data == b'\x03' and device.running:
+            return 1
+        return write(data)
+
+    device.write = ignore_interrupt
+    with pytest.raises(IOError) as ex:
+        microfs.run(device, 'while True:\n    pass\n', timeout=1,
+                    out=io.StringIO())
+    assert str(ex.value) == 'The device stopped responding.'
+
+
+def test_deploy(tmpdir):
+    """
+    The files are copied to every device and the outcome for each port is
+    reported, including a failure on one of them.
+    """
+    first = local_file(tmpdir, b'x = 1\r\n', 'main.py')
+    second = local_file(tmpdir, b'y = 2\r\n', 'lib.py')
+    devices = {port: FakeDevice(port=port) for port in ('A', 'B', 'C')}
+
+    def get_serial(port):
+        if port == 'C':
+            raise IOError('Could not open port.')
+        return devices[port]
+
+    progress = []
+    with mock.patch('mu.contrib.microfs.get_serial', get_serial):
+        results = microfs.deploy([first, second], ['A', 'B', 'C'],
+                                 lambda *args: progress.append(args))
+    assert results == {'A': None, 'B': None, 'C': 'Could not open port.'}
+    for port in ('A', 'B'):
+        assert devices[port].files == {'main.py': b'x = 1\r\n',
+                                       'lib.py': b'y = 2\r\n'}
+        assert (port, 2, 'done') in progress
+    assert ('C', 0, 'failed: Could not open port.') in progress
+
+
+def test_deploy_finds_devices(tmpdir):
+    """
+    Without a list of ports every attached board is deployed to.
+    """
+    filename = local_file(tmpdir, b'x = 1\r\n')
+    ports = [('/dev/ttyACM1', 'micro:bit', 'USB VID:PID=0D28:0204'),
+             ('/dev/ttyACM0', 'Feather', 'USB VID:PID=239A:800B'),
+             ('/dev/ttyS0', 'Serial', 'n/a')]
+    devices = {}
+
+    def get_serial(port):
+        devices[port] = FakeDevice(port=port)
+        return devices[port]
+
+    with mock.patch('mu.contrib.microfs.list_serial_ports',
+                    return_value=ports), \
+            mock.patch('mu.contrib.microfs.get_serial', get_serial):
+        results = microfs.deploy([filename])
+    assert results == {'/dev/ttyACM0': None, '/dev/ttyACM1': None}
+    assert sorted(devices) == ['/dev/ttyACM0', '/dev/ttyACM1']
+
+
+def test_deploy_missing_file():
+    """
+    Nothing is deployed if one of the files doesn't exist.
+    """
+    with pytest.raises(IOError):
+        microfs.deploy(['no_such_file.py'], ['A'])
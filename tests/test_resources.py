@@ -2,6 +2,7 @@
 """
 Tests for the resources sub-module.
 """
+import os
 import mu.resources
 from unittest import mock
 from PyQt5.QtGui import QIcon, QPixmap
@@ -9,44 +10,54 @@ from PyQt5.QtGui import QIcon, QPixmap
 
 def test_path():
     """
-    Ensure the resource_filename function is called with the expected args and
-    the path function under test returns its result.
+    Ensure the path to a resource is in the expected directory.
     """
-    with mock.patch('mu.resources.resource_filename', return_value='bar') as r:
-        assert mu.resources.path('foo') == 'bar'
-        r.assert_called_once_with(mu.resources.__name__, 'images/foo')
+    result = mu.resources.path('foo')
+    assert result == os.path.join(mu.resources.RESOURCE_DIR, 'images', 'foo')
+    assert os.path.isfile(mu.resources.path('icon.png'))
+    assert mu.resources.path('foo', 'css/').endswith(os.path.join('css',
+                                                                  'foo'))
 
 
 def test_load_icon():
     """
-    Check the load_icon function returns the expected QIcon object.
+    Check the load_icon function returns the expected QIcon object, which is
+    only loaded once.
     """
     result = mu.resources.load_icon('icon')
     assert isinstance(result, QIcon)
+    assert mu.resources.load_icon('icon') is result
 
 
 def test_load_pixmap():
     """
-    Check the load_pixmap function returns the expected QPixmap object.
+    Check the load_pixmap function returns the expected QPixmap object, which
+    is only loaded once.
     """
     result = mu.resources.load_pixmap('icon')
     assert isinstance(result, QPixmap)
+    assert not result.isNull()
+    assert mu.resources.load_pixmap('icon') is result
 
 
 def test_stylesheet():
     """
-    Ensure the resource_string function is called with the expected args and
-    the load_stylesheet function returns its result.
+    Ensure the stylesheet is read from the css directory and only read once.
     """
-    with mock.patch('mu.resources.resource_string', return_value=b'foo') as rs:
+    mu.resources.load_stylesheet.cache_clear()
+    mock_open = mock.mock_open(read_data='foo')
+    with mock.patch('builtins.open', mock_open):
         assert 'foo' == mu.resources.load_stylesheet('foo')
-        rs.assert_called_once_with(mu.resources.__name__, 'css/foo')
+        assert 'foo' == mu.resources.load_stylesheet('foo')
+    mock_open.assert_called_once_with(mu.resources.path('foo', 'css/'),
+                                      encoding='utf8')
+    mu.resources.load_stylesheet.cache_clear()
+    assert 'QWidget' in mu.resources.load_stylesheet('day.css')
 
 
 def test_load_font_data():
     """
     Ensure font data can be loaded
     """
-    with mock.patch('mu.resources.resource_string', return_value=b'foo') as rs:
-        assert b'foo' == mu.resources.load_font_data('foo')
-        rs.assert_called_once_with(mu.resources.__name__, 'fonts/foo')
+    data = mu.resources.load_font_data('SourceCodePro-Regular.otf')
+    assert data.startswith(b'OTTO')